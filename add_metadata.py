@@ -2,38 +2,43 @@
 
 import os
 import argparse
-from lxml import etree
 from lxml.html.clean import Cleaner
-import fnmatch
-import time
-import pandas as pd
 import datetime
-
-
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
-
-    return timed
+import xml_io
+import manifest
+import telemetry
+from mep_metadata import MepIndex, read_tables
+from lrucache import LRUCache
 
 
 class AddMetadata(object):
     """Get proceedings of the European Parliament."""
 
-    @timeit
-    def __init__(self):
-        self.cli()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the stage is only set up, e.g. to process trees in
+            memory with a pipeline
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'add_metadata',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
         self.n_proceedings = 0
         self.rm_a = Cleaner(remove_tags=['a'])
-        self.main()
+        self.read_metadata()
+        # metadata resolved by (speaker ID, date), kept across files
+        self.resolved = LRUCache(self.cache_size)
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(
+                self,
+                self.options,
+                ('meps', 'n_parties', 'p_groups', 'snapshot')),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
         message = "Added metatadata to {} proceedings!".format(
@@ -41,110 +46,117 @@ class AddMetadata(object):
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory matching a pattern, compressed or not.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return xml_io.get_files(directory, fileclue)
 
+    @telemetry.timed
     def read_xml(self, infile):
         """Parse a HTML file."""
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return etree.parse(input)
+        return xml_io.read_xml(infile, remove_blank_text=False)
+
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.xml',
+            self.compress)
 
+    @telemetry.timed
     def serialize(self, infile, root):
-        ofile_name = os.path.splitext(os.path.basename(infile))[0]
-        ofile_path = os.path.join(self.outdir, ofile_name+'.xml')
-        xml = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True).decode('utf-8')
-        with open(ofile_path, mode='w', encoding='utf-8') as ofile:
-            ofile.write(xml)
+        ofile_path = self.get_ofile_path(infile)
+        xml_io.serialize(root, ofile_path)
         pass
 
-    def main(self):
-        meps = pd.read_csv(
+    @telemetry.timed
+    def process(self, tree):
+        """Add the metadata of the speakers to a tree, in place.
+
+        Keyword arguments:
+        tree -- ElementTree of the proceedings
+        """
+        root = tree.getroot()
+        fdate = datetime.datetime.strptime(
+            root.attrib['date'], '%Y-%m-%d').date()
+        interventions = tree.xpath(
+            './/intervention[@speaker_id!="photo_generic"]')
+        hits = self.resolved.hits
+        misses = self.resolved.misses
+        for i in interventions:
+            metadata = self.resolved.memoize(
+                self.lookup,
+                (i.attrib['speaker_id'], fdate))
+            if metadata is None:
+                continue
+            for attribute, value in metadata:
+                i.attrib[attribute] = value
+        self.telemetry.count_cache(
+            'metadata',
+            self.resolved.hits - hits,
+            self.resolved.misses - misses)
+        return tree
+
+    def lookup(self, key):
+        """Get the metadata of a speaker, key is (speaker_id, date)."""
+        return self.mep_index.lookup(*key)
+
+    def read_metadata(self):
+        """Read the tables of metadata of the MEPs, and index them.
+
+        A snapshot written by meps_ie.py is read instead of the CSV files if
+        given, it is loaded without parsing text or dates with pandas.
+        """
+        if self.snapshot is not None:
+            self.mep_index = MepIndex.from_snapshot(self.snapshot)
+            return
+        self.mep_index = MepIndex.from_dataframes(*read_tables(
             self.meps,
-            sep='\t',
-            encoding='utf-8',
-            dtype={'id': str}
-            )
-        if self.n_parties is not None:
-            n_parties = pd.read_csv(
-                self.n_parties,
-                sep='\t',
-                encoding='utf-8',
-                parse_dates=[1, 2],
-                infer_datetime_format=True,
-                dtype={'id': str}
-                )
-        if self.p_groups is not None:
-            p_groups = pd.read_csv(
-                self.p_groups,
-                sep='\t',
-                encoding='utf-8',
-                parse_dates=[2, 3],
-                infer_datetime_format=True,
-                dtype={'id': str}
-                )
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_xml(infile)
-            root = tree.getroot()
-            fdate = datetime.datetime.strptime(
-                root.attrib['date'], '%Y-%m-%d').date()
-            interventions = tree.xpath(
-                './/intervention[@speaker_id!="photo_generic"]')
-            for i in interventions:
-                metadata = []
-                speaker_id = i.attrib['speaker_id']
-                idx_meps = meps.loc[meps['id'] == speaker_id].index.tolist()[0]
-                metadata.append(('name', meps.get_value(idx_meps, 'name')))
-                metadata.append((
-                    'nationality',
-                    meps.get_value(idx_meps, 'nationality')))
-                metadata.append((
-                    'birth_date',
-                    meps.get_value(idx_meps, 'birth_date')))
-                metadata.append((
-                    'birth_place',
-                    meps.get_value(idx_meps, 'birth_place')))
-                if self.n_parties is not None:
-                    idx_n_party = n_parties.loc[(n_parties['id'] == speaker_id) & (n_parties['s_date'] <= fdate) & (n_parties['e_date'] >= fdate)].index.tolist()
-                    if len(idx_n_party) > 0:
-                        idx_n_party = idx_n_party[0]
-                        metadata.append(('n_party', n_parties.get_value(idx_n_party, 'n_party')))
-                if self.p_groups is not None:
-                    idx_p_group = p_groups.loc[(p_groups['id'] == speaker_id) & (p_groups['s_date'] <= fdate) & (p_groups['e_date'] >= fdate)].index.tolist()
-                    if len(idx_p_group) > 0:
-                        idx_p_group = idx_p_group[0]
-                        metadata.append((
-                            'p_group',
-                            p_groups.get_value(idx_p_group, 'p_group')))
-                        metadata.append((
-                            'm_state',
-                            p_groups.get_value(idx_p_group, 'm_state')))
-                for a in metadata:
-                    if type(a[1]) is not float:
-                        i.attrib[a[0]] = a[1]
-            self.serialize(infile, root)
-            self.n_proceedings += 1
+            self.n_parties,
+            self.p_groups))
         pass
 
-    def cli(self):
+    def process_file(self, infile):
+        """Process a file and serialize the output."""
+        tree = self.read_xml(infile)
+        tree = self.process(tree)
+        self.telemetry.count(tree)
+        self.serialize(infile, tree.getroot())
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
+        pass
+
+    def main(self):
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                with self.telemetry.measure(
+                        infile,
+                        [self.get_ofile_path(infile)]):
+                    self.process_file(infile)
+                self.n_proceedings += 1
+        finally:
+            # the files done so far are not processed again by the next
+            # run, even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("metadata cache: {}".format(self.resolved.stats()))
+        print("{} files up to date, skipped.".format(n_skipped))
+        pass
+
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
             "-m", "--meps",
-            required=True,
+            required=False,
+            default=None,
             help="path to the MEPs' metadata file.")
         parser.add_argument(
             '-n', "--n_parties",
@@ -156,6 +168,12 @@ class AddMetadata(object):
             required=False,
             default=None,
             help="path to the political groups file.")
+        parser.add_argument(
+            "-s", "--snapshot",
+            required=False,
+            default=None,
+            help="path to the snapshot of the MEPs' metadata, meps.sqlite,\
+                written by meps_ie.py. It replaces -m, -n and -g.")
         parser.add_argument(
             "-x", "--xml",
             required=True,
@@ -170,16 +188,44 @@ class AddMetadata(object):
             required=False,
             default="*.xml",
             help="glob pattern to filter files.")
-        args = parser.parse_args()
+        parser.add_argument(
+            "--cache-size",
+            required=False,
+            type=int,
+            default=100000,
+            help="maximum number of speakers' metadata, by date, to be\
+                cached.")
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        if args.meps is None and args.snapshot is None:
+            parser.error("-m/--meps or -s/--snapshot is required.")
+        self.options = vars(args)
+        self.force = args.force
         self.meps = args.meps
         self.n_parties = args.n_parties
         self.p_groups = args.p_groups
+        self.snapshot = args.snapshot
         self.indir = args.xml
         self.outdir = args.output
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         self.pattern = args.pattern
+        self.compress = args.compress
+        self.cache_size = args.cache_size
         pass
 
 
-print(AddMetadata())
+if __name__ == '__main__':
+    print(AddMetadata())
@@ -3,37 +3,39 @@
 import os
 import argparse
 from lxml import etree
-import fnmatch
-import time
 import json
 import nltk
-
-
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
-
-    return timed
+import xml_io
+import manifest
+import telemetry
 
 
 class AddSentences(object):
     """Split text in sentences."""
 
-    @timeit
-    def __init__(self):
-        self.cli()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the stage is only set up, e.g. to process trees in
+            memory with a pipeline
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'add_sentences',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
         self.n_proceedings = 0
         self.loc = self.get_localized_vars()
         self.tokenizer = self.init_tokenizer()
-        self.main()
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(
+                self,
+                self.options,
+                files=[self.get_localization_path()]),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
         message = "{} EuroParl's {} proceedings processed!".format(
@@ -42,37 +44,44 @@ class AddSentences(object):
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory matching a pattern, compressed or not.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return xml_io.get_files(directory, fileclue)
+
+    def get_localization_path(self):
+        """Get the path to the JSON file of localized variables."""
+        fname = self.language+".json"
+        return os.path.join('localization', fname)
 
     def get_localized_vars(self):
         """Import localized variables from JSON file."""
-        fname = self.language+".json"
-        fpath = os.path.join('localization', fname)
+        fpath = self.get_localization_path()
         with open(fpath, mode="r", encoding="utf-8") as jfile:
             content = jfile.read()
         vars = json.loads(content)
         return vars
 
+    @telemetry.timed
     def read_xml(self, infile):
         """Parse a XML file.
 
         Keyword arguments:
         infile -- a string for the path to the file to be read.
         """
-        parser = etree.XMLParser(remove_blank_text=True)
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return etree.parse(input, parser)
+        return xml_io.read_xml(infile)
+
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.xml',
+            self.compress)
 
+    @telemetry.timed
     def serialize(self, infile, root):
         """Serialize Element as XML file.
 
@@ -80,15 +89,8 @@ class AddSentences(object):
         infile -- a string for the path to the input file processed.
         root -- Element to be serialized as XML.
         """
-        ofile_name = os.path.splitext(os.path.basename(infile))[0]
-        ofile_path = os.path.join(self.outdir, ofile_name+'.xml')
-        xml = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True).decode('utf-8')
-        with open(ofile_path, mode='w', encoding='utf-8') as ofile:
-            ofile.write(xml)
+        ofile_path = self.get_ofile_path(infile)
+        xml_io.serialize(root, ofile_path)
         pass
 
     def init_tokenizer(self):
@@ -101,6 +103,7 @@ class AddSentences(object):
                 self.loc['extra_abbreviations'])
         return tokenizer
 
+    @telemetry.timed
     def get_sentences(self, element):
         """Split element's text in sentences.
 
@@ -114,18 +117,48 @@ class AddSentences(object):
             etree.SubElement(element, 's').text = sentence
         pass
 
+    def process(self, tree):
+        """Split the text of a tree in sentences, in place.
+
+        Keyword arguments:
+        tree -- ElementTree of the proceedings
+        """
+        elements = tree.xpath('.//{}'.format(self.element))
+        for e in elements:
+            self.get_sentences(e)
+        return tree
+
+    def process_file(self, infile):
+        """Process a file and serialize the output."""
+        tree = self.read_xml(infile)
+        tree = self.process(tree)
+        self.telemetry.count(tree)
+        self.serialize(infile, tree)
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
+        pass
+
     def main(self):
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_xml(infile)
-            elements = tree.xpath('.//{}'.format(self.element))
-            for e in elements:
-                self.get_sentences(e)
-            self.serialize(infile, tree)
-            self.n_proceedings += 1
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                with self.telemetry.measure(
+                        infile,
+                        [self.get_ofile_path(infile)]):
+                    self.process_file(infile)
+                self.n_proceedings += 1
+        finally:
+            # the files done so far are not processed again by the next
+            # run, even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("{} files up to date, skipped.".format(n_skipped))
         pass
 
-    def cli(self):
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -151,7 +184,22 @@ class AddSentences(object):
             required=False,
             default="*.xml",
             help="glob pattern to filter files.")
-        args = parser.parse_args()
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.force = args.force
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
@@ -159,7 +207,9 @@ class AddSentences(object):
         self.language = args.language
         self.element = args.element
         self.pattern = args.pattern
+        self.compress = args.compress
         pass
 
 
-print(AddSentences())
+if __name__ == '__main__':
+    print(AddSentences())
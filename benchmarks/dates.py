@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import datetime
+import time
+import dateparser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_profile import LanguageProfile  # noqa: E402
+
+
+# headers of the sittings as published in each language
+FORMATS = {
+    'en': '{day_name}, {day} {month_name} {year}',
+    'es': '{day_name} {day} de {month_name} de {year}',
+    'de': '{day_name}, {day}. {month_name} {year}',
+    }
+
+
+class BenchmarkDates(object):
+    """Compare the localized date parser with dateparser."""
+
+    def __init__(self):
+        self.cli()
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.dates = self.get_dates()
+        self.main()
+
+    def __str__(self):
+        message = "{} dates parsed in {} ({} mismatches)!".format(
+            str(len(self.dates)),
+            ', '.join(self.languages),
+            str(self.n_mismatches))
+        return message
+
+    def get_dates(self):
+        """Get the dates of the sittings, one per line as YYYY-MM-DD."""
+        with open(self.dates_path, mode='r', encoding='utf-8') as idates:
+            return [datetime.datetime.strptime(x.strip(), '%Y-%m-%d').date()
+                    for x in idates if x.strip() != '']
+
+    def get_headers(self, profile):
+        """Format the dates as in the headers of the sittings."""
+        headers = []
+        for date in self.dates:
+            day_name = profile.loc['days'][date.weekday()]
+            headers.append(FORMATS[profile.language].format(
+                day_name=day_name[0].upper() + day_name[1:],
+                day=date.day,
+                month_name=profile.loc['months'][date.month - 1],
+                year=date.year))
+        return headers
+
+    def time_it(self, parse, headers):
+        ts = time.perf_counter()
+        for i in range(self.repeat):
+            output = [parse(x) for x in headers]
+        te = time.perf_counter()
+        return output, (te - ts) / self.repeat
+
+    def main(self):
+        self.n_mismatches = 0
+        for language in self.languages:
+            profile = LanguageProfile(
+                language,
+                os.path.join(self.root, 'localization'))
+            headers = self.get_headers(profile)
+            legacy, legacy_time = self.time_it(
+                lambda x: dateparser.parse(x).date(),
+                headers)
+            output, output_time = self.time_it(profile.parse_date, headers)
+            for header, date, a, b in zip(headers, self.dates, legacy, output):
+                if not date == a == b:
+                    self.n_mismatches += 1
+                    print('MISMATCH {!r}: {} != {} != {}'.format(
+                        header, date, a, b))
+            message = '{}: dateparser {:.4f} sec, localized {:.4f} sec, x{:.2f}'
+            print(message.format(
+                language,
+                legacy_time,
+                output_time,
+                legacy_time / max(output_time, 1e-9)))
+        pass
+
+    def cli(self):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-d", "--dates",
+            required=False,
+            default=os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                'dates.txt'),
+            help="path to the file with one date per line.")
+        parser.add_argument(
+            "-l", "--language",
+            required=False,
+            nargs='+',
+            default=['en', 'es', 'de'],
+            choices=['en', 'es', 'de'],
+            help="languages of the headers.")
+        parser.add_argument(
+            "-r", "--repeat",
+            required=False,
+            type=int,
+            default=3,
+            help="number of repetitions.")
+        args = parser.parse_args()
+        self.dates_path = args.dates
+        self.languages = args.language
+        self.repeat = args.repeat
+        pass
+
+
+if __name__ == '__main__':
+    benchmark = BenchmarkDates()
+    print(benchmark)
+    if benchmark.n_mismatches > 0:
+        sys.exit(1)
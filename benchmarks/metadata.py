@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import contextlib
+import datetime
+import io
+import random
+import shutil
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import meps_ie  # noqa: E402
+from mep_metadata import (  # noqa: E402
+    MepIndex,
+    mep_attributes,
+    read_tables)
+from synthetic import GenerateCorpus  # noqa: E402
+
+
+class BenchmarkMetadata(object):
+    """Compare the index of MEPs' metadata with scans of the tables.
+
+    Each query is a speaker ID and a date, as for an intervention in
+    add_metadata.py. The original implementation filtered the tables of
+    MEPs, national parties and political groups with pandas for each query.
+    By default, the tables are extracted with meps_ie.py from the pages of
+    MEPs generated by synthetic.py, with the malformed pages in
+    fixtures/meps, which must be reported and skipped. If a snapshot is
+    available, the index
+    loaded from it must give the same metadata as the one built from the
+    tables.
+    """
+
+    def __init__(self):
+        self.cli()
+        self.fixtures = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'fixtures',
+            'meps')
+        self.n_mismatches = 0
+        self.tmpdir = tempfile.mkdtemp()
+        try:
+            self.read_tables()
+            self.queries = self.get_queries()
+            self.main()
+        finally:
+            shutil.rmtree(self.tmpdir)
+
+    def __str__(self):
+        message = "{} lookups of {} MEPs ({} mismatches)!".format(
+            str(len(self.queries)),
+            str(self.meps_df['id'].nunique()),
+            str(self.n_mismatches))
+        return message
+
+    def generate_tables(self):
+        """Extract the tables from synthetic pages of MEPs."""
+        GenerateCorpus(
+            ['-o', self.tmpdir, '-d', '0', '-m', str(self.n_meps)])
+        indir = os.path.join(self.tmpdir, 'html', 'meps')
+        malformed = sorted(os.listdir(self.fixtures))
+        for fname in malformed:
+            shutil.copy(os.path.join(self.fixtures, fname), indir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            extractor = meps_ie.TransformHtmlProceedingsToXml(
+                ['-i', indir,
+                 '-o', self.tmpdir,
+                 '-d', '2019-07-01'])
+        skipped = sorted(os.path.basename(x) for x, e in extractor.errors)
+        if skipped != malformed:
+            self.n_mismatches += 1
+            print('MISMATCH malformed pages: {} != {}'.format(
+                malformed,
+                skipped))
+        self.meps = os.path.join(self.tmpdir, 'meps.csv')
+        self.n_parties = os.path.join(self.tmpdir, 'national_parties.csv')
+        self.p_groups = os.path.join(self.tmpdir, 'political_groups.csv')
+        self.snapshot = os.path.join(self.tmpdir, 'meps.sqlite')
+        pass
+
+    def read_tables(self):
+        if self.meps is None:
+            self.generate_tables()
+        ts = time.perf_counter()
+        self.meps_df, self.n_parties_df, self.p_groups_df = read_tables(
+            self.meps,
+            self.n_parties,
+            self.p_groups)
+        self.read_time = time.perf_counter() - ts
+        pass
+
+    def get_queries(self):
+        """Get random (speaker ID, date) pairs, some of unknown speakers."""
+        rng = random.Random(self.seed)
+        ids = sorted(self.meps_df['id'].unique())
+        s_date = self.p_groups_df['s_date'].min().date()
+        e_date = self.p_groups_df['e_date'].max().date()
+        days = (e_date - s_date).days
+        queries = []
+        for i in range(self.n_queries):
+            if rng.random() < 0.01:
+                speaker_id = 'unknown{}'.format(i)
+            else:
+                speaker_id = rng.choice(ids)
+            queries.append((
+                speaker_id,
+                s_date + datetime.timedelta(days=rng.randint(0, days))))
+        return queries
+
+    def legacy_lookup(self, speaker_id, a_date):
+        """Scan the tables as add_metadata.py originally did."""
+        meps_df = self.meps_df
+        idx_meps = meps_df.loc[meps_df['id'] == speaker_id].index.tolist()
+        if len(idx_meps) == 0:
+            return None
+        idx_meps = idx_meps[0]
+        metadata = [(x, meps_df.at[idx_meps, x]) for x in mep_attributes]
+        a_date = pd.Timestamp(a_date)
+        df = self.n_parties_df
+        idx_n_party = df.loc[
+            (df['id'] == speaker_id) &
+            (df['s_date'] <= a_date) &
+            (df['e_date'] >= a_date)].index.tolist()
+        if len(idx_n_party) > 0:
+            metadata.append(('n_party', df.at[idx_n_party[0], 'n_party']))
+        df = self.p_groups_df
+        idx_p_group = df.loc[
+            (df['id'] == speaker_id) &
+            (df['s_date'] <= a_date) &
+            (df['e_date'] >= a_date)].index.tolist()
+        if len(idx_p_group) > 0:
+            metadata.append(('p_group', df.at[idx_p_group[0], 'p_group']))
+            metadata.append(('m_state', df.at[idx_p_group[0], 'm_state']))
+        return tuple(x for x in metadata if type(x[1]) is not float)
+
+    def time_it(self, lookup, queries):
+        ts = time.perf_counter()
+        for i in range(self.repeat):
+            output = [lookup(*x) for x in queries]
+        te = time.perf_counter()
+        return output, (te - ts) / self.repeat
+
+    def main(self):
+        ts = time.perf_counter()
+        index = MepIndex.from_dataframes(
+            self.meps_df,
+            self.n_parties_df,
+            self.p_groups_df)
+        build_time = time.perf_counter() - ts
+        # the tables are scanned for a sample only, it is too slow otherwise
+        legacy_queries = self.queries[:self.n_legacy]
+        legacy, legacy_time = self.time_it(self.legacy_lookup, legacy_queries)
+        output, output_time = self.time_it(index.lookup, self.queries)
+        for query, a, b in zip(legacy_queries, legacy, output):
+            if a != b:
+                self.n_mismatches += 1
+                print('MISMATCH {!r}: {} != {}'.format(query, a, b))
+        legacy_per_query = legacy_time / max(len(legacy_queries), 1)
+        output_per_query = output_time / max(len(self.queries), 1)
+        message = ('index built in {:.4f} sec\n'
+                   'scans {:.2f} usec/lookup, index {:.2f} usec/lookup, '
+                   'x{:.2f}')
+        print(message.format(
+            build_time,
+            legacy_per_query * 1e6,
+            output_per_query * 1e6,
+            legacy_per_query / max(output_per_query, 1e-12)))
+        if self.snapshot is not None:
+            self.compare_snapshot(output, build_time)
+        pass
+
+    def compare_snapshot(self, output, build_time):
+        """Load the index from the snapshot, and compare its lookups."""
+        ts = time.perf_counter()
+        index = MepIndex.from_snapshot(self.snapshot)
+        load_time = time.perf_counter() - ts
+        for query, a in zip(self.queries, output):
+            b = index.lookup(*query)
+            if a != b:
+                self.n_mismatches += 1
+                print('MISMATCH snapshot {!r}: {} != {}'.format(query, a, b))
+        print('tables read and indexed in {:.4f} sec, '
+              'snapshot loaded and indexed in {:.4f} sec'.format(
+                  self.read_time + build_time,
+                  load_time))
+        pass
+
+    def cli(self):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-m", "--meps",
+            required=False,
+            default=None,
+            help="path to meps.csv, the tables are extracted from synthetic\
+                pages if None.")
+        parser.add_argument(
+            '-n', "--n_parties",
+            required=False,
+            default=None,
+            help="path to national_parties.csv.")
+        parser.add_argument(
+            "-g", "--p_groups",
+            required=False,
+            default=None,
+            help="path to political_groups.csv.")
+        parser.add_argument(
+            "--snapshot",
+            required=False,
+            default=None,
+            help="path to meps.sqlite, to be compared with the tables.")
+        parser.add_argument(
+            "--n_meps",
+            required=False,
+            type=int,
+            default=750,
+            help="number of synthetic MEPs.")
+        parser.add_argument(
+            "-q", "--queries",
+            required=False,
+            type=int,
+            default=100000,
+            help="number of lookups.")
+        parser.add_argument(
+            "-l", "--legacy",
+            required=False,
+            type=int,
+            default=2000,
+            help="number of lookups compared with scans of the tables.")
+        parser.add_argument(
+            "-r", "--repeat",
+            required=False,
+            type=int,
+            default=3,
+            help="number of repetitions.")
+        parser.add_argument(
+            "-s", "--seed",
+            required=False,
+            type=int,
+            default=0,
+            help="seed of the random generator.")
+        args = parser.parse_args()
+        paths = [args.meps, args.n_parties, args.p_groups]
+        if len({x is None for x in paths}) > 1:
+            parser.error("-m, -n and -g go together.")
+        self.meps = args.meps
+        self.n_parties = args.n_parties
+        self.p_groups = args.p_groups
+        self.snapshot = args.snapshot
+        self.n_meps = args.n_meps
+        self.n_queries = args.queries
+        self.n_legacy = args.legacy
+        self.repeat = args.repeat
+        self.seed = args.seed
+        pass
+
+
+if __name__ == '__main__':
+    benchmark = BenchmarkMetadata()
+    print(benchmark)
+    if benchmark.n_mismatches > 0:
+        sys.exit(1)
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import regex as re
+from io import BytesIO
+from lxml import html
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import html_store  # noqa: E402
+from proceedings_xml import (  # noqa: E402
+    ParagraphNormalizer,
+    TransformHtmlProceedingsToXml)
+
+
+SAMPLES = [
+    ' Mr President, ladies and gentlemen . . . the situation is dramatic.',
+    '\xa0– Mr President,\tthe Commission shares\xa0these con\xadcerns...',
+    '(DE) Mr President, we must act now....and not later…..',
+    '(Madam President, I would like to say (  ) something ( … ).',
+    '(Mr President, the vote will take place…tomorrow.… really',
+    ', Neil, . – The report is   good, but [lt]BRK[gt] needs work.',
+    '(PPE-DE), . – I voted in favour >of the report= s= text.',
+    '(Verts/ALE), . – <Titre> of the <0report> is ***** wrong',
+    '(PSE) The debate is closed. ***',
+    'Member of the Commission. – Thank you very much.',
+    'Council. - The Council agrees… with the Parliament’s position…',
+    'President-elect of the Commission. – Honourable Members.',
+    'Presidente en ejercicio del Consejo. – Señor Presidente, ( gracias ).',
+    'Presidente designado de la Comisión. – Señorías…',
+    'Kommission. – Herr Präsident! Rat. – Die Sitzung ist eröffnet.',
+    'Rat – Meine Damen und Herren, „die Lage ist ernst“…',
+    '',
+    '   ',
+    '(…)',
+    '(The sitting was opened at 10.00 a.m.)',
+    ]
+
+# paragraphs in the HTML of an intervention, with the text which follows them
+PARAGRAPHS = [
+    '<p class="contents">Hello (FR) world</p>tail text',
+    '<p class="contents">Hello world</p>\n(FR) tail\ntext\n',
+    '<p class="contents">Mr President,\n<br>the report<br/>is\n\ngood.</p>\n',
+    '<p class="contents"><span class="italic">(DE)</span> Herr Präsident!</p>'
+    ' – und <b>mehr</b>',
+    '<p class="contents">A <a href="#">link</a> and <sup>1</sup> a note.</p>  ',
+    '<p class="doc_subtitle_level1">Title</p>\xa0',
+    '<p class="contents">First.</p>Between.<p class="contents">Second.</p>',
+    ]
+
+
+def legacy_copy_paragraph(p):
+    """Copy a paragraph as in the original get_paragraphs."""
+    p = html.tostring(p, with_tail=True, encoding='utf-8').decode('utf-8')
+    p = re.sub(r'\n+', r' ', p)
+    p = re.sub(r'<br ?/?>', r' ', p)
+    return html.fromstring(p)
+
+
+def legacy_regextract(content, a_pattern, target_dic, dic_attrib):
+    is_match = re.match(r'{}'.format(a_pattern), content)
+    if is_match is not None:
+        if dic_attrib not in target_dic.keys():
+            target_dic[dic_attrib] = is_match.group(1)
+            content = re.sub(r'{}'.format(a_pattern), r'', content)
+    return content, target_dic
+
+
+def legacy_normalize(content, s_intervention, more_roles):
+    """Clean up the text of a paragraph as in the original get_paragraphs."""
+    content = content.strip()
+    content = re.sub(r'\t', r' ', content)
+    content = re.sub(r'\xad', r'-', content)  # revise
+    content = re.sub(r'\xa0', r' ', content)
+    content = re.sub(r' +', r' ', content)
+    content = re.sub(r'\. \. \.', r'...', content)
+    content = re.sub(r'\.{3,}', r'…', content)
+    content = re.sub(r'…\.\.', r'…', content)
+    content = re.sub(r'^([\s\.—–\-−,\)]+)', r'', content)
+    content = re.sub(r'([^\.])(…)', r'\1 \2', content)
+    content = re.sub(r'\.…', r' …', content)
+    content = re.sub(r'\( ?… ?\)', r'(…)', content)
+    content = re.sub(r'(…)(\.)(\w)', r'\1\2 \3', content)
+    content = re.sub(r'([\w”])(…)', r'\1 \2', content)
+    content = re.sub(r'(…)(\w)', r'\1 \2', content)
+    content = re.sub(r'\( +\)', r'', content)
+    content = re.sub(r'\( +?', r'(', content)
+    content = re.sub(r' +\)', r')', content)
+    content = re.sub(r'(\[lt\]|<) ?BRK ?(\[gt\]|>)?', r'', content)
+    content = re.sub(r'>(.+?)=', r'"\1"', content)
+    content = re.sub(r's= ', r"s' ", content)
+    content = re.sub(r'<Titre>', r'Titre', content)
+    content = re.sub(r'<0', r'', content)
+    content = re.sub(r'>', r'', content)
+    content = re.sub(r'<', r'', content)
+    content = re.sub(r'^,? *Neil,? +\. +– +', r'', content)
+    content = re.sub(r'^\(PPE-DE\), +\. +– +', r'', content)
+    content = re.sub(r'^\(Verts/ALE\), +\. +– +', r'', content)
+    content = re.sub(r'\A\([\p{Lu}\&/\-–]+\)', r'', content)
+    content = re.sub(r' +', r' ', content)
+    content = re.sub(r'\A([\s\.—–\-−,\)]+)', r'', content)
+    content = re.sub(r'^\((Madam President)', r'\1', content)
+    content = re.sub(r'^\((Mr President)', r'\1', content)
+    for pattern in more_roles:
+        content, s_intervention = legacy_regextract(
+            content,
+            pattern,
+            s_intervention,
+            'role')
+    content = re.sub(r'\*{3,}', r'', content)
+    return content, s_intervention
+
+
+class BenchmarkParagraphNormalizer(object):
+    """Compare the paragraph normalizer with the original implementation."""
+
+    def __init__(self):
+        self.cli()
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.texts = self.get_texts()
+        # the language profiles are loaded from the localization folder
+        os.chdir(self.root)
+        self.tmpdir = tempfile.mkdtemp()
+        try:
+            self.main()
+        finally:
+            shutil.rmtree(self.tmpdir)
+
+    def __str__(self):
+        message = ("{} paragraphs normalized in {}, {} copied "
+                   "({} mismatches)!").format(
+            str(len(self.texts)),
+            ', '.join(self.languages),
+            str(len(PARAGRAPHS)),
+            str(self.n_mismatches))
+        return message
+
+    def get_texts(self):
+        """Get the texts of the paragraphs to be normalized."""
+        if self.indir is None:
+            return SAMPLES
+        texts = []
+        parser = html.HTMLParser(encoding='utf-8')
+        for infile in html_store.get_files(self.indir, self.pattern):
+            tree = html.parse(BytesIO(html_store.read(infile)), parser)
+            for p in tree.xpath(
+                    '//p[@class="contents" or @class="doc_subtitle_level1"]'):
+                texts.append(p.text_content())
+        return texts
+
+    def get_more_roles(self, language):
+        fpath = os.path.join(self.root, 'localization', language + '.json')
+        with open(fpath, mode='r', encoding='utf-8') as jfile:
+            return json.load(jfile)['more_roles']
+
+    def time_it(self, normalize):
+        ts = time.perf_counter()
+        for i in range(self.repeat):
+            output = [normalize(x, {}) for x in self.texts]
+        te = time.perf_counter()
+        return output, (te - ts) / self.repeat
+
+    def main(self):
+        self.n_mismatches = 0
+        for language in self.languages:
+            more_roles = self.get_more_roles(language)
+            normalizer = ParagraphNormalizer(more_roles)
+            legacy, legacy_time = self.time_it(
+                lambda x, y: legacy_normalize(x, y, more_roles))
+            output, output_time = self.time_it(normalizer.normalize)
+            for text, a, b in zip(self.texts, legacy, output):
+                if a != b:
+                    self.n_mismatches += 1
+                    print('MISMATCH {!r}: {!r} != {!r}'.format(text, a, b))
+            print('{}: legacy {:.4f} sec, compiled {:.4f} sec, x{:.2f}'.format(
+                language,
+                legacy_time,
+                output_time,
+                legacy_time / max(output_time, 1e-9)))
+        self.compare_copies()
+        pass
+
+    def compare_copies(self):
+        """Compare the copies of paragraphs with those of the original.
+
+        The copies are cleaned as by proceedings_xml.py, and their texts,
+        which are normalized afterwards, must be the same.
+        """
+        converter = TransformHtmlProceedingsToXml(
+            ['-i', self.tmpdir, '-o', self.tmpdir, '-l', self.languages[0]],
+            run=False)
+        for fragment in PARAGRAPHS:
+            intervention = html.fragment_fromstring(
+                fragment,
+                create_parent='div')
+            for p in converter.profile.paragraphs(intervention):
+                a = converter.clean_paragraph(
+                    legacy_copy_paragraph(p)).text_content()
+                b = converter.clean_paragraph(
+                    converter.copy_paragraph(p)).text_content()
+                if a != b:
+                    self.n_mismatches += 1
+                    print('MISMATCH {!r}: {!r} != {!r}'.format(fragment, a, b))
+        pass
+
+    def cli(self):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-i", "--input",
+            required=False,
+            default=None,
+            help="path to a directory with HTML proceedings, built-in\
+                samples are used if not provided.")
+        parser.add_argument(
+            '-p', "--pattern",
+            required=False,
+            default="*.html",
+            help="glob pattern to filter files.")
+        parser.add_argument(
+            "-l", "--language",
+            required=False,
+            nargs='+',
+            default=['en', 'es', 'de'],
+            choices=['en', 'es', 'de'],
+            help="languages whose roles are extracted.")
+        parser.add_argument(
+            "-r", "--repeat",
+            required=False,
+            type=int,
+            default=200,
+            help="number of repetitions.")
+        args = parser.parse_args()
+        self.indir = args.input
+        self.pattern = args.pattern
+        self.languages = args.language
+        self.repeat = args.repeat
+        pass
+
+
+if __name__ == '__main__':
+    benchmark = BenchmarkParagraphNormalizer()
+    print(benchmark)
+    if benchmark.n_mismatches > 0:
+        sys.exit(1)
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import tempfile
+import time
+from itertools import zip_longest
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xml_io  # noqa: E402
+from lrucache import LRUCache  # noqa: E402
+from proceedings_xml import TransformHtmlProceedingsToXml  # noqa: E402
+
+
+class BenchmarkProceedings(object):
+    """Time the hot functions of proceedings_xml.py on sample sittings.
+
+    Each fixture is a sitting in HTML with its golden XML next to it. The
+    functions are timed on their own, on fresh copies of the interventions
+    and with empty caches of names and roles, and the whole conversion of
+    each file is compared with its golden XML, so that an optimization is
+    proven not to change the corpus.
+    """
+
+    functions = [
+        'get_speaker_name',
+        'get_role',
+        'get_language',
+        'get_paragraphs',
+        'transform',
+        'stream_file',
+        ]
+
+    def __init__(self):
+        self.cli()
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # the language profiles are loaded from the localization folder
+        os.chdir(self.root)
+        self.tmpdir = tempfile.mkdtemp()
+        self.results = []
+        self.mismatches = []
+        try:
+            self.main()
+        finally:
+            shutil.rmtree(self.tmpdir)
+
+    def __str__(self):
+        message = "{} fixtures converted in {} ({} mismatches)!".format(
+            str(self.n_files),
+            ', '.join(self.languages),
+            str(len(self.mismatches)))
+        return message
+
+    def get_converter(self, language):
+        """Set up proceedings_xml.py without running it."""
+        return TransformHtmlProceedingsToXml(
+            ['-i', os.path.join(self.fixtures, language),
+             '-o', os.path.join(self.tmpdir, language),
+             '-l', language,
+             '--force'],
+            run=False)
+
+    def get_golden_path(self, infile):
+        return os.path.splitext(infile)[0] + '.xml'
+
+    def reset_caches(self, converter):
+        converter.speaker_names = LRUCache(converter.cache_size)
+        converter.roles = LRUCache(converter.cache_size)
+        pass
+
+    def get_interventions(self, converter, infile):
+        """Parse a file and get its interventions in document order."""
+        tree = converter.read_html(infile)
+        interventions = []
+        for section in converter.profile.sections(tree):
+            interventions.extend(converter.profile.interventions(section))
+        return interventions
+
+    def prepare(self, converter, intervention):
+        """Run the steps of transform_section before get_paragraphs.
+
+        The intervention is modified in place, as in transform_section. It
+        returns a tuple (s_intervention, i_lang).
+        """
+        s_intervention = {}
+        s_intervention['speaker_id'] = converter.get_speaker_id(intervention)
+        s_intervention['mode'] = converter.get_mode(intervention)
+        speaker_name = converter.get_speaker_name(intervention)
+        if converter.profile.president.match(speaker_name):
+            s_intervention['role'] = speaker_name
+        else:
+            s_intervention['name'] = speaker_name
+        role, i_lang = converter.get_role(intervention)
+        if role is not None:
+            s_intervention['role'] = role
+        return s_intervention, i_lang
+
+    def time_speaker_names(self, converter, infile):
+        calls = 0
+        elapsed = 0.0
+        for i in range(self.repeat):
+            self.reset_caches(converter)
+            for intervention in self.get_interventions(converter, infile):
+                ts = time.perf_counter()
+                converter.get_speaker_name(intervention)
+                elapsed += time.perf_counter() - ts
+                calls += 1
+        return calls, elapsed
+
+    def time_roles(self, converter, infile):
+        calls = 0
+        elapsed = 0.0
+        for i in range(self.repeat):
+            self.reset_caches(converter)
+            for intervention in self.get_interventions(converter, infile):
+                converter.get_mode(intervention)
+                ts = time.perf_counter()
+                converter.get_role(intervention)
+                elapsed += time.perf_counter() - ts
+                calls += 1
+        return calls, elapsed
+
+    def time_languages(self, converter, infile):
+        calls = 0
+        elapsed = 0.0
+        for i in range(self.repeat):
+            self.reset_caches(converter)
+            for intervention in self.get_interventions(converter, infile):
+                s_intervention, i_lang = self.prepare(converter, intervention)
+                new_paragraphs = []
+                for p in converter.profile.paragraphs(intervention):
+                    p = converter.clean_paragraph(converter.copy_paragraph(p))
+                    ts = time.perf_counter()
+                    language, p = converter.get_language(
+                        s_intervention,
+                        p,
+                        i_lang,
+                        new_paragraphs)
+                    elapsed += time.perf_counter() - ts
+                    new_paragraphs.append({'language': language})
+                    calls += 1
+        return calls, elapsed
+
+    def time_paragraphs(self, converter, infile):
+        calls = 0
+        elapsed = 0.0
+        for i in range(self.repeat):
+            self.reset_caches(converter)
+            for intervention in self.get_interventions(converter, infile):
+                s_intervention, i_lang = self.prepare(converter, intervention)
+                ts = time.perf_counter()
+                converter.get_paragraphs(intervention, s_intervention, i_lang)
+                elapsed += time.perf_counter() - ts
+                calls += 1
+        return calls, elapsed
+
+    def time_transform(self, converter, infile):
+        """Time the conversion of a file in memory and check its output."""
+        elapsed = 0.0
+        for i in range(self.repeat):
+            self.reset_caches(converter)
+            ts = time.perf_counter()
+            root = converter.transform(infile)
+            xml = etree.tostring(
+                root,
+                encoding='utf-8',
+                xml_declaration=True,
+                pretty_print=True)
+            elapsed += time.perf_counter() - ts
+        self.check(infile, xml, 'transform')
+        return self.repeat, elapsed
+
+    def time_stream_file(self, converter, infile):
+        """Time the conversion of a file section by section to disk."""
+        elapsed = 0.0
+        for i in range(self.repeat):
+            self.reset_caches(converter)
+            ts = time.perf_counter()
+            converter.stream_file(infile)
+            elapsed += time.perf_counter() - ts
+        self.check(
+            infile,
+            xml_io.read(converter.get_ofile_path(infile)),
+            'stream_file')
+        return self.repeat, elapsed
+
+    def check(self, infile, xml, function):
+        """Compare the output of a file with its golden XML."""
+        golden_path = self.get_golden_path(infile)
+        if self.update_golden:
+            if function == 'transform':
+                xml_io.write(golden_path, xml)
+                print('golden XML written in {}'.format(golden_path))
+            return
+        golden = xml_io.read(golden_path)
+        if xml != golden:
+            self.mismatches.append((infile, function))
+            output_lines = xml.decode('utf-8').split('\n')
+            golden_lines = golden.decode('utf-8').split('\n')
+            for n, (a, b) in enumerate(
+                    zip_longest(golden_lines, output_lines, fillvalue=''),
+                    1):
+                if a != b:
+                    break
+            print('MISMATCH {} ({}), line {}:\n- {}\n+ {}'.format(
+                infile,
+                function,
+                n,
+                a,
+                b))
+        pass
+
+    def run_function(self, function, converter, infile):
+        timers = {
+            'get_speaker_name': self.time_speaker_names,
+            'get_role': self.time_roles,
+            'get_language': self.time_languages,
+            'get_paragraphs': self.time_paragraphs,
+            'transform': self.time_transform,
+            'stream_file': self.time_stream_file,
+            }
+        return timers[function](converter, infile)
+
+    def get_baseline(self):
+        """Get the seconds per call of a previous run, by function."""
+        if self.compare is None:
+            return {}
+        with open(self.compare, mode='r', encoding='utf-8') as ibaseline:
+            baseline = json.load(ibaseline)
+        return {(x['language'], x['function']): x['per_call']
+                for x in baseline['results']}
+
+    def main(self):
+        self.n_files = 0
+        baseline = self.get_baseline()
+        for language in self.languages:
+            converter = self.get_converter(language)
+            infiles = sorted(converter.infiles)
+            self.n_files += len(infiles)
+            for function in self.selected:
+                calls = 0
+                elapsed = 0.0
+                for infile in infiles:
+                    n, seconds = self.run_function(function, converter, infile)
+                    calls += n
+                    elapsed += seconds
+                per_call = elapsed / max(calls, 1)
+                self.results.append({
+                    'language': language,
+                    'function': function,
+                    'calls': calls // self.repeat,
+                    'seconds': elapsed / self.repeat,
+                    'per_call': per_call,
+                    })
+                message = '{}: {} {:.6f} sec, {} calls, {:.2f} usec/call'
+                message = message.format(
+                    language,
+                    function,
+                    elapsed / self.repeat,
+                    calls // self.repeat,
+                    per_call * 1e6)
+                if (language, function) in baseline:
+                    message += ', x{:.2f} vs baseline'.format(
+                        baseline[(language, function)] / max(per_call, 1e-12))
+                print(message)
+        if self.output is not None:
+            self.write_results()
+        pass
+
+    def write_results(self):
+        """Write the results of the run as JSON, to be compared later."""
+        results = {
+            'benchmark': 'proceedings',
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': self.repeat,
+            'results': self.results,
+            'mismatches': ['{} ({})'.format(*x) for x in self.mismatches],
+            }
+        with open(self.output, mode='w', encoding='utf-8') as oresults:
+            json.dump(results, oresults, indent=2)
+        pass
+
+    def cli(self):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-i", "--input",
+            required=False,
+            default=os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                'fixtures'),
+            help="path to the fixtures, a folder per language with HTML\
+                sittings and their golden XML.")
+        parser.add_argument(
+            "-l", "--language",
+            required=False,
+            nargs='+',
+            default=['en', 'es', 'de'],
+            choices=['en', 'es', 'de'],
+            help="languages of the fixtures.")
+        parser.add_argument(
+            "-f", "--functions",
+            required=False,
+            nargs='+',
+            default=self.functions,
+            choices=self.functions,
+            help="functions to be timed.")
+        parser.add_argument(
+            "-r", "--repeat",
+            required=False,
+            type=int,
+            default=20,
+            help="number of repetitions.")
+        parser.add_argument(
+            "-o", "--output",
+            required=False,
+            default=None,
+            help="path to a JSON file where the results are written.")
+        parser.add_argument(
+            "-c", "--compare",
+            required=False,
+            default=None,
+            help="path to the JSON results of a previous run to compare\
+                with.")
+        parser.add_argument(
+            "--update-golden",
+            required=False,
+            action='store_true',
+            help="write the current output as golden XML, only after\
+                checking that the changes are intended.")
+        args = parser.parse_args()
+        self.fixtures = os.path.abspath(args.input)
+        self.languages = args.language
+        self.selected = args.functions
+        self.repeat = args.repeat
+        self.output = args.output
+        if self.output is not None:
+            self.output = os.path.abspath(self.output)
+        self.compare = args.compare
+        if self.compare is not None:
+            self.compare = os.path.abspath(self.compare)
+        self.update_golden = args.update_golden
+        pass
+
+
+if __name__ == '__main__':
+    benchmark = BenchmarkProceedings()
+    print(benchmark)
+    if len(benchmark.mismatches) > 0:
+        sys.exit(1)
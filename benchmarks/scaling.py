@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry  # noqa: E402
+from synthetic import GenerateCorpus  # noqa: E402
+
+
+class BenchmarkScaling(object):
+    """Run the whole pipeline on synthetic corpora of growing size.
+
+    For each scale, a corpus with scale times the base number of sittings is
+    generated with synthetic.py and all the selected stages are run on it
+    by scheduler.py with telemetry. The throughput and the peak memory of
+    each stage are read from the telemetry records, so that a stage which
+    does not scale linearly stands out.
+    """
+
+    def __init__(self):
+        self.cli()
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.results = []
+        self.n_failed = 0
+        if self.workdir is None:
+            self.workdir = tempfile.mkdtemp()
+            try:
+                self.main()
+            finally:
+                shutil.rmtree(self.workdir)
+        else:
+            self.main()
+
+    def __str__(self):
+        message = "Pipeline run on {} scales ({} failed)!".format(
+            str(len(self.scales)),
+            str(self.n_failed))
+        return message
+
+    def generate(self, outdir, scale):
+        args = ['-o', outdir,
+                '-d', str(self.days * scale),
+                '-n', str(self.interventions),
+                '-m', str(self.meps),
+                '-l'] + self.languages
+        return GenerateCorpus(args)
+
+    def run_pipeline(self, outdir, telemetry_path):
+        """Run the scheduler in a process of its own.
+
+        It returns the number of failed tasks, or -1 if the scheduler itself
+        exited with an error. Its output is written in scheduler.log.
+        """
+        args = [sys.executable, os.path.join(self.root, 'scheduler.py'),
+                '-o', outdir,
+                '-l'] + self.languages + [
+                '-s'] + self.stages + [
+                '--telemetry', telemetry_path]
+        if self.jobs is not None:
+            args.extend(['-j', str(self.jobs)])
+        log_path = os.path.join(outdir, 'scheduler.log')
+        with open(log_path, mode='w', encoding='utf-8') as olog:
+            process = subprocess.run(
+                args,
+                cwd=self.root,
+                stdout=olog,
+                stderr=subprocess.STDOUT)
+        if process.returncode != 0:
+            return -1
+        with open(log_path, mode='r', encoding='utf-8') as ilog:
+            return sum(1 for x in ilog if x.startswith('failed: '))
+
+    def read_records(self, telemetry_path):
+        records = []
+        if os.path.exists(telemetry_path):
+            with open(telemetry_path, mode='r', encoding='utf-8') as irecords:
+                records = [json.loads(x) for x in irecords if x.strip()]
+        return records
+
+    def main(self):
+        for scale in self.scales:
+            outdir = os.path.join(self.workdir, 'x{}'.format(scale))
+            corpus = self.generate(outdir, scale)
+            telemetry_path = os.path.join(outdir, 'telemetry.jsonl')
+            ts = time.perf_counter()
+            n_failed = self.run_pipeline(outdir, telemetry_path)
+            elapsed = time.perf_counter() - ts
+            if n_failed != 0:
+                self.n_failed += 1
+                print('x{}: scheduler.py failed, see {}'.format(
+                    scale,
+                    os.path.join(outdir, 'scheduler.log')))
+            summary = telemetry.Telemetry('scaling')
+            summary.merge(self.read_records(telemetry_path))
+            stages = []
+            print('x{}: {} files generated, {:.2f} s elapsed'.format(
+                scale,
+                corpus.n_files,
+                elapsed))
+            for stage, totals in summary.summarize().items():
+                wall = max(totals['wall'], 1e-9)
+                stages.append({
+                    'stage': stage,
+                    'files': totals['files'],
+                    'wall': totals['wall'],
+                    'cpu': totals['cpu'],
+                    'bytes_in': totals['bytes_in'],
+                    'bytes_out': totals['bytes_out'],
+                    'files_per_second': totals['files'] / wall,
+                    'mb_per_second': totals['bytes_in'] / 1e6 / wall,
+                    'peak_rss': totals['peak_rss'],
+                    })
+                print('  {}: {} files, {:.2f} files/s, {:.2f} MB/s, '
+                      '{:.1f} MB peak RSS'.format(
+                          stage,
+                          totals['files'],
+                          totals['files'] / wall,
+                          totals['bytes_in'] / 1e6 / wall,
+                          totals['peak_rss'] / 1e6))
+            self.results.append({
+                'scale': scale,
+                'files': corpus.n_files,
+                'elapsed': elapsed,
+                'failed': n_failed,
+                'stages': stages,
+                })
+        if self.output is not None:
+            self.write_results()
+        pass
+
+    def write_results(self):
+        """Write the results of the run as JSON, to be compared later."""
+        results = {
+            'benchmark': 'scaling',
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'days': self.days,
+            'interventions': self.interventions,
+            'meps': self.meps,
+            'languages': self.languages,
+            'stages': self.stages,
+            'jobs': self.jobs,
+            'results': self.results,
+            }
+        with open(self.output, mode='w', encoding='utf-8') as oresults:
+            json.dump(results, oresults, indent=2)
+        pass
+
+    def cli(self):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-x", "--scales",
+            required=False,
+            nargs='+',
+            type=int,
+            default=[10, 100, 1000],
+            help="scales of the corpus, as multiples of the base number of\
+                sittings.")
+        parser.add_argument(
+            "-d", "--days",
+            required=False,
+            type=int,
+            default=1,
+            help="base number of sittings in each language.")
+        parser.add_argument(
+            "-n", "--interventions",
+            required=False,
+            type=int,
+            default=40,
+            help="number of interventions of MEPs in each sitting.")
+        parser.add_argument(
+            "-m", "--meps",
+            required=False,
+            type=int,
+            default=100,
+            help="number of MEPs.")
+        parser.add_argument(
+            "-l", "--language",
+            required=False,
+            nargs='+',
+            default=['en'],
+            choices=['en', 'es', 'de'],
+            help="languages of the proceedings.")
+        parser.add_argument(
+            "-s", "--stages",
+            required=False,
+            nargs='+',
+            default=['meps_ie', 'xml', 'langid', 'metadata', 'translationese'],
+            help="stages of scheduler.py to be run, the data is generated\
+                so download stages are not available.")
+        parser.add_argument(
+            '-j', "--jobs",
+            required=False,
+            type=int,
+            default=None,
+            help="number of processes of each stage.")
+        parser.add_argument(
+            "-w", "--workdir",
+            required=False,
+            default=None,
+            help="path to a directory where the corpora are kept, a\
+                temporary one removed at the end if None.")
+        parser.add_argument(
+            "-o", "--output",
+            required=False,
+            default=None,
+            help="path to a JSON file where the results are written.")
+        args = parser.parse_args()
+        self.scales = args.scales
+        self.days = args.days
+        self.interventions = args.interventions
+        self.meps = args.meps
+        self.languages = args.language
+        self.stages = args.stages
+        for stage in ['meps', 'download']:
+            if stage in self.stages:
+                parser.error("'{}' needs the website.".format(stage))
+        self.jobs = args.jobs
+        self.workdir = args.workdir
+        if self.workdir is not None:
+            self.workdir = os.path.abspath(self.workdir)
+        self.output = args.output
+        if self.output is not None:
+            self.output = os.path.abspath(self.output)
+        pass
+
+
+if __name__ == '__main__':
+    benchmark = BenchmarkScaling()
+    print(benchmark)
+    if benchmark.n_failed > 0:
+        sys.exit(1)
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+
+import os
+import argparse
+import datetime
+import json
+import random
+from html import escape
+
+
+# the strings of the proceedings in each language
+strings = {
+    'en': {
+        'title': 'Debates',
+        'place': 'Strasbourg',
+        'edition': 'OJ edition',
+        'date': '{day}, {d} {month} {y}',
+        'president': 'President',
+        'behalf': 'on behalf of the {} Group',
+        'commission': 'Member of the Commission',
+        'in_writing': 'in writing',
+        'opening': 'Opening of the sitting',
+        'debate': '{} (debate)',
+        'applause': 'Applause',
+        'open': 'The sitting is open.',
+        'closed': 'The debate is closed.',
+        'words': [
+            'the', 'Commission', 'Council', 'Member', 'States', 'must',
+            'report', 'we', 'have', 'to', 'support', 'citizens', 'this',
+            'Parliament', 'proposal', 'European', 'Union', 'policy', 'and',
+            'budget', 'agreement', 'rights', 'important', 'today', 'all',
+            'should', 'energy', 'market', 'security', 'debate', 'vote',
+            ],
+        'topics': [
+            'Energy security', 'Situation in the Middle East',
+            'Common agricultural policy', 'Economic recovery plan',
+            'Climate change package', 'Rights of passengers',
+            ],
+        },
+    'es': {
+        'title': 'Debates',
+        'place': 'Estrasburgo',
+        'edition': 'Edición DO',
+        'date': '{day} {d} de {month} de {y}',
+        'president': 'El Presidente',
+        'behalf': 'en nombre del Grupo {}',
+        'commission': 'Miembro de la Comisión',
+        'in_writing': 'por escrito',
+        'opening': 'Apertura de la sesión',
+        'debate': '{} (debate)',
+        'applause': 'Aplausos',
+        'open': 'Se abre la sesión.',
+        'closed': 'Se cierra el debate.',
+        'words': [
+            'la', 'Comisión', 'Consejo', 'los', 'Estados', 'miembros',
+            'debemos', 'informe', 'tenemos', 'que', 'apoyar', 'ciudadanos',
+            'este', 'Parlamento', 'propuesta', 'Unión', 'Europea', 'política',
+            'y', 'presupuesto', 'acuerdo', 'derechos', 'importante', 'hoy',
+            'todos', 'energía', 'mercado', 'seguridad', 'debate', 'votación',
+            ],
+        'topics': [
+            'Seguridad energética', 'Situación en Oriente Próximo',
+            'Política agrícola común', 'Plan de recuperación económica',
+            'Paquete sobre el cambio climático', 'Derechos de los pasajeros',
+            ],
+        },
+    'de': {
+        'title': 'Ausführliche Sitzungsberichte',
+        'place': 'Straßburg',
+        'edition': 'ABl.-Ausgabe',
+        'date': '{day}, {d}. {month} {y}',
+        'president': 'Der Präsident',
+        'behalf': 'im Namen der {}-Fraktion',
+        'commission': 'Mitglied der Kommission',
+        'in_writing': 'schriftlich',
+        'opening': 'Eröffnung der Sitzung',
+        'debate': '{} (Aussprache)',
+        'applause': 'Beifall',
+        'open': 'Ich erkläre die Sitzung für eröffnet.',
+        'closed': 'Die Aussprache ist geschlossen.',
+        'words': [
+            'die', 'Kommission', 'Rat', 'der', 'Mitgliedstaaten', 'müssen',
+            'Bericht', 'wir', 'haben', 'zu', 'unterstützen', 'Bürger',
+            'dieser', 'Parlament', 'Vorschlag', 'Europäische', 'Union',
+            'Politik', 'und', 'Haushalt', 'Einigung', 'Rechte', 'wichtig',
+            'heute', 'alle', 'Energie', 'Markt', 'Sicherheit', 'Aussprache',
+            'Abstimmung',
+            ],
+        'topics': [
+            'Energieversorgungssicherheit', 'Lage im Nahen Osten',
+            'Gemeinsame Agrarpolitik', 'Konjunkturprogramm',
+            'Klimapaket', 'Fahrgastrechte',
+            ],
+        },
+    }
+
+# political groups as (acronym, name)
+groups = [
+    ('PPE-DE', "Group of the European People's Party (Christian Democrats)"
+     " and European Democrats"),
+    ('PSE', 'Socialist Group in the European Parliament'),
+    ('ALDE', 'Group of the Alliance of Liberals and Democrats for Europe'),
+    ('Verts/ALE', 'Group of the Greens/European Free Alliance'),
+    ('GUE/NGL', 'Confederal Group of the European United Left'
+     ' / Nordic Green Left'),
+    ('UEN', 'Union for Europe of the Nations Group'),
+    ]
+
+# member states as (code, nationality)
+countries = [
+    ('DE', 'Germany'), ('FR', 'France'), ('IT', 'Italy'), ('ES', 'Spain'),
+    ('PL', 'Poland'), ('NL', 'Netherlands'), ('BE', 'Belgium'),
+    ('PT', 'Portugal'), ('SE', 'Sweden'), ('GB', 'United Kingdom'),
+    ]
+
+first_names = [
+    'Anna', 'Hans', 'Maria', 'Jean', 'Luis', 'Eva', 'Piotr', 'Sophie',
+    'Marco', 'Ingrid', 'Carlos', 'Helga', 'Tomas', 'Claire', 'Jan',
+    ]
+
+last_names = [
+    'Müller', 'Dupont', 'Rossi', 'García', 'Nowak', 'de Vries', 'Peeters',
+    'Silva', 'Andersson', 'Smith', 'Schmidt', 'Martin', 'Bianchi',
+    'Fernández', 'Kowalski',
+    ]
+
+# languages of the markers of the original language of a speech
+markers = ['DE', 'FR', 'IT', 'PL', 'NL', 'PT', 'SV', 'CS', 'EL', 'HU']
+
+
+class GenerateCorpus(object):
+    """Generate synthetic proceedings and MEPs' pages in the Europarl markup.
+
+    The sittings of each language are written in `html/<language>` and the
+    pages of MEPs in `html/meps` of the output folder, the layout of
+    scheduler.py, so that the whole pipeline can be run on them without
+    downloading anything. The corpus only depends on the seed: the same
+    sitting has the same speakers and structure in every language.
+    """
+
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, it is only set up and main is not called
+        """
+        self.cli(args)
+        self.n_files = 0
+        self.localizations = {}
+        if run:
+            self.main()
+
+    def __str__(self):
+        message = "{} synthetic files generated in {}!".format(
+            str(self.n_files),
+            self.outdir)
+        return message
+
+    def get_localization(self, language):
+        if language not in self.localizations:
+            path = os.path.join(self.localization, '{}.json'.format(language))
+            with open(path, mode='r', encoding='utf-8') as ilocalization:
+                self.localizations[language] = json.load(ilocalization)
+        return self.localizations[language]
+
+    def get_dates(self):
+        """Get the dates of the sittings, from Monday to Thursday."""
+        dates = []
+        a_date = self.start
+        while len(dates) < self.days:
+            if a_date.weekday() < 4:
+                dates.append(a_date)
+            a_date += datetime.timedelta(days=1)
+        return dates
+
+    def get_meps(self):
+        """Get the MEPs as a list of dictionaries."""
+        rng = random.Random('{}-meps'.format(self.seed))
+        meps = []
+        for i in range(self.n_meps):
+            country, nationality = rng.choice(countries)
+            meps.append({
+                'id': str(1000 + i),
+                'first_name': rng.choice(first_names),
+                'last_name': rng.choice(last_names),
+                'country': country,
+                'nationality': nationality,
+                'group': rng.choice(groups),
+                'birth': datetime.date(
+                    rng.randint(1940, 1980),
+                    rng.randint(1, 12),
+                    rng.randint(1, 28)),
+                })
+        return meps
+
+    def get_sitting(self, a_date):
+        """Get the structure of a sitting, shared by all languages.
+
+        It returns a list of sections, each a list of interventions as
+        dictionaries with the speaker and the kind of intervention.
+        """
+        rng = random.Random('{}-{}'.format(self.seed, a_date.isoformat()))
+        sections = [[{'kind': 'opening'}]]
+        n_interventions = 0
+        while n_interventions < self.interventions:
+            section = []
+            topic = rng.randrange(len(strings['en']['topics']))
+            for i in range(min(rng.randint(4, 10),
+                               self.interventions - n_interventions)):
+                mep = rng.choice(self.meps)
+                kind = rng.choice(
+                    ['mep', 'mep', 'mep', 'behalf', 'commission',
+                     'in_writing'])
+                section.append({
+                    'kind': kind,
+                    'mep': mep,
+                    'marker': (rng.choice(markers)
+                               if rng.random() < 0.2 else None),
+                    'paragraphs': [rng.randint(1, 4)
+                                   for j in range(rng.randint(1, 4))],
+                    'applause': rng.random() < 0.1,
+                    })
+            section.append({'kind': 'closing'})
+            n_interventions += len(section) - 1
+            sections.append((topic, section))
+        return sections
+
+    def get_sentence(self, rng, words):
+        sentence = ' '.join(rng.choice(words)
+                            for i in range(rng.randint(6, 20)))
+        return sentence[0].upper() + sentence[1:] + '.'
+
+    def get_date_string(self, language, a_date):
+        localization = self.get_localization(language)
+        return strings[language]['date'].format(
+            day=localization['days'][a_date.weekday()].capitalize(),
+            d=a_date.day,
+            month=localization['months'][a_date.month - 1],
+            y=a_date.year)
+
+    def render_intervention(self, language, number, intervention, rng):
+        """Render an intervention as a table of the proceedings."""
+        s = strings[language]
+        kind = intervention['kind']
+        lines = ['<a name="2-{:03d}"></a>'.format(number),
+                 '<table width="100%" cellpadding="5" cellspacing="0">',
+                 '<tr>']
+        if kind in ['opening', 'closing']:
+            photo = '/img/photo_generic.gif'
+        else:
+            photo = '/mepphoto/{}.jpg'.format(intervention['mep']['id'])
+        lines.append('<td width="16" valign="top"><img src="{}" alt="MPphoto"'
+                     ' /></td>'.format(photo))
+        lines.append('<td>')
+        if kind in ['opening', 'closing']:
+            text = s['open'] if kind == 'opening' else s['closed']
+            paragraphs = [
+                '<span class="doc_subtitle_level1_bis"><span class="bold">'
+                '{}. </span></span>&#8211; {}'.format(
+                    escape(s['president']),
+                    escape(text))]
+        else:
+            mep = intervention['mep']
+            speaker = '{} {}'.format(mep['first_name'], mep['last_name'])
+            if kind in ['mep', 'in_writing']:
+                speaker += ' ({})'.format(mep['group'][0])
+            heading = ('<span class="doc_subtitle_level1_bis">'
+                       '<span class="bold">{}, </span></span>'.format(
+                           escape(speaker)))
+            role = None
+            if kind == 'behalf':
+                role = s['behalf'].format(mep['group'][0])
+            elif kind == 'commission':
+                role = s['commission']
+            elif kind == 'in_writing':
+                role = s['in_writing']
+            if role is not None:
+                heading += '<span class="italic">{}</span>. '.format(
+                    escape(role))
+            heading += '&#8211; '
+            if intervention['marker'] is not None:
+                heading += '<span class="italic">({})</span> '.format(
+                    intervention['marker'])
+            paragraphs = []
+            for n_sentences in intervention['paragraphs']:
+                paragraphs.append(escape(' '.join(
+                    self.get_sentence(rng, s['words'])
+                    for i in range(n_sentences))))
+            paragraphs[0] = heading + paragraphs[0]
+            if intervention['applause']:
+                paragraphs.append(
+                    '(<span class="italic">{}</span>)'.format(
+                        escape(s['applause'])))
+        for paragraph in paragraphs:
+            lines.append('<p class="contents">{}</p>'.format(paragraph))
+        lines.extend(['</td>', '</tr>', '</table>'])
+        return lines
+
+    def render_sitting(self, language, a_date, sitting):
+        """Render a sitting as the HTML of the proceedings."""
+        s = strings[language]
+        rng = random.Random('{}-{}-{}'.format(
+            self.seed,
+            a_date.isoformat(),
+            language))
+        date_string = self.get_date_string(language, a_date)
+        lines = [
+            '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"'
+            ' "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+            '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="{0}"'
+            ' lang="{0}">'.format(language),
+            '<head>',
+            '<meta http-equiv="Content-Type" content="text/html;'
+            ' charset=UTF-8" />',
+            '<title>{} - {} - {}</title>'.format(
+                escape(s['title']),
+                escape(date_string),
+                escape(s['place'])),
+            '</head>',
+            '<body>',
+            '<table width="100%" border="0" cellpadding="0" cellspacing="0">',
+            '<tr>',
+            '<td class="doc_title" align="left" valign="top">'
+            '{}&#160;-&#160;{}</td>'.format(
+                escape(date_string),
+                escape(s['place'])),
+            '<td class="doc_title" align="right" valign="top">{}</td>'.format(
+                escape(s['edition'])),
+            '</tr>',
+            '</table>',
+            ]
+        number = 1
+        for idx, section in enumerate(sitting, 1):
+            if idx == 1:
+                title = s['opening']
+                interventions = section
+            else:
+                topic, interventions = section
+                title = s['debate'].format(s['topics'][topic])
+            lines.extend([
+                '<a name="creitem{}"></a>'.format(idx),
+                '<table class="doc_box_header" cellpadding="0"'
+                ' cellspacing="0" width="100%">',
+                '<tr>',
+                '<td class="doc_title" valign="top">{}. {}'.format(
+                    idx,
+                    escape(title)),
+                '</td>',
+                '</tr>',
+                '<tr><td>',
+                ])
+            for intervention in interventions:
+                lines.extend(self.render_intervention(
+                    language,
+                    number,
+                    intervention,
+                    rng))
+                number += 1
+            lines.extend(['</td></tr>', '</table>'])
+        lines.extend(['</body>', '</html>', ''])
+        return '\n'.join(lines)
+
+    def render_mep(self, mep):
+        """Render a MEP as a page of the history of the MEP."""
+        country = mep['country']
+        acronym, group = mep['group']
+        lines = [
+            '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"'
+            ' "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+            '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en"'
+            ' lang="en">',
+            '<head>',
+            '<meta http-equiv="Content-Type" content="text/html;'
+            ' charset=UTF-8" />',
+            '<title>{} {}</title>'.format(
+                escape(mep['first_name']),
+                escape(mep['last_name'].upper())),
+            '</head>',
+            '<body>',
+            '<ul class="zone_info_mep">',
+            '<li class="mep_name">{}<br />{}</li>'.format(
+                escape(mep['first_name']),
+                escape(mep['last_name'].upper())),
+            '<li class="nationality">',
+            '\t\t{}'.format(escape(mep['nationality'])),
+            '</li>',
+            '<li><span class="more_info">',
+            '\t\tDate of birth: {}, {}'.format(
+                mep['birth'].strftime('%d %B %Y'),
+                'Capital of {}'.format(escape(mep['nationality']))),
+            '</span></li>',
+            '</ul>',
+            '<div class="boxcontent nobackground">',
+            '<h4>Political groups</h4>',
+            '<ul class="events_collection">',
+            '<li class="{}">'.format(country),
+            '\t\t\t\t20.07.2004 \t/ 13.07.2009\t:\t{} - Member'.format(
+                escape(group)),
+            '</li>',
+            '<li class="{}">'.format(country),
+            '\t\t\t\t14.07.2009 \t/ ...\t:\t{} - Member'.format(
+                escape(group)),
+            '</li>',
+            '</ul>',
+            '<h4>National parties</h4>',
+            '<ul class="events_collection">',
+            '<li>',
+            '\t\t\t\t20.07.2004 \t/ ...\t:\tParty of {} ({})'.format(
+                escape(acronym),
+                escape(mep['nationality'])),
+            '</li>',
+            '</ul>',
+            '</div>',
+            '</body>',
+            '</html>',
+            '',
+            ]
+        return '\n'.join(lines)
+
+    def write(self, path, content):
+        with open(path, mode='w', encoding='utf-8') as ofile:
+            ofile.write(content)
+        self.n_files += 1
+        pass
+
+    def main(self):
+        self.meps = self.get_meps()
+        meps_dir = os.path.join(self.outdir, 'html', 'meps')
+        if not os.path.exists(meps_dir):
+            os.makedirs(meps_dir)
+        for mep in self.meps:
+            self.write(
+                os.path.join(meps_dir, '{}.html'.format(mep['id'])),
+                self.render_mep(mep))
+        for a_date in self.get_dates():
+            sitting = self.get_sitting(a_date)
+            for language in self.languages:
+                outdir = os.path.join(self.outdir, 'html', language)
+                if not os.path.exists(outdir):
+                    os.makedirs(outdir)
+                ofile_name = '{}.{}.html'.format(
+                    a_date.strftime('%Y%m%d'),
+                    language.upper())
+                self.write(
+                    os.path.join(outdir, ofile_name),
+                    self.render_sitting(language, a_date, sitting))
+        pass
+
+    def cli(self, args=None):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-o", "--output",
+            required=True,
+            help="path to the output directory.")
+        parser.add_argument(
+            "-l", "--language",
+            required=False,
+            nargs='+',
+            default=['en'],
+            choices=sorted(strings),
+            help="languages of the proceedings.")
+        parser.add_argument(
+            "-d", "--days",
+            required=False,
+            type=int,
+            default=10,
+            help="number of sittings in each language.")
+        parser.add_argument(
+            "-n", "--interventions",
+            required=False,
+            type=int,
+            default=40,
+            help="number of interventions of MEPs in each sitting.")
+        parser.add_argument(
+            "-m", "--meps",
+            required=False,
+            type=int,
+            default=100,
+            help="number of MEPs.")
+        parser.add_argument(
+            "-s", "--seed",
+            required=False,
+            type=int,
+            default=0,
+            help="seed of the random generator.")
+        parser.add_argument(
+            "--start",
+            required=False,
+            default='2009-07-14',
+            help="date of the first sitting as YYYY-MM-DD.")
+        args = parser.parse_args(args)
+        self.outdir = args.output
+        self.languages = args.language
+        self.days = args.days
+        self.interventions = args.interventions
+        self.n_meps = args.meps
+        self.seed = args.seed
+        self.start = datetime.datetime.strptime(args.start, '%Y-%m-%d').date()
+        self.localization = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            'localization')
+        pass
+
+
+if __name__ == '__main__':
+    print(GenerateCorpus())
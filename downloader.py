@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+
+Page = namedtuple('Page', ['url', 'status_code', 'content'])
+
+
+def atomic_write(path, content):
+    """Write bytes to a file through a temporary file and a rename.
+
+    A reader never sees a partially written file, even if the process is
+    killed while writing.
+
+    Keyword arguments:
+    path -- a string for the path to the file
+    content -- bytes to be written
+    """
+    tmp_path = '{}.{}.{}.tmp'.format(
+        path, os.getpid(), threading.get_ident())
+    with open(tmp_path, mode='wb') as ofile:
+        ofile.write(content)
+    os.replace(tmp_path, path)
+    pass
+
+
+class RateLimiter(object):
+    """Space out requests sent to the same host."""
+
+    def __init__(self, rate=None):
+        """Keyword arguments:
+        rate -- maximum number of requests per second and host (None for no
+            limit)
+        """
+        if rate:
+            self.interval = 1.0 / rate
+        else:
+            self.interval = 0.0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, host):
+        """Block until a request to host is allowed."""
+        if self.interval == 0.0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        pass
+
+
+class Downloader(object):
+    """Download URLs concurrently with a pool of threads."""
+
+    retry_status = {429, 500, 502, 503, 504}
+
+    def __init__(self, workers=1, rate=None, retries=3, backoff=1.0,
+                 timeout=60, verbose=True, cache=None):
+        """Keyword arguments:
+        workers -- number of concurrent requests
+        rate -- maximum number of requests per second and host
+        retries -- number of retries for failed requests
+        backoff -- seconds to wait before the first retry, doubled each time
+        timeout -- seconds to wait for the server
+        verbose -- print progress
+        cache -- an HttpCache for conditional requests, or None
+        """
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.verbose = verbose
+        self.cache = cache
+        self.limiter = RateLimiter(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url, probe=False, immutable=False):
+        """Request a URL retrying with exponential backoff.
+
+        Connection errors and server errors are retried. It returns a Page,
+        whose status_code is None if no response was ever received.
+
+        If there is a cache, URLs already cached are requested with their
+        validators, and a 304 response is answered from the cache.
+
+        Keyword arguments:
+        url -- a string for the URL to be requested
+        probe -- if True, only the status is retrieved and the body is never
+            downloaded
+        immutable -- if True, a cached response is used without sending any
+            request
+        """
+        headers = {}
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                metadata, cached_content = cached
+                if immutable or self.cache.offline:
+                    return Page(url, requests.codes.ok, cached_content)
+                headers = self.cache.get_validators(metadata)
+            elif self.cache.offline:
+                return Page(url, None, None)
+        host = urlsplit(url).netloc
+        page = Page(url, None, None)
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            self.limiter.wait(host)
+            try:
+                r = self.session.get(
+                    url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=probe)
+                if probe:
+                    r.close()
+                    content = None
+                else:
+                    content = r.content
+            except requests.RequestException:
+                continue
+            if r.status_code == requests.codes.not_modified:
+                page = Page(url, requests.codes.ok, cached_content)
+                break
+            page = Page(url, r.status_code, content)
+            if (r.status_code == requests.codes.ok and not probe and
+                    self.cache is not None):
+                self.cache.put(url, r.headers, content)
+            if r.status_code not in self.retry_status:
+                break
+        return page
+
+    def report(self, n, total, key, page):
+        """Print progress of the downloads."""
+        if self.verbose:
+            print('[{}/{}] {} {}'.format(n, total, key, page.status_code))
+        pass
+
+    def download(self, jobs, probe=False, immutable=False):
+        """Fetch URLs concurrently and yield pages as they are completed.
+
+        Keyword arguments:
+        jobs -- a list of (key, url) tuples, key identifies the URL
+        probe -- if True, only the status of each URL is retrieved
+        immutable -- if True, cached URLs are never requested again
+        """
+        total = len(jobs)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.fetch, url, probe, immutable): key
+                for key, url in jobs}
+            for n, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                page = future.result()
+                self.report(n, total, key, page)
+                yield key, page
+        pass
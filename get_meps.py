@@ -1,20 +1,30 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import argparse
 import requests
 from lxml import etree
 from io import BytesIO
-import fnmatch
+import hashlib
+from downloader import Downloader, atomic_write
+from http_cache import HttpCache
+from html_store import HtmlStore
+import html_store
 
 
 class GetMeps(object):
     """Get metadata of MEPs."""
 
-    def __init__(self):
-        self.cli()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, it is only set up and main is not called
+        """
+        self.cli(args)
         self.n_meps = 0
-        self.main()
+        if run:
+            self.main()
 
     def __str__(self):
         message = "{} MEPs' metadata files downloaded!".format(
@@ -22,59 +32,101 @@ class GetMeps(object):
             )
         return message
 
-    def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+    def read_journal(self):
+        """Read the journal of completed downloads.
+
+        It returns a dictionary whose keys are the IDs of the MEPs already
+        downloaded and whose values are the SHA-1 digests of their files.
+        """
+        journal = {}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, mode='r', encoding='utf-8') as ijour:
+                for line in ijour:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 2:
+                        journal[fields[0]] = fields[1]
+        return journal
+
+    def get_completed(self):
+        """Get the IDs whose files are in the journal and are not corrupt."""
+        completed = set()
+        for id, digest in self.read_journal().items():
+            ofpath = os.path.join(self.outdir, "{}.html".format(id))
+            try:
+                content = html_store.read(ofpath)
+            except OSError:
+                continue
+            if hashlib.sha1(content).hexdigest() == digest:
+                completed.add(id)
+        return completed
+
+    def get_list_error(self, page):
+        """Get the message shown if the list of MEPs could not be fetched.
 
         Keyword arguments:
-        directory -- a string for the input folder path
-        fileclue -- a string as glob pattern
+        page -- the Page returned by the downloader for the list of MEPs
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        if page.status_code is None and self.offline:
+            return ("The list of MEPs is not in the cache '{}', it cannot be"
+                    " downloaded with --offline.".format(self.cache))
+        elif page.status_code is None:
+            return "The list of MEPs could not be downloaded from {}.".format(
+                page.url)
+        return "The list of MEPs could not be downloaded from {} ({}).".format(
+            page.url,
+            page.status_code)
 
     def main(self):
+        if self.cache is not None:
+            cache = HttpCache(self.cache, offline=self.offline)
+        else:
+            cache = None
+        self.downloader = Downloader(
+            workers=self.jobs,
+            rate=self.rate,
+            retries=self.retries,
+            cache=cache)
+        self.journal_path = os.path.join(self.outdir, 'journal.tsv')
+        if self.store:
+            self.meps_store = HtmlStore(self.outdir)
         if self.fromfile is False:
             all_meps_url = ("http://www.europarl.europa.eu/meps/en/xml.html" +
                             "?query=full&filter=all&leg=0")
-            all_meps_r = requests.get(all_meps_url)
+            all_meps_r = self.downloader.fetch(all_meps_url)
+            if all_meps_r.status_code != requests.codes.ok:
+                sys.exit(self.get_list_error(all_meps_r))
             all_meps_xml = all_meps_r.content
             all_meps = etree.parse(BytesIO(all_meps_xml))
             all_mep_ids = all_meps.xpath('//id/text()')
-            if self.resume is True:
-                already_downloaded = self.get_files(self.outdir, "*.html")
-                already_downloaded = [
-                    os.path.splitext(
-                        os.path.basename(x))[0] for x in already_downloaded]
-                remaining_ids = set(all_mep_ids) - set(already_downloaded)
-                ids_to_download = set(remaining_ids)
-            else:
-                remaining_ids = set(all_mep_ids)
-                ids_to_download = set(remaining_ids)
         elif self.fromfile is not False:
             with open(self.fromfile, 'r', encoding='utf-8') as mep_ids_file:
                 all_mep_ids = mep_ids_file.read()
             all_mep_ids = all_mep_ids.strip()
-            remaining_ids = set(all_mep_ids.split('\n'))
-            ids_to_download = set(remaining_ids)
+            all_mep_ids = all_mep_ids.split('\n')
+        ids_to_download = set(all_mep_ids)
+        if self.resume is True:
+            ids_to_download = ids_to_download - self.get_completed()
         url_pattern = ("http://www.europarl.europa.eu/meps/en/" +
                        "{}/{}_history.html")
-        for id in ids_to_download:
-            print(id)
-            url = url_pattern.format(id, id)
-            r = requests.get(url)
-            if r.status_code == requests.codes.ok:
-                ofname = "{}.html".format(id)
-                ofpath = os.path.join(self.outdir, ofname)
-                with open(ofpath, mode='wb') as ohtml:
-                    ohtml.write(r.content)
-                self.n_meps += 1
-                remaining_ids.remove(id)
+        jobs = [(id, url_pattern.format(id, id))
+                for id in sorted(ids_to_download)]
+        with open(self.journal_path, mode='a', encoding='utf-8') as ojour:
+            for id, r in self.downloader.download(jobs):
+                if r.status_code == requests.codes.ok:
+                    ofname = "{}.html".format(id)
+                    if self.store:
+                        self.meps_store.put(ofname, r.content)
+                    else:
+                        ofpath = os.path.join(self.outdir, ofname)
+                        atomic_write(ofpath, r.content)
+                    ojour.write('{}\t{}\n'.format(
+                        id,
+                        hashlib.sha1(r.content).hexdigest()))
+                    ojour.flush()
+                    self.n_meps += 1
         pass
 
-    def cli(self):
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -90,15 +142,58 @@ class GetMeps(object):
             "-r", "--resume",
             required=False,
             action="store_true",
-            help="resume downloads from already downloaded files\
-                in output folder.")
-        args = parser.parse_args()
+            help="resume downloads, skipping files in the journal of\
+                the output folder which are not corrupt.")
+        parser.add_argument(
+            '-j', "--jobs",
+            required=False,
+            type=int,
+            default=4,
+            help="number of concurrent downloads.")
+        parser.add_argument(
+            "--rate",
+            required=False,
+            type=float,
+            default=10.0,
+            help="maximum number of requests per second to the server.")
+        parser.add_argument(
+            "--retries",
+            required=False,
+            type=int,
+            default=3,
+            help="number of retries with backoff for failed requests.")
+        parser.add_argument(
+            "--cache",
+            required=False,
+            default=None,
+            help="path to the HTTP cache directory.")
+        parser.add_argument(
+            "--offline",
+            required=False,
+            action="store_true",
+            help="only read the HTTP cache, never use the network.")
+        parser.add_argument(
+            "--store",
+            required=False,
+            action="store_true",
+            help="save pages in a compressed store instead of plain HTML\
+                files.")
+        args = parser.parse_args(args)
+        if args.offline and args.cache is None:
+            parser.error("--offline requires --cache.")
         self.outdir = args.output
         self.fromfile = args.fromfile
         self.resume = args.resume
+        self.jobs = args.jobs
+        self.rate = args.rate
+        self.retries = args.retries
+        self.cache = args.cache
+        self.offline = args.offline
+        self.store = args.store
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         pass
 
 
-print(GetMeps())
+if __name__ == '__main__':
+    print(GetMeps())
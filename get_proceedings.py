@@ -4,19 +4,28 @@ import os
 import argparse
 import requests
 import datetime
+import json
+from downloader import Downloader, atomic_write
+from http_cache import HttpCache
+from html_store import HtmlStore
 
 
 class GetProceedings(object):
     """Get proceedings of the European Parliament."""
 
-    def __init__(self):
-        self.cli()
-        self.main()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, it is only set up and main is not called
+        """
+        self.cli(args)
+        if run:
+            self.main()
 
     def __str__(self):
         message = "{} EuroParl's {} proceedings downloaded!".format(
             str(self.n_proceedings),
-            self.language)
+            ', '.join(self.languages))
         return message
 
     def valid_date(self, s):
@@ -34,63 +43,170 @@ class GetProceedings(object):
                  for x in strdates.split('\n')]
         return dates
 
+    def date_range(self):
+        """Generate all dates between the start and the end date."""
+        step = datetime.timedelta(days=1)
+        dates = []
+        a_date = self.start_date
+        while a_date <= self.end_date:
+            dates.append(a_date)
+            a_date += step
+        return dates
+
+    def save(self, key, content):
+        """Save the proceedings of a sitting as HTML.
+
+        Keyword arguments:
+        key -- a string YYYYMMDD.LANG for the sitting and language version
+        content -- bytes of the HTML document
+        """
+        language = key.split('.')[1]
+        if self.store:
+            self.stores[language].put(key + '.html', content)
+        else:
+            ofpath = os.path.join(self.outdirs[language], key + '.html')
+            atomic_write(ofpath, content)
+        pass
+
+    def get_key(self, a_date, language):
+        return "{}.{}".format(a_date.strftime('%Y%m%d'), language)
+
+    def get_url(self, a_date, language):
+        date_as_string = a_date.strftime('%Y%m%d')
+        url = self.url_pattern.format(
+            date_as_string,
+            language,
+            language)
+        return url
+
+    def download(self, sittings):
+        """Download the proceedings of a list of sittings concurrently.
+
+        All language versions of a sitting are requested one after the
+        other, so that they are fetched at the same time over the pool of
+        connections.
+
+        Keyword arguments:
+        sittings -- a list of (datetime, language) tuples sorted by date
+        """
+        jobs = [(self.get_key(d, l), self.get_url(d, l)) for d, l in sittings]
+        for key, page in self.downloader.download(jobs, immutable=True):
+            if page.status_code == requests.codes.ok:
+                self.save(key, page.content)
+                self.n_proceedings += 1
+        pass
+
+    def read_probes(self, language):
+        """Read the cache of dates already probed.
+
+        It returns two sets of strings (YYYY-MM-DD): dates with and without
+        proceedings.
+        """
+        probes_path = self.probes.format(language)
+        if not os.path.exists(probes_path):
+            return set(), set()
+        with open(probes_path, mode='r', encoding='utf-8') as fprobes:
+            probes = json.load(fprobes)
+        return set(probes['positive']), set(probes['negative'])
+
+    def write_probes(self, language, positive, negative):
+        """Write the cache of dates already probed."""
+        probes_path = self.probes.format(language)
+        probes = {'positive': sorted(positive), 'negative': sorted(negative)}
+        tmp_path = probes_path + '.tmp'
+        with open(tmp_path, mode='w', encoding='utf-8') as fprobes:
+            json.dump(probes, fprobes, indent=0)
+        os.replace(tmp_path, probes_path)
+        pass
+
+    def discover(self):
+        """Find the dates of the sittings within the range of dates.
+
+        Dates are probed concurrently without downloading the documents.
+        Responses are cached, so already probed dates are never requested
+        again. It returns a dictionary with the dates found per language.
+        """
+        dates = self.date_range()
+        positive = {}
+        negative = {}
+        jobs = []
+        for l in self.languages:
+            positive[l], negative[l] = self.read_probes(l)
+            for d in dates:
+                strdate = d.strftime('%Y-%m-%d')
+                if strdate not in positive[l] and strdate not in negative[l]:
+                    jobs.append((self.get_key(d, l), self.get_url(d, l)))
+        try:
+            for key, page in self.downloader.download(
+                    jobs, probe=True, immutable=True):
+                date_as_string, l = key.split('.')
+                strdate = datetime.datetime.strptime(
+                    date_as_string, '%Y%m%d').strftime('%Y-%m-%d')
+                if page.status_code == requests.codes.ok:
+                    positive[l].add(strdate)
+                elif (page.status_code is not None and
+                        page.status_code not in Downloader.retry_status):
+                    negative[l].add(strdate)
+        finally:
+            for l in self.languages:
+                self.write_probes(l, positive[l], negative[l])
+        found = {}
+        for l in self.languages:
+            found[l] = [
+                d for d in dates if d.strftime('%Y-%m-%d') in positive[l]]
+        return found
+
     def main(self):
         self.n_proceedings = 0
-        url_pattern = ("http://www.europarl.europa.eu/sides/getDoc.do?pubRef" +
-                       "=-//EP//TEXT+CRE+{}+ITEMS+DOC+XML+V0//{}&language={}")
+        self.url_pattern = (
+            "http://www.europarl.europa.eu/sides/getDoc.do?pubRef" +
+            "=-//EP//TEXT+CRE+{}+ITEMS+DOC+XML+V0//{}&language={}")
+        if self.cache is not None:
+            cache = HttpCache(self.cache, offline=self.offline)
+        else:
+            cache = None
+        self.downloader = Downloader(
+            workers=self.jobs,
+            rate=self.rate,
+            retries=self.retries,
+            cache=cache)
+        if self.store:
+            self.stores = {
+                l: HtmlStore(self.outdirs[l]) for l in self.languages}
         if self.dates is None:
-            step = datetime.timedelta(days=1)
-            dates = []
-            while self.start_date <= self.end_date:
-                date_as_string = self.start_date.strftime('%Y%m%d')
-                url = url_pattern.format(
-                    date_as_string,
-                    self.language,
-                    self.language)
-                r = requests.get(url)
-                if r.status_code == requests.codes.ok:
-                    print(date_as_string)
-                    dates.append(self.start_date.strftime('%Y-%m-%d'))
-                    ofname = "{}.{}.html".format(date_as_string, self.language)
-                    ofpath = os.path.join(self.outdir, ofname)
-                    with open(ofpath, mode='wb') as ohtml:
-                        ohtml.write(r.content)
-                    self.n_proceedings += 1
-                self.start_date += step
-            dates = '\n'.join(dates)
-            with open('dates.{}.txt'.format(self.language), mode='w',
-                      encoding='utf-8') as fdates:
-                fdates.write(dates)
+            found = self.discover()
+            for l in self.languages:
+                strdates = '\n'.join(
+                    [x.strftime('%Y-%m-%d') for x in found[l]])
+                with open('dates.{}.txt'.format(l), mode='w',
+                          encoding='utf-8') as fdates:
+                    fdates.write(strdates)
+            if not self.discover_only:
+                sittings = sorted(
+                    [(d, l) for l in self.languages for d in found[l]],
+                    key=lambda x: (x[0], self.languages.index(x[1])))
+                self.download(sittings)
         else:
-            dates = self.parse_dates()
-            for d in dates:
-                date_as_string = d.strftime('%Y%m%d')
-                url = url_pattern.format(
-                    date_as_string,
-                    self.language,
-                    self.language)
-                r = requests.get(url)
-                if r.status_code == requests.codes.ok:
-                    print(date_as_string)
-                    ofname = "{}.{}.html".format(date_as_string, self.language)
-                    ofpath = os.path.join(self.outdir, ofname)
-                    with open(ofpath, mode='wb') as ohtml:
-                        ohtml.write(r.content)
-                self.n_proceedings += 1
+            sittings = [
+                (d, l) for d in self.parse_dates() for l in self.languages]
+            self.download(sittings)
         pass
 
-    def cli(self):
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
             "-o", "--output",
             required=True,
-            help="path to the output directory.")
+            help=("path to the output directory, '{}' is replaced by the " +
+                  "language. Without '{}' and with several languages, " +
+                  "one subdirectory per language is used."))
         parser.add_argument(
             "-l", "--language",
             required=True,
+            nargs='+',
             choices=['en', 'es', 'de', 'fr', 'it'],
-            help="version to be downloaded.")
+            help="version(s) to be downloaded.")
         parser.add_argument(
             '-s', "--startdate",
             required=False,
@@ -109,15 +225,90 @@ class GetProceedings(object):
             help=("path to file containing one date per line" +
                   "in format YYYY-MM-DD.")
         )
-        args = parser.parse_args()
-        self.outdir = args.output
-        if not os.path.exists(self.outdir):
-            os.makedirs(self.outdir)
-        self.language = args.language.upper()
+        parser.add_argument(
+            '-j', "--jobs",
+            required=False,
+            type=int,
+            default=4,
+            help="number of concurrent downloads.")
+        parser.add_argument(
+            "--rate",
+            required=False,
+            type=float,
+            default=10.0,
+            help="maximum number of requests per second to the server.")
+        parser.add_argument(
+            "--retries",
+            required=False,
+            type=int,
+            default=3,
+            help="number of retries with backoff for failed requests.")
+        parser.add_argument(
+            "--probes",
+            required=False,
+            default=None,
+            help=("path to the cache of probed dates, '{}' is replaced " +
+                  "by the language, dates.{}.probes.json by default. " +
+                  "Without '{}', the language is added before the " +
+                  "extension if there are several languages."))
+        parser.add_argument(
+            "--discover-only",
+            required=False,
+            action="store_true",
+            help="only find the dates of the sittings, do not download.")
+        parser.add_argument(
+            "--cache",
+            required=False,
+            default=None,
+            help="path to the HTTP cache directory.")
+        parser.add_argument(
+            "--offline",
+            required=False,
+            action="store_true",
+            help="only read the HTTP cache, never use the network.")
+        parser.add_argument(
+            "--store",
+            required=False,
+            action="store_true",
+            help="save proceedings in a compressed store instead of\
+                plain HTML files.")
+        args = parser.parse_args(args)
+        if args.offline and args.cache is None:
+            parser.error("--offline requires --cache.")
+        self.languages = []
+        for l in args.language:
+            if l.upper() not in self.languages:
+                self.languages.append(l.upper())
+        self.outdirs = {}
+        for l in self.languages:
+            if '{}' in args.output:
+                self.outdirs[l] = args.output.format(l.lower())
+            elif len(self.languages) > 1:
+                self.outdirs[l] = os.path.join(args.output, l.lower())
+            else:
+                self.outdirs[l] = args.output
+            if not os.path.exists(self.outdirs[l]):
+                os.makedirs(self.outdirs[l])
         self.start_date = args.startdate
         self.end_date = args.enddate
         self.dates = args.dates
+        self.jobs = args.jobs
+        self.rate = args.rate
+        self.retries = args.retries
+        self.probes = args.probes
+        if self.probes is None:
+            self.probes = 'dates.{}.probes.json'
+        elif '{}' not in self.probes and len(self.languages) > 1:
+            # each language has its own dates, e.g. probes.json becomes
+            # probes.EN.json
+            root, ext = os.path.splitext(self.probes)
+            self.probes = root + '.{}' + ext
+        self.discover_only = args.discover_only
+        self.cache = args.cache
+        self.offline = args.offline
+        self.store = args.store
         pass
 
 
-print(GetProceedings())
+if __name__ == '__main__':
+    print(GetProceedings())
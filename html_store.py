@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import time
+import fnmatch
+import hashlib
+import threading
+from downloader import atomic_write
+
+
+class HtmlStore(object):
+    """Compressed content-addressed store of HTML pages.
+
+    Each page is compressed with gzip and saved once under objects/, named
+    after the SHA-256 of its content. The index (index.tsv) maps the name of
+    each page, e.g. 20090505.EN.html or 33569.html, to its digest, size and
+    time of storage.
+    """
+
+    index_name = 'index.tsv'
+
+    def __init__(self, directory):
+        """Keyword arguments:
+        directory -- a string for the path to the store folder
+        """
+        self.directory = directory
+        self.index_path = os.path.join(self.directory, self.index_name)
+        self.lock = threading.Lock()
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, mode='r', encoding='utf-8') as iindex:
+                for line in iindex:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 4:
+                        self.index[fields[0]] = (
+                            fields[1], int(fields[2]), float(fields[3]))
+
+    @classmethod
+    def is_store(cls, directory):
+        """Test if a folder is a store."""
+        return os.path.exists(os.path.join(directory, cls.index_name))
+
+    def get_object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def put(self, name, content):
+        """Store a page.
+
+        Keyword arguments:
+        name -- a string for the name of the page
+        content -- bytes of the page
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        opath = self.get_object_path(digest)
+        if not os.path.exists(opath):
+            os.makedirs(os.path.dirname(opath), exist_ok=True)
+            atomic_write(opath, gzip.compress(content, 6, mtime=0))
+        entry = (digest, len(content), time.time())
+        with self.lock:
+            with open(self.index_path, mode='a', encoding='utf-8') as oindex:
+                oindex.write('{}\t{}\t{}\t{}\n'.format(name, *entry))
+            self.index[name] = entry
+        pass
+
+    def get(self, name):
+        """Get the content of a page as bytes."""
+        digest = self.index[name][0]
+        with open(self.get_object_path(digest), mode='rb') as iobject:
+            return gzip.decompress(iobject.read())
+
+    def open(self, name):
+        """Open a page as a binary stream, decompressed as it is read."""
+        digest = self.index[name][0]
+        return gzip.open(self.get_object_path(digest), mode='rb')
+
+    def get_files(self, fileclue):
+        """Get the paths of all pages whose name matches a glob pattern."""
+        return [os.path.join(self.directory, x)
+                for x in sorted(fnmatch.filter(self.index, fileclue))]
+
+    def getsize(self, name):
+        """Get the uncompressed size of a page."""
+        return self.index[name][1]
+
+    def getmtime(self, name):
+        """Get the time when a page was stored."""
+        return self.index[name][2]
+
+
+stores = {}
+
+
+def get_store(directory):
+    """Get the store in a folder, or None if the folder is not a store."""
+    directory = os.path.normpath(directory)
+    if directory not in stores:
+        if HtmlStore.is_store(directory):
+            stores[directory] = HtmlStore(directory)
+        else:
+            return None
+    return stores[directory]
+
+
+def get_files(directory, fileclue):
+    """Get all files in a directory, or a store, matching a pattern.
+
+    Keyword arguments:
+    directory -- a string for the input folder path
+    fileclue -- a string as glob pattern
+    """
+    store = get_store(directory)
+    if store is not None:
+        return store.get_files(fileclue)
+    matches = []
+    for root, dirnames, filenames in os.walk(directory):
+        for filename in fnmatch.filter(filenames, fileclue):
+            matches.append(os.path.join(root, filename))
+    return matches
+
+
+def read(path):
+    """Read a file, or a page in a store, as bytes."""
+    if os.path.exists(path):
+        with open(path, mode='rb') as ifile:
+            return ifile.read()
+    store = get_store(os.path.dirname(path))
+    if store is None:
+        raise FileNotFoundError(path)
+    try:
+        return store.get(os.path.basename(path))
+    except KeyError:
+        raise FileNotFoundError(path)
+
+
+def open_file(path):
+    """Open a file, or a page in a store, as a binary stream."""
+    if os.path.exists(path):
+        return open(path, mode='rb')
+    store = get_store(os.path.dirname(path))
+    if store is None:
+        raise FileNotFoundError(path)
+    try:
+        return store.open(os.path.basename(path))
+    except KeyError:
+        raise FileNotFoundError(path)
+
+
+def getsize(path):
+    """Get the size of a file, or a page in a store."""
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    return get_store(os.path.dirname(path)).getsize(os.path.basename(path))
+
+
+def getmtime(path):
+    """Get the modification time of a file, or a page in a store."""
+    if os.path.exists(path):
+        return os.path.getmtime(path)
+    return get_store(os.path.dirname(path)).getmtime(os.path.basename(path))
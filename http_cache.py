@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+from downloader import atomic_write
+
+
+class HttpCache(object):
+    """On-disk cache of HTTP responses keyed by URL.
+
+    For each URL it stores the body of the response and its validators
+    (ETag and Last-Modified), so that conditional requests can be sent.
+    """
+
+    def __init__(self, directory, offline=False):
+        """Keyword arguments:
+        directory -- a string for the path to the cache folder
+        offline -- if True, the network is never used, only the cache
+        """
+        self.directory = directory
+        self.offline = offline
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def get_path(self, url):
+        """Get the path of the files cached for a URL, without extension."""
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, url):
+        """Get the cached response for a URL.
+
+        It returns a tuple (metadata, content) or None if the URL is not
+        cached.
+        """
+        path = self.get_path(url)
+        try:
+            with open(path + '.json', mode='r', encoding='utf-8') as imeta:
+                metadata = json.load(imeta)
+            with open(path + '.body', mode='rb') as ibody:
+                content = ibody.read()
+        except (OSError, ValueError):
+            return None
+        return metadata, content
+
+    def get_validators(self, metadata):
+        """Get the headers of a conditional request from cached metadata."""
+        headers = {}
+        if metadata.get('etag') is not None:
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified') is not None:
+            headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
+
+    def put(self, url, headers, content):
+        """Cache a successful response.
+
+        Keyword arguments:
+        url -- a string for the URL requested
+        headers -- the headers of the response
+        content -- bytes of the body of the response
+        """
+        path = self.get_path(url)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        metadata = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified')}
+        atomic_write(path + '.body', content)
+        atomic_write(
+            path + '.json',
+            json.dumps(metadata, ensure_ascii=False).encode('utf-8'))
+        pass
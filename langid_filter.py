@@ -3,69 +3,75 @@
 import os
 import argparse
 from lxml import etree
-import fnmatch
-import time
 from langdetect import detect_langs
 from langdetect.lang_detect_exception import LangDetectException
 from langid.langid import LanguageIdentifier, model
-
-
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
-
-    return timed
+import xml_io
+import manifest
+import telemetry
 
 
 class FilterOutUnexpectedLanguage(object):
     """Identify language of a given string."""
 
-    @timeit
-    def __init__(self):
-        self.cli()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the stage is only set up, e.g. to process trees in
+            memory with a pipeline
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'langid_filter',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
         self.n_proceedings = 0
+        self.expected = None  # language of the last file, if any
         self.identifier = LanguageIdentifier.from_modelstring(
             model,
             norm_probs=True)
-        self.main()
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(self, self.options),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
+        if self.expected is None:
+            return "{} EuroParl's proceedings language-identified!".format(
+                str(self.n_proceedings))
         message = "{} EuroParl's {} proceedings language-identified!".format(
             str(self.n_proceedings),
             self.expected)
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory matching a pattern, compressed or not.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return xml_io.get_files(directory, fileclue)
 
+    @telemetry.timed
     def read_xml(self, infile):
         """Parse a XML file.
 
         Keyword arguments:
         infile -- a string for the path to the file to be read.
         """
-        parser = etree.XMLParser(remove_blank_text=True)
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return etree.parse(input, parser)
+        return xml_io.read_xml(infile)
+
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.xml',
+            self.compress)
 
+    @telemetry.timed
     def serialize(self, infile, root):
         """Serialize Element as XML file.
 
@@ -73,15 +79,8 @@ class FilterOutUnexpectedLanguage(object):
         infile -- a string for the path to the input file processed.
         root -- Element to be serialized as XML.
         """
-        ofile_name = os.path.splitext(os.path.basename(infile))[0]
-        ofile_path = os.path.join(self.outdir, ofile_name+'.xml')
-        xml = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True).decode('utf-8')
-        with open(ofile_path, mode='w', encoding='utf-8') as ofile:
-            ofile.write(xml)
+        ofile_path = self.get_ofile_path(infile)
+        xml_io.serialize(root, ofile_path)
         pass
 
     def get_parent(self, element):
@@ -90,6 +89,7 @@ class FilterOutUnexpectedLanguage(object):
         text = etree.tostring(parent, method='text', encoding='utf-8').decode()
         return text
 
+    @telemetry.timed
     def is_expected(self, element):
         """Test if languge of Element's text is the expected language.
 
@@ -135,25 +135,55 @@ class FilterOutUnexpectedLanguage(object):
                 output = None
         return output
 
+    def process(self, tree):
+        """Filter out the text units of a tree not in its language, in place.
+
+        Keyword arguments:
+        tree -- ElementTree of the proceedings
+        """
+        root = tree.getroot()
+        self.expected = root.attrib['lang']
+        elements = tree.xpath('//{}'.format(self.text))
+        for e in elements:
+            is_expected = self.is_expected(e)
+            if is_expected is False or is_expected is None:
+                parent = e.getparent()
+                parent.remove(e)
+                if len(parent) == 0:
+                    parent.getparent().remove(parent)
+        return tree
+
+    def process_file(self, infile):
+        """Process a file and serialize the output."""
+        tree = self.read_xml(infile)
+        tree = self.process(tree)
+        self.telemetry.count(tree)
+        self.serialize(infile, tree.getroot())
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
+        pass
+
     def main(self):
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_xml(infile)
-            root = tree.getroot()
-            self.expected = root.attrib['lang']
-            elements = tree.xpath('//{}'.format(self.text))
-            for e in elements:
-                is_expected = self.is_expected(e)
-                if is_expected is False or is_expected is None:
-                    parent = e.getparent()
-                    parent.remove(e)
-                    if len(parent) == 0:
-                        parent.getparent().remove(parent)
-            self.serialize(infile, root)
-            self.n_proceedings += 1
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                with self.telemetry.measure(
+                        infile,
+                        [self.get_ofile_path(infile)]):
+                    self.process_file(infile)
+                self.n_proceedings += 1
+        finally:
+            # the files done so far are not processed again by the next
+            # run, even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("{} files up to date, skipped.".format(n_skipped))
         pass
 
-    def cli(self):
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -175,15 +205,32 @@ class FilterOutUnexpectedLanguage(object):
             required=False,
             default="*.xml",
             help="glob pattern to filter files.")
-        args = parser.parse_args()
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.force = args.force
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         self.pattern = args.pattern
+        self.compress = args.compress
         self.text = args.text
         self.pattern = args.pattern
         pass
 
 
-print(FilterOutUnexpectedLanguage())
+if __name__ == '__main__':
+    print(FilterOutUnexpectedLanguage())
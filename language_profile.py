@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import json
+import pickle
+import hashlib
+import regex as re
+from lxml import etree
+
+
+class LanguageProfile(object):
+    """Compiled XPath expressions and regular expressions for a language.
+
+    It is built once from localization/LANG.json, so that the transformation
+    of the proceedings never formats or compiles a pattern per intervention
+    or paragraph. Regular expressions which were evaluated with EXSLT in
+    XPath are applied in Python to the text nodes of the candidates instead.
+    """
+
+    langs = [
+        "BG",
+        "ES",
+        "CS",
+        "DA",
+        "DE",
+        "ET",
+        "EL",
+        "EN",
+        "FR",
+        "GA",
+        "HR",
+        "IT",
+        "LV",
+        "LT",
+        "HU",
+        "MT",
+        "NL",
+        "PL",
+        "PT",
+        "RO",
+        "SK",
+        "SL",
+        "FI",
+        "SV",
+        ]
+
+    xpaths = {
+        'italics': './/span[@class="italic"]',
+        'speaker_name': './/span[@class="doc_subtitle_level1_bis"]//text()',
+        'photo': './/img[@alt="MPphoto"]',
+        'heading': './/td[@class="doc_title"]//text()',
+        'doc_subtitles': './/span[@class="doc_subtitle_level1_bis"]',
+        'paragraphs': './/p[@class="contents" or @class="doc_subtitle_level1"]',
+        'date': ('//td[@class="doc_title" and @align="left" and ' +
+                 '@valign="top"]'),
+        'edition': ('//td[@class="doc_title" and @align="right" and ' +
+                    '@valign="top"]'),
+        'sections': '//table[@class="doc_box_header" and @cellpadding="0"]',
+        'is_section': ('self::table[@class="doc_box_header" and ' +
+                       '@cellpadding="0"]'),
+        'interventions': './/table[@cellpadding="5"][.//img[@alt="MPphoto"]]',
+        'texts': './/text()',
+        }
+
+    def __init__(self, language, localization_dir='localization'):
+        """Keyword arguments:
+        language -- 2-letter ISO code of the language
+        localization_dir -- a string for the path to the localization folder
+        """
+        self.language = language
+        self.path = os.path.join(localization_dir, language + '.json')
+        with open(self.path, mode='r', encoding='utf-8') as jfile:
+            self.loc = json.load(jfile)
+        langs = '|'.join(self.langs)
+        self.president_alternation = '|'.join(self.loc['president'])
+        # the alternation is not grouped, \Z only applies to the last item
+        self.president = re.compile(
+            r'{}\Z'.format(self.president_alternation))
+        self.in_writing = re.compile(self.loc['in_writing'])
+        role_pattern = (
+            r'^[\s\xad\-–−—\.]*(?:{})[\s\xad\-–−\.]*' +
+            r'(?:\([A-Z][A-Z]\))?[\s\xad\-–−—\.]*$')
+        self.role = re.compile(
+            role_pattern.format('|'.join(self.loc['roles'])))
+        self.language_marker = re.compile(
+            r'^[\xad\s\.—–\-−,\(]*({})[\xad\s\.—–\-−,\)]*'.format(langs))
+        self.lang_anywhere = re.compile(r'.*({}).*'.format(langs))
+        self.lang_in_text = re.compile(r'\(({})\)'.format(langs))
+        self.lang_in_text_and_spaces = re.compile(r'\(({})\) *'.format(langs))
+        self.months = {
+            month.lower(): n for n, month in enumerate(self.loc['months'], 1)}
+        self.sitting_date = re.compile(
+            self.loc['sitting_date'].format(
+                days='|'.join(self.loc['days']),
+                months='|'.join(self.loc['months'])),
+            re.IGNORECASE)
+        self.compile_xpaths()
+
+    def compile_xpaths(self):
+        for name, xpath in self.xpaths.items():
+            setattr(self, name, etree.XPath(xpath))
+        pass
+
+    def __getstate__(self):
+        """XPath objects cannot be pickled, they are compiled again."""
+        state = self.__dict__.copy()
+        for name in self.xpaths:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compile_xpaths()
+        pass
+
+    def get_texts(self, element):
+        """Get the text nodes which are children of an element."""
+        texts = []
+        if element.text is not None:
+            texts.append(element.text)
+        for child in element:
+            if child.tail is not None:
+                texts.append(child.tail)
+        return texts
+
+    def find_italics(self, element, pattern):
+        """Find italic spans having a text node matched by a pattern.
+
+        It is equivalent to the XPath expression
+        .//span[@class="italic"][text()[re:test(., pattern)]].
+        """
+        output = []
+        for span in self.italics(element):
+            for text in self.get_texts(span):
+                if pattern.search(text) is not None:
+                    output.append(span)
+                    break
+        return output
+
+    def parse_date(self, string):
+        """Parse the date of a sitting with the localized day and month names.
+
+        It returns a datetime.date, or None if the string does not follow the
+        format of the language, e.g. 'Thursday, 15 January 2009'.
+        """
+        match = self.sitting_date.match(string)
+        if match is None:
+            return None
+        try:
+            return datetime.date(
+                int(match.group('year')),
+                self.months[match.group('month').lower()],
+                int(match.group('day')))
+        except ValueError:
+            return None
+
+    @classmethod
+    def get_version(cls, fpath):
+        """Get the hash of this module and of a localization file.
+
+        A profile saved by another version of the code, or built from
+        another version of the localization, is not reused.
+        """
+        digest = hashlib.sha256()
+        for path in [__file__, fpath]:
+            with open(path, mode='rb') as ifile:
+                digest.update(ifile.read())
+        return digest.hexdigest()
+
+    @classmethod
+    def load(cls, language, localization_dir='localization', cache_dir=None):
+        """Load a profile, from a cache on disk if it is up to date.
+
+        Keyword arguments:
+        language -- 2-letter ISO code of the language
+        localization_dir -- a string for the path to the localization folder
+        cache_dir -- a string for the path to the cache folder, or None
+        """
+        if cache_dir is None:
+            return cls(language, localization_dir)
+        fpath = os.path.join(localization_dir, language + '.json')
+        cpath = os.path.join(cache_dir, 'profile.{}.pickle'.format(language))
+        version = cls.get_version(fpath)
+        if os.path.exists(cpath):
+            with open(cpath, mode='rb') as icache:
+                saved = pickle.load(icache)
+            if isinstance(saved, tuple) and saved[0] == version:
+                return saved[1]
+        profile = cls(language, localization_dir)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = '{}.{}.tmp'.format(cpath, os.getpid())
+        with open(tmp_path, mode='wb') as ocache:
+            pickle.dump((version, profile), ocache)
+        os.replace(tmp_path, cpath)
+        return profile
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Bounded least-recently-used cache with hit and miss statistics.
+
+    It can be warmed up from a file and saved back at the end of a run. In a
+    pool of processes, each worker keeps its own cache and records its
+    updates, which are sent back and merged into the cache of the parent.
+    """
+
+    missing = object()
+
+    def __init__(self, maxsize=100000):
+        """Keyword arguments:
+        maxsize -- maximum number of entries, the least recently used entries
+            are discarded first
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.record_updates = False
+        self.updates = {}
+        self.update_hits = 0
+        self.update_misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Get the value of a key, counting hits and misses."""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Set the value of a key, discarding the oldest entry if full."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        if self.record_updates:
+            self.updates[key] = value
+        pass
+
+    def memoize(self, function, key):
+        """Get the value of a key, computing it with function(key) on a miss.
+
+        Keyword arguments:
+        function -- a function without side effects
+        key -- the argument of the function
+        """
+        value = self.get(key, self.missing)
+        if value is self.missing:
+            value = function(key)
+            self.put(key, value)
+        return value
+
+    def pop_updates(self):
+        """Get hits, misses and entries since the last call, and reset them."""
+        updates = (
+            self.hits - self.update_hits,
+            self.misses - self.update_misses,
+            self.updates)
+        self.update_hits = self.hits
+        self.update_misses = self.misses
+        self.updates = {}
+        return updates
+
+    def merge(self, updates):
+        """Merge the updates of another cache, as returned by pop_updates."""
+        hits, misses, entries = updates
+        self.hits += hits
+        self.misses += misses
+        for key, value in entries.items():
+            self.put(key, value)
+        pass
+
+    def stats(self):
+        """Get a string with the statistics of the cache."""
+        total = self.hits + self.misses
+        if total > 0:
+            rate = 100.0 * self.hits / total
+        else:
+            rate = 0.0
+        return "{} hits, {} misses ({:.1f}% hit rate), {} entries".format(
+            self.hits,
+            self.misses,
+            rate,
+            len(self.entries))
+
+    def load(self, path, version=None):
+        """Warm up the cache with the entries saved in a file.
+
+        The entries are ignored if they were saved with another version,
+        e.g. by another version of the function which computed them.
+
+        Keyword arguments:
+        path -- a string for the path to the file
+        version -- a string identifying the function cached, see dump
+        """
+        if os.path.exists(path):
+            with open(path, mode='rb') as icache:
+                saved = pickle.load(icache)
+            if isinstance(saved, tuple) and saved[0] == version:
+                for key, value in saved[1]:
+                    self.put(key, value)
+        pass
+
+    def dump(self, path, version=None):
+        """Save the entries of the cache in a file, with their version."""
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, mode='wb') as ocache:
+            pickle.dump((version, list(self.entries.items())), ocache)
+        os.replace(tmp_path, path)
+        pass
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import types
+import hashlib
+import html_store
+import xml_io
+
+
+# options which do not change the content of the output files
+ignored_options = {
+    'input',
+    'output',
+    'xml',
+    'pattern',
+    'jobs',
+    'force',
+    'profile_cache',
+    'name_cache',
+    'cache_size',
+    'stream',
+    'telemetry',
+    'profile',
+    'prometheus',
+    }
+
+# folder of the modules of the project, those hashed in the version of a stage
+project_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def hash_bytes(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(path):
+    """Get the SHA-256 of a file, or a page in a store."""
+    return hash_bytes(xml_io.read(path))
+
+
+def get_project_modules(module):
+    """Get a module and the modules of the project it imports, recursively.
+
+    Modules imported with "import x" and those of the functions and classes
+    imported with "from x import y" are found among the globals of a module.
+    Modules outside the folder of the project, e.g. lxml, are left out.
+    """
+    modules = {}
+    pending = [module]
+    while len(pending) > 0:
+        module = pending.pop()
+        path = getattr(module, '__file__', None)
+        if (path is None or
+                module.__name__ in modules or
+                os.path.dirname(os.path.abspath(path)) != project_dir):
+            continue
+        modules[module.__name__] = module
+        for value in list(vars(module).values()):
+            if not isinstance(value, types.ModuleType):
+                value = sys.modules.get(getattr(value, '__module__', None))
+            if value is not None:
+                pending.append(value)
+    return [modules[x] for x in sorted(modules)]
+
+
+def get_version(stage, files=()):
+    """Get the version of a stage as the hash of the code it runs.
+
+    The source of the module of the stage, of the modules of the project it
+    imports and the files it reads besides its input are hashed, so any
+    change of the code of the stage, of a shared module or of its
+    localization invalidates its outputs.
+
+    Keyword arguments:
+    stage -- an instance of a stage
+    files -- paths to files which determine what the stage does, e.g.
+        localization/LANG.json
+    """
+    digest = hashlib.sha256()
+    paths = [x.__file__ for x in get_project_modules(
+        sys.modules[type(stage).__module__])]
+    for path in paths + list(files):
+        with open(path, mode='rb') as ifile:
+            digest.update(hash_bytes(ifile.read()).encode('ascii'))
+    return digest.hexdigest()
+
+
+def get_config(stage, options, dependencies=(), files=()):
+    """Get the configuration of a stage which determines its outputs.
+
+    Keyword arguments:
+    stage -- an instance of a stage
+    options -- a dictionary with the parsed command-line arguments
+    dependencies -- names of the options which are paths to files read by
+        the stage besides its input, e.g. MEPs' metadata, their content is
+        hashed instead of their path
+    files -- paths to files read by the stage which are not options, e.g.
+        its localization, hashed with its version
+    """
+    config = {}
+    for key, value in options.items():
+        if key in ignored_options:
+            continue
+        if key in dependencies and value is not None:
+            value = hash_file(value)
+        config[key] = value
+    return {'version': get_version(stage, files), 'options': config}
+
+
+class Manifest(object):
+    """Record how each output file of a stage was produced.
+
+    For each input file it keeps the hash of its content, the hash of the
+    configuration of the stage (its version and options) and the paths of
+    the output files. An input whose content and configuration are unchanged
+    since its outputs were written does not need to be processed again. As
+    each stage reads the outputs of the previous one, a change is propagated
+    downstream only to the files whose content actually changed.
+    """
+
+    def __init__(self, directory, config=None, force=False,
+                 filename='.manifest.json'):
+        """Keyword arguments:
+        directory -- a string for the path to the output folder
+        config -- a JSON serializable object, see get_config
+        force -- if True, no input is considered up to date
+        filename -- a string for the name of the manifest in the folder
+        """
+        self.path = os.path.join(directory, filename)
+        self.config = json.dumps(config, sort_keys=True)
+        self.config_hash = hash_bytes(self.config.encode('utf-8'))
+        self.force = force
+        self.entries = {}
+        self.updates = {}
+        self.hashes = {}
+        self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_key(self, infile):
+        return os.path.basename(infile)
+
+    def get_input_hash(self, infile, entry=None):
+        """Get the hash of an input file.
+
+        If its size and modification time are the ones recorded in entry,
+        the recorded hash is reused without reading the file.
+        """
+        size = html_store.getsize(infile)
+        mtime = html_store.getmtime(infile)
+        if (entry is not None and
+                entry['size'] == size and
+                entry['mtime'] == mtime):
+            digest = entry['input']
+        else:
+            digest = hash_file(infile)
+        self.hashes[infile] = (digest, size, mtime)
+        return digest
+
+    def is_current(self, infile):
+        """Check if the outputs of an input file are up to date."""
+        if self.force:
+            return False
+        entry = self.entries.get(self.get_key(infile))
+        if entry is None or entry['config'] != self.config_hash:
+            return False
+        if not all(os.path.exists(x) for x in entry['outputs']):
+            return False
+        return self.get_input_hash(infile, entry) == entry['input']
+
+    def record(self, infile, outputs):
+        """Record the outputs written for an input file.
+
+        Keyword arguments:
+        infile -- a string for the path to the input file
+        outputs -- a list of paths to the output files, those not written are
+            ignored
+        """
+        if infile not in self.hashes:
+            self.get_input_hash(infile)
+        digest, size, mtime = self.hashes.pop(infile)
+        entry = {
+            'input': digest,
+            'size': size,
+            'mtime': mtime,
+            'config': self.config_hash,
+            'outputs': [x for x in outputs if os.path.exists(x)],
+            }
+        key = self.get_key(infile)
+        self.entries[key] = entry
+        self.updates[key] = entry
+        pass
+
+    def pop_updates(self):
+        """Get the entries recorded since the last call, and reset them."""
+        updates = self.updates
+        self.updates = {}
+        return updates
+
+    def merge(self, updates):
+        """Merge the entries recorded by another manifest, e.g. a worker."""
+        self.entries.update(updates)
+        pass
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, mode='r', encoding='utf-8') as imanifest:
+                    self.entries = json.load(imanifest)
+            except ValueError:
+                # a corrupt manifest only means everything is rebuilt
+                self.entries = {}
+        pass
+
+    def dump(self):
+        """Save the manifest, through a temporary file and a rename."""
+        directory = os.path.dirname(self.path)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, mode='w', encoding='utf-8') as omanifest:
+            json.dump(self.entries, omanifest, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        pass
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+import os
+import datetime
+import sqlite3
+from bisect import bisect_right
+from urllib.request import pathname2url
+
+
+# attributes of the speakers, in the order they are added to interventions
+mep_attributes = ['name', 'nationality', 'birth_date', 'birth_place']
+n_party_attributes = ['n_party']
+p_group_attributes = ['p_group', 'm_state']
+
+# tables of the snapshot written by meps_ie.py, and their columns
+snapshot_tables = [
+    ('meps', [
+        'id',
+        'name',
+        'nationality',
+        'birth_date',
+        'birth_place',
+        'death_date',
+        'death_place',
+        ]),
+    ('political_groups', [
+        'id',
+        'm_state',
+        's_date',
+        'e_date',
+        'p_group',
+        'p_group_role',
+        ]),
+    ('national_parties', ['id', 's_date', 'e_date', 'n_party']),
+    ]
+
+
+def to_date(value):
+    """Convert a date, a Timestamp or a YYYY-MM-DD string to a date."""
+    if isinstance(value, datetime.datetime):
+        # a Timestamp of pandas is a datetime
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value[:10])
+
+
+def is_missing(value):
+    """Check if a value is missing: None, NaN or NaT.
+
+    NaN and NaT are the only values which are not equal to themselves, so
+    that pandas is not needed to check the rows of a snapshot.
+    """
+    return value is None or value != value
+
+
+def get_values(row, attributes):
+    """Get the (attribute, value) tuples of a row, without missing values.
+
+    Missing values are NaN in a DataFrame and None in a snapshot.
+    """
+    return tuple((x, row[x]) for x in attributes
+                 if row[x] is not None and type(row[x]) is not float)
+
+
+def read_tables(meps, n_parties=None, p_groups=None):
+    """Read the CSV files of MEPs' metadata written by meps_ie.py.
+
+    It returns a tuple of DataFrames (meps_df, n_parties_df, p_groups_df),
+    the tables of national parties and political groups are None if their
+    path is None.
+
+    Keyword arguments:
+    meps -- a string for the path to meps.csv
+    n_parties -- a string for the path to national_parties.csv, or None
+    p_groups -- a string for the path to political_groups.csv, or None
+    """
+    # pandas takes longer to import than a snapshot to load, it is only
+    # imported to read CSV files
+    import pandas as pd
+    meps_df = pd.read_csv(
+        meps,
+        sep='\t',
+        encoding='utf-8',
+        dtype={'id': str}
+        )
+    n_parties_df = None
+    if n_parties is not None:
+        n_parties_df = pd.read_csv(
+            n_parties,
+            sep='\t',
+            encoding='utf-8',
+            parse_dates=[1, 2],
+            dtype={'id': str}
+            )
+    p_groups_df = None
+    if p_groups is not None:
+        p_groups_df = pd.read_csv(
+            p_groups,
+            sep='\t',
+            encoding='utf-8',
+            parse_dates=[2, 3],
+            dtype={'id': str}
+            )
+    return meps_df, n_parties_df, p_groups_df
+
+
+def write_snapshot(path, tables):
+    """Write the tables of MEPs' metadata as a SQLite file with indexes.
+
+    The file is written through a temporary file and a rename, so that
+    readers never see it half written.
+
+    Keyword arguments:
+    path -- a string for the path to the SQLite file
+    tables -- a dictionary of lists of rows as tuples by name of table, in
+        the order of the columns of snapshot_tables, dates as YYYY-MM-DD
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        for name, columns in snapshot_tables:
+            connection.execute('CREATE TABLE {} ({})'.format(
+                name,
+                ', '.join('{} TEXT'.format(x) for x in columns)))
+            connection.executemany(
+                'INSERT INTO {} VALUES ({})'.format(
+                    name,
+                    ', '.join('?' for x in columns)),
+                tables[name])
+            connection.execute('CREATE INDEX {0}_id ON {0} (id)'.format(name))
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    pass
+
+
+def read_snapshot(path):
+    """Read the tables of a snapshot, as lists of dictionaries by name.
+
+    The file is opened read-only, so that any number of processes can read
+    it at the same time. Rows keep the order of the tables of meps_ie.py.
+    """
+    uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(path)))
+    connection = sqlite3.connect(uri, uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        return {name: [dict(x) for x in connection.execute(
+                    'SELECT * FROM {} ORDER BY rowid'.format(name))]
+                for name, columns in snapshot_tables}
+    finally:
+        connection.close()
+
+
+class Intervals(object):
+    """Values of a MEP over intervals of dates, e.g. their political groups.
+
+    Intervals can overlap, and then the value of the row that comes first
+    in the table wins. The dates where the value can change are sorted, and
+    the value between each pair of them is computed once, so that the value
+    at a date is found with a binary search.
+    """
+
+    def __init__(self, rows):
+        """Keyword arguments:
+        rows -- a list of tuples (s_date, e_date, values) in the order of the
+            table, dates are inclusive
+        """
+        boundaries = set()
+        for s_date, e_date, values in rows:
+            boundaries.add(s_date)
+            boundaries.add(e_date + datetime.timedelta(days=1))
+        self.boundaries = sorted(boundaries)
+        self.values = []
+        for boundary in self.boundaries:
+            value = None
+            for s_date, e_date, values in rows:
+                if s_date <= boundary <= e_date:
+                    value = values
+                    break
+            self.values.append(value)
+
+    def get(self, a_date):
+        """Get the values at a date, or None."""
+        idx = bisect_right(self.boundaries, a_date) - 1
+        if idx < 0:
+            return None
+        return self.values[idx]
+
+
+class MepIndex(object):
+    """Index of the metadata of MEPs, built once from the tables of meps_ie.
+
+    The attributes of a MEP, and those of their national party and political
+    group at a date, are found with a dictionary lookup and a binary search
+    in the intervals of the MEP, instead of scanning the tables for each
+    intervention.
+    """
+
+    def __init__(self, meps, n_parties=None, p_groups=None):
+        """Keyword arguments:
+        meps -- a list of dictionaries, the rows of the table of MEPs
+        n_parties -- a list of dictionaries, the rows of the table of
+            national parties, or None
+        p_groups -- a list of dictionaries, the rows of the table of
+            political groups, or None
+        """
+        self.meps = {}
+        for row in meps:
+            if row['id'] not in self.meps:
+                self.meps[row['id']] = get_values(row, mep_attributes)
+        self.n_parties = self.get_intervals(n_parties, n_party_attributes)
+        self.p_groups = self.get_intervals(p_groups, p_group_attributes)
+
+    @classmethod
+    def from_dataframes(cls, meps_df, n_parties_df=None, p_groups_df=None):
+        """Index the tables read from the CSV files of meps_ie.py.
+
+        Keyword arguments:
+        meps_df -- DataFrame of MEPs, as read from meps.csv
+        n_parties_df -- DataFrame of national parties, or None
+        p_groups_df -- DataFrame of political groups, or None
+        """
+        return cls(*[None if x is None else x.to_dict('records')
+                     for x in [meps_df, n_parties_df, p_groups_df]])
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """Index the tables of a snapshot written by meps_ie.py."""
+        tables = read_snapshot(path)
+        return cls(
+            tables['meps'],
+            tables['national_parties'],
+            tables['political_groups'])
+
+    def __len__(self):
+        return len(self.meps)
+
+    def __contains__(self, speaker_id):
+        return speaker_id in self.meps
+
+    def get_intervals(self, table, attributes):
+        """Get the intervals of each MEP in a table, by ID."""
+        if table is None:
+            return {}
+        rows = {}
+        for row in table:
+            if is_missing(row['s_date']) or is_missing(row['e_date']):
+                continue
+            rows.setdefault(row['id'], []).append((
+                to_date(row['s_date']),
+                to_date(row['e_date']),
+                get_values(row, attributes)))
+        return {k: Intervals(v) for k, v in rows.items()}
+
+    def lookup(self, speaker_id, a_date):
+        """Get the metadata of a speaker at a date.
+
+        It returns a tuple of (attribute, value) tuples, or None if the
+        speaker is not a known MEP.
+
+        Keyword arguments:
+        speaker_id -- a string for the ID of the MEP
+        a_date -- a date, the date of the sitting
+        """
+        metadata = self.meps.get(speaker_id)
+        if metadata is None:
+            return None
+        for intervals in [self.n_parties, self.p_groups]:
+            if speaker_id in intervals:
+                values = intervals[speaker_id].get(a_date)
+                if values is not None:
+                    metadata = metadata + values
+        return metadata
@@ -5,36 +5,60 @@ import argparse
 import datetime
 from lxml import etree, html
 from lxml.html.clean import Cleaner
-import fnmatch  # To match files by pattern
+from io import BytesIO
 import re
-import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import html_store
+import telemetry
+import mep_metadata
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
+# columns of the tables of the history of MEPs
+political_groups_columns = [
+    'id',
+    'm_state',
+    's_date',
+    'e_date',
+    'p_group',
+    'p_group_role',
+    ]
 
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
+national_parties_columns = ['id', 's_date', 'e_date', 'n_party']
 
-    return timed
+# columns with few distinct values, typed as categories in Parquet files
+categorical_columns = ['nationality', 'm_state', 'p_group', 'p_group_role']
+
+# dates in the histories of MEPs
+date_pattern = re.compile(r'^\d{2}\.\d{2}\.\d{4}$')
 
 
 class TransformHtmlProceedingsToXml(object):
     """Get proceedings of the European Parliament."""
 
-    @timeit
-    def __init__(self):
-        self.cli()
-        self.infiles = self.get_files(self.indir, self.pattern)
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, it is only set up and main is not called
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'meps_ie',
+            self.options)
+        # sorted by ID, so that the tables do not depend on the order of the
+        # files in the folder or on the number of jobs
+        self.infiles = sorted(
+            self.get_files(self.indir, self.pattern),
+            key=self.get_id)
         self.n_proceedings = 0
+        self.errors = []
         self.rm_a = Cleaner(remove_tags=['a'])
-        self.main()
+        if run:
+            self.main()
 
     def __str__(self):
         message = "Information for {} MEPs extracted!".format(
@@ -42,22 +66,19 @@ class TransformHtmlProceedingsToXml(object):
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory, or a store, matching a pattern.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return html_store.get_files(directory, fileclue)
 
+    @telemetry.timed
     def read_html(self, infile):
-        """Parse a HTML file."""
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return html.parse(input)
+        """Parse a HTML file, or a page in a store."""
+        parser = html.HTMLParser(encoding='utf-8')
+        return html.parse(BytesIO(html_store.read(infile)), parser)
 
     def serialize(self, infile, root):
         ofile_name = os.path.splitext(os.path.basename(infile))[0]
@@ -72,7 +93,10 @@ class TransformHtmlProceedingsToXml(object):
         pass
 
     def get_name(self, tree):
-        name = tree.xpath('//li[@class="mep_name"]')[0]
+        name = tree.xpath('//li[@class="mep_name"]')
+        if len(name) == 0:
+            raise ValueError("No name of MEP found.")
+        name = name[0]
         name = self.rm_a.clean_html(name)
         name = html.tostring(name).decode('utf-8')
         name = re.sub(r'[\t\n]', r'', name)
@@ -82,8 +106,10 @@ class TransformHtmlProceedingsToXml(object):
         return name
 
     def get_nationality(self, tree):
-        nationality = tree.find_class('nationality')[0]
-        nationality = nationality.text.strip()
+        nationality = tree.find_class('nationality')
+        if len(nationality) == 0 or nationality[0].text is None:
+            raise ValueError("No nationality of MEP found.")
+        nationality = nationality[0].text.strip()
         return nationality
 
     def get_id(self, infile):
@@ -94,6 +120,7 @@ class TransformHtmlProceedingsToXml(object):
         output = datetime.datetime.strptime(a_date, a_pattern).date()
         return output
 
+    @telemetry.timed
     def get_birth(self, tree):
         birth = tree.xpath('.//span[@class="more_info"]')
         birth_date = None
@@ -124,11 +151,19 @@ class TransformHtmlProceedingsToXml(object):
                     death_place = None
         return birth_date, birth_place, death_date, death_place
 
+    @telemetry.timed
     def get_political_groups(self, tree, id):
+        """Get the political groups of a MEP as a list of dictionaries.
+
+        Dates are kept as strings, they are parsed at once for all MEPs by
+        parse_dates. An end date is None if the membership is ongoing.
+        """
         political_groups = tree.xpath('.//div[@class="boxcontent nobackground"]/h4[contains(., "Political groups")]/following-sibling::ul[1]//li')
         output = []
         for i in political_groups:
             info = i.text
+            if info is None:
+                raise ValueError("No text in a political group of MEP.")
             info = re.sub(r'\n', r'', info)
             info = re.sub(r'\t+', r'\t', info)
             info = re.sub(r' \t/ ', r'\t', info)
@@ -139,11 +174,11 @@ class TransformHtmlProceedingsToXml(object):
             info = info.split('\t')
             info = [x.strip() for x in info]
             m_state = i.attrib['class']
-            s_date = self.parse_date(info[0], "%d.%m.%Y")
+            s_date = info[0]
             if info[1] == '...':
-                e_date = self.date
+                e_date = None
             else:
-                e_date = self.parse_date(info[1], "%d.%m.%Y")
+                e_date = info[1]
             p_group = info[2]
             p_group_role = info[3]
             output.append({
@@ -155,11 +190,15 @@ class TransformHtmlProceedingsToXml(object):
                 'p_group_role': p_group_role})
         return output
 
+    @telemetry.timed
     def get_national_parties(self, tree, id):
+        """Get the national parties of a MEP, as get_political_groups."""
         political_groups = tree.xpath('.//div[@class="boxcontent nobackground"]/h4[contains(., "National parties")]/following-sibling::ul[1]//li')
         output = []
         for i in political_groups:
             info = i.text
+            if info is None:
+                raise ValueError("No text in a national party of MEP.")
             info = re.sub(r'\n', r'', info)
             info = re.sub(r'\t+', r'\t', info)
             info = re.sub(r' \t/ ', r'\t', info)
@@ -169,11 +208,11 @@ class TransformHtmlProceedingsToXml(object):
             info = info.strip()
             info = info.split('\t')
             info = [x.strip() for x in info]
-            s_date = self.parse_date(info[0], "%d.%m.%Y")
+            s_date = info[0]
             if info[1] == '...':
-                e_date = self.date
+                e_date = None
             else:
-                e_date = self.parse_date(info[1], "%d.%m.%Y")
+                e_date = info[1]
             n_party = info[2]
             output.append({
                 'id': id,
@@ -183,12 +222,17 @@ class TransformHtmlProceedingsToXml(object):
         return output
 
     def extract_info(self, infile):
+        """Extract the information of a MEP from a page.
+
+        It returns a tuple (id, mep, political_groups, national_parties), to
+        be added to the tables with add_info.
+        """
         id = self.get_id(infile)
         tree = self.read_html(infile).getroot()
         name = self.get_name(tree)
         nationality = self.get_nationality(tree)
         birth_date, birth_place, death_date, death_place = self.get_birth(tree)
-        self.meps[id] = {
+        mep = {
             'name': name,
             'nationality': nationality,
             'birth_date': birth_date,
@@ -196,53 +240,178 @@ class TransformHtmlProceedingsToXml(object):
             'death_date': death_date,
             'death_place': death_place
             }
-        self.political_groups = (
-            self.political_groups + self.get_political_groups(tree, id))
-        self.national_parties = (
-            self.national_parties + self.get_national_parties(tree, id))
+        political_groups = self.get_political_groups(tree, id)
+        national_parties = self.get_national_parties(tree, id)
+        for row in political_groups + national_parties:
+            for column in ['s_date', 'e_date']:
+                if (row[column] is not None and
+                        not date_pattern.match(row[column])):
+                    raise ValueError("Not a valid date: '{}'.".format(
+                        row[column]))
+        return id, mep, political_groups, national_parties
+
+    def extract_file(self, infile):
+        """Extract the information of a MEP, unless the page is malformed.
+
+        It returns a tuple (error, info). The error is None, or a string if
+        the page could not be read, and then info is None.
+        """
+        try:
+            with self.telemetry.measure(infile):
+                info = self.extract_info(infile)
+        except (ValueError, IndexError, KeyError, AttributeError) as e:
+            return '{}: {}'.format(type(e).__name__, e), None
+        return None, info
+
+    def add_info(self, info):
+        """Add the information of a MEP to the tables."""
+        id, mep, political_groups, national_parties = info
+        self.meps[id] = mep
+        self.append_rows(self.political_groups, political_groups)
+        self.append_rows(self.national_parties, national_parties)
+        pass
+
+    def get_buffers(self, columns):
+        """Get empty columnar buffers, a list of values per column."""
+        return {x: [] for x in columns}
+
+    def append_rows(self, buffers, rows):
+        """Append rows, as dictionaries, to columnar buffers.
+
+        Unlike concatenating lists, it takes time linear in the number of
+        rows appended, not in the number of rows accumulated so far.
+        """
+        for row in rows:
+            for column, values in buffers.items():
+                values.append(row[column])
+        pass
+
+    def parse_dates(self, df):
+        """Parse the start and end dates of a table in place.
+
+        The dates of all rows are parsed at once, ongoing memberships end on
+        the date of download.
+        """
+        df['s_date'] = pd.to_datetime(df['s_date'], format='%d.%m.%Y')
+        df['e_date'] = pd.to_datetime(df['e_date'], format='%d.%m.%Y')
+        df['e_date'] = df['e_date'].fillna(pd.Timestamp(self.date))
         pass
 
-    def serialize_dict_of_dicts(self, dict_of_dicts, ofile_name):
-        df = pd.DataFrame.from_dict(dict_of_dicts, orient='index')
+    def buffers_to_df(self, buffers, columns):
+        df = pd.DataFrame(buffers, columns=columns)
+        self.parse_dates(df)
+        return df
+
+    def serialize_df(self, df, ofile_name, index_label=None):
+        """Write a table as TSV, and as Parquet if enabled."""
         opath = os.path.join(self.outdir, ofile_name)
         df.to_csv(
             opath,
             sep='\t',
             mode='w',
             encoding='utf-8',
-            index_label='id')
+            index=index_label is not None,
+            index_label=index_label)
+        if self.parquet:
+            df = df.copy()
+            for column in categorical_columns:
+                if column in df.columns:
+                    df[column] = df[column].astype('category')
+            if index_label is not None:
+                df.index.name = index_label
+            df.to_parquet(
+                os.path.splitext(opath)[0] + '.parquet',
+                engine='pyarrow',
+                index=index_label is not None)
         pass
 
-    def serialize_list_of_dicts(self, list_of_dicts, ofile_name, col_order):
-        df = pd.DataFrame(list_of_dicts)
-        df = df[col_order]
-        opath = os.path.join(self.outdir, ofile_name)
-        df.to_csv(opath, sep='\t', mode='w', encoding='utf-8', index=False)
+    def serialize_snapshot(self, tables, ofile_name):
+        """Write the tables as a SQLite file, to be loaded by add_metadata.
+
+        Dates are written as YYYY-MM-DD, missing values as NULL.
+
+        Keyword arguments:
+        tables -- a dictionary of DataFrames by name of table, see
+            snapshot_tables in mep_metadata
+        ofile_name -- a string for the name of the output file
+        """
+        rows = {}
+        for name, columns in mep_metadata.snapshot_tables:
+            df = tables[name].reindex(columns=columns)
+            for column in ['s_date', 'e_date']:
+                if column in columns:
+                    df[column] = df[column].dt.strftime('%Y-%m-%d')
+            df = df.astype(object)
+            rows[name] = [
+                tuple(None if pd.isnull(x) else str(x) for x in row)
+                for row in df.itertuples(index=False, name=None)]
+        mep_metadata.write_snapshot(
+            os.path.join(self.outdir, ofile_name),
+            rows)
         pass
 
     def main(self):
         self.meps = {}
-        self.political_groups = []
-        self.national_parties = []
-        for infile in self.infiles:
-            print(infile)
-            if self.date is None:
-                self.date = datetime.datetime.fromtimestamp(
-                    os.path.getmtime(infile)).date()
-            self.extract_info(infile)
-            self.n_proceedings += 1
-        self.serialize_dict_of_dicts(self.meps, 'meps.csv')
-        self.serialize_list_of_dicts(
+        self.political_groups = self.get_buffers(political_groups_columns)
+        self.national_parties = self.get_buffers(national_parties_columns)
+        if self.date is None and len(self.infiles) > 0:
+            self.date = datetime.datetime.fromtimestamp(
+                html_store.getmtime(self.infiles[0])).date()
+        if self.jobs > 1:
+            with ProcessPoolExecutor(
+                    max_workers=self.jobs,
+                    initializer=init_worker,
+                    initargs=(self,)) as executor:
+                # results come in the order of the files, i.e. sorted by ID,
+                # so the tables are the same as those of a serial run
+                results = executor.map(
+                    extract_file,
+                    self.infiles,
+                    chunksize=max(1, len(self.infiles) // (self.jobs * 4)))
+                for infile, (error, info, records) in zip(
+                        self.infiles,
+                        results):
+                    self.telemetry.merge(records)
+                    self.add_result(infile, error, info)
+        else:
+            for infile in self.infiles:
+                error, info = self.extract_file(infile)
+                self.add_result(infile, error, info)
+        meps_df = pd.DataFrame.from_dict(self.meps, orient='index')
+        political_groups_df = self.buffers_to_df(
             self.political_groups,
-            'political_groups.csv',
-            ['id', 'm_state', 's_date', 'e_date', 'p_group', 'p_group_role'])
-        self.serialize_list_of_dicts(
+            political_groups_columns)
+        national_parties_df = self.buffers_to_df(
             self.national_parties,
-            'national_parties.csv',
-            ['id', 's_date', 'e_date', 'n_party'])
+            national_parties_columns)
+        self.serialize_df(meps_df, 'meps.csv', index_label='id')
+        self.serialize_df(political_groups_df, 'political_groups.csv')
+        self.serialize_df(national_parties_df, 'national_parties.csv')
+        self.serialize_snapshot(
+            {
+                'meps': meps_df.rename_axis('id').reset_index(),
+                'political_groups': political_groups_df,
+                'national_parties': national_parties_df,
+                },
+            'meps.sqlite')
+        self.telemetry.report()
+        if len(self.errors) > 0:
+            print("{} pages could not be read:".format(len(self.errors)))
+            for infile, error in self.errors:
+                print('{}: {}'.format(infile, error))
+        pass
+
+    def add_result(self, infile, error, info):
+        print(infile)
+        if error is None:
+            self.add_info(info)
+            self.n_proceedings += 1
+        else:
+            print(error)
+            self.errors.append((infile, error))
         pass
 
-    def cli(self):
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -263,14 +432,50 @@ class TransformHtmlProceedingsToXml(object):
             required=False,
             default=None,
             help="date of download of HTML files.")
-        args = parser.parse_args()
+        parser.add_argument(
+            '-j', "--jobs",
+            required=False,
+            type=int,
+            default=1,
+            help="number of pages to be read in parallel.")
+        parser.add_argument(
+            "--parquet",
+            required=False,
+            action='store_true',
+            help="write the tables as Parquet files too, with typed columns.\
+                It requires pyarrow.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         self.pattern = args.pattern
         self.date = args.date
+        self.jobs = args.jobs
+        self.parquet = args.parquet
+        if self.parquet and pyarrow is None:
+            raise ImportError("pyarrow is required for Parquet files.")
         pass
 
 
-print(TransformHtmlProceedingsToXml())
+def init_worker(an_extractor):
+    """Keep an extractor in each process of the pool."""
+    global extractor
+    extractor = an_extractor
+    pass
+
+
+def extract_file(infile):
+    """Extract the information of a MEP in a process of the pool.
+
+    It returns a tuple (error, info, records), see extract_file of the
+    extractor. The records of the telemetry are merged by the parent.
+    """
+    error, info = extractor.extract_file(infile)
+    return error, info, extractor.telemetry.pop_records()
+
+
+if __name__ == '__main__':
+    print(TransformHtmlProceedingsToXml())
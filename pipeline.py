@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import copy
+import argparse
+import importlib
+import traceback
+import xml_io
+import manifest
+import telemetry
+
+
+class Pipeline(object):
+    """Compile proceedings running all the stages in memory.
+
+    Each file of proceedings is parsed once, and its tree goes through all
+    the stages without being serialized and parsed again in between. Only
+    the final outputs are written, and optionally a checkpoint of the output
+    of each stage, in the same folders as compile.sh.
+    """
+
+    # name: (module, class, folder of its output)
+    stage_classes = {
+        'xml': (
+            'proceedings_xml',
+            'TransformHtmlProceedingsToXml',
+            'xml'),
+        'langid': (
+            'langid_filter',
+            'FilterOutUnexpectedLanguage',
+            'xml_langid'),
+        'metadata': (
+            'add_metadata',
+            'AddMetadata',
+            'xml_metadata'),
+        'sentences': (
+            'add_sentences',
+            'AddSentences',
+            'xml_sentences'),
+        'treetagger': (
+            'treetagger',
+            'TagWithTreeTagger',
+            'xml_ttg'),
+        'translationese': (
+            'translationese_filter',
+            'FilterOutTranslationese',
+            'xml_translationese'),
+        }
+
+    # stages in the order they are run, the first one is always run
+    stage_names = [
+        'xml',
+        'langid',
+        'metadata',
+        'sentences',
+        'treetagger',
+        'translationese',
+        ]
+
+    # subfolder: arguments of each output of translationese_filter.py, LANG
+    # stands for the language of the proceedings
+    translationese_outputs = [
+        ('originals', ['-l', 'LANG']),
+        ('translations_all', ['-l', 'all']),
+        ('originals_ns', ['-l', 'LANG', '-n']),
+        ('translations_all_ns', ['-l', 'all', '-n']),
+        ]
+
+    # outputs only produced for some languages
+    extra_translationese_outputs = {
+        'es': [
+            ('translations_en', ['-l', 'en']),
+            ('translations_en_ns', ['-l', 'en', '-n']),
+            ],
+        }
+
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the pipeline is only set up
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'pipeline',
+            self.options)
+        self.stages = self.init_stages()
+        self.filters = self.init_filters()
+        # the stages time their hot functions in the records of the pipeline
+        for stage_name, stage in self.stages:
+            stage.telemetry = self.telemetry
+        for a_filter in self.filters:
+            a_filter.telemetry = self.telemetry
+        self.converter = self.stages[0][1]
+        self.infiles = self.converter.infiles
+        self.n_proceedings = 0
+        self.errors = []
+        self.manifest = self.init_manifest()
+        if run:
+            self.main()
+
+    def __str__(self):
+        message = "{} EuroParl's {} proceedings compiled!".format(
+            str(self.n_proceedings),
+            self.language)
+        return message
+
+    def get_folder(self, stage_name):
+        """Get the path of the folder where a stage writes its output."""
+        folder = self.stage_classes[stage_name][2]
+        return os.path.join(self.outdir, folder, self.language)
+
+    def get_args(self, stage_name, indir, outdir):
+        """Get the command-line arguments of a stage."""
+        if stage_name == 'xml':
+            args = ['-i', indir, '-o', outdir, '-l', self.language,
+                    '-p', self.pattern]
+        elif stage_name == 'metadata':
+            args = ['-x', indir, '-o', outdir]
+            if self.snapshot is not None:
+                args.extend(['-s', self.snapshot])
+            if self.meps is not None:
+                args.extend(['-m', self.meps])
+            if self.n_parties is not None:
+                args.extend(['-n', self.n_parties])
+            if self.p_groups is not None:
+                args.extend(['-g', self.p_groups])
+        elif stage_name in ['sentences', 'treetagger']:
+            args = ['-i', indir, '-o', outdir, '-l', self.language]
+        else:
+            args = ['-i', indir, '-o', outdir]
+        if self.compress is not None:
+            args.extend(['-z', self.compress])
+        return args
+
+    def init_stage(self, stage_name, args):
+        """Set up a stage without running it."""
+        module_name, class_name = self.stage_classes[stage_name][:2]
+        module = importlib.import_module(module_name)
+        return getattr(module, class_name)(args, run=False)
+
+    def init_stages(self):
+        """Set up the stages before translationese_filter.py.
+
+        It returns a list of (name, stage) tuples in the order they are run.
+        """
+        stages = []
+        indir = self.indir
+        for stage_name in self.stage_names:
+            if (stage_name not in self.selected or
+                    stage_name == 'translationese'):
+                continue
+            outdir = self.get_folder(stage_name)
+            args = self.get_args(stage_name, indir, outdir)
+            stages.append((stage_name, self.init_stage(stage_name, args)))
+            indir = outdir
+        return stages
+
+    def init_filters(self):
+        """Set up an instance of translationese_filter.py per output."""
+        filters = []
+        if 'translationese' not in self.selected:
+            return filters
+        indir = self.get_folder(self.stages[-1][0])
+        outputs = (self.translationese_outputs +
+                   self.extra_translationese_outputs.get(self.language, []))
+        for subfolder, extra_args in outputs:
+            outdir = os.path.join(
+                self.get_folder('translationese'),
+                subfolder)
+            args = self.get_args('translationese', indir, outdir)
+            args.extend([self.language if x == 'LANG' else x
+                         for x in extra_args])
+            filters.append(self.init_stage('translationese', args))
+        return filters
+
+    def init_manifest(self):
+        """Set up the manifest of the outputs written by the pipeline.
+
+        It is kept apart from the manifests of the stages, as its inputs are
+        the HTML proceedings and its configuration that of all the stages.
+        """
+        if len(self.filters) > 0:
+            folder = self.get_folder('translationese')
+        else:
+            folder = self.get_folder(self.stages[-1][0])
+        config = {
+            'stages': [stage.manifest.config_hash
+                       for stage_name, stage in self.stages],
+            'filters': [x.manifest.config_hash for x in self.filters],
+            'checkpoints': self.checkpoints,
+            }
+        return manifest.Manifest(
+            folder,
+            config,
+            self.force,
+            filename='.pipeline_manifest.json')
+
+    def get_outputs(self, infile):
+        """Get the paths of the files written for an input file."""
+        outputs = []
+        last = len(self.stages) - 1
+        for n, (stage_name, stage) in enumerate(self.stages):
+            if self.checkpoints or (n == last and len(self.filters) == 0):
+                outputs.append(stage.get_ofile_path(infile))
+        for a_filter in self.filters:
+            outputs.append(a_filter.get_ofile_path(infile))
+        return outputs
+
+    def process_file(self, infile):
+        """Run all the stages on a file and write the outputs."""
+        tree = self.converter.transform(infile).getroottree()
+        last = len(self.stages) - 1
+        for n, (stage_name, stage) in enumerate(self.stages):
+            if n > 0:
+                tree = stage.process(tree)
+            if self.checkpoints or (n == last and len(self.filters) == 0):
+                stage.serialize(infile, tree.getroot())
+        self.telemetry.count(tree)
+        for n, a_filter in enumerate(self.filters):
+            # each filter removes elements, only the last one gets the
+            # original tree
+            if n < len(self.filters) - 1:
+                filtered = a_filter.process(copy.deepcopy(tree))
+            else:
+                filtered = a_filter.process(tree)
+            a_filter.serialize(infile, filtered.getroot())
+        self.manifest.record(infile, self.get_outputs(infile))
+        pass
+
+    def try_process_file(self, infile):
+        """Process a file, measured by the telemetry, unless it fails.
+
+        It returns None, or the traceback as a string if a stage failed, so
+        that one bad file does not stop the whole batch.
+        """
+        try:
+            with self.telemetry.measure(
+                    infile,
+                    self.get_outputs(infile)):
+                self.process_file(infile)
+        except Exception:
+            return traceback.format_exc()
+        return None
+
+    def main(self):
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                error = self.try_process_file(infile)
+                if error is None:
+                    self.n_proceedings += 1
+                else:
+                    self.errors.append(infile)
+                    print(error)
+        finally:
+            # the files done so far are not processed again by the next run,
+            # even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("{} files up to date, skipped.".format(n_skipped))
+        if len(self.errors) > 0:
+            print("{} files could not be compiled:".format(len(self.errors)))
+            for infile in sorted(self.errors):
+                print(infile)
+        pass
+
+    def cli(self, args=None):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-i", "--input",
+            required=True,
+            help="path to the input directory with HTML proceedings.")
+        parser.add_argument(
+            "-o", "--output",
+            required=True,
+            help="path to the output directory, a folder is created for\
+                each stage inside.")
+        parser.add_argument(
+            "-l", "--language",
+            required=True,
+            choices=['en', 'es', 'de'],
+            help="language of the version to be processed.")
+        parser.add_argument(
+            '-p', "--pattern",
+            required=False,
+            default="*.html",
+            help="glob pattern to filter files.")
+        parser.add_argument(
+            "-m", "--meps",
+            required=False,
+            default=None,
+            help="path to the MEPs' metadata file.")
+        parser.add_argument(
+            '-n', "--n_parties",
+            required=False,
+            default=None,
+            help="path to the national parties metadata file.")
+        parser.add_argument(
+            "-g", "--p_groups",
+            required=False,
+            default=None,
+            help="path to the political groups file.")
+        parser.add_argument(
+            "--snapshot",
+            required=False,
+            default=None,
+            help="path to the snapshot of the MEPs' metadata, meps.sqlite,\
+                written by meps_ie.py. It replaces -m, -n and -g.")
+        parser.add_argument(
+            "-s", "--stages",
+            required=False,
+            nargs='+',
+            default=self.stage_names[1:],
+            choices=self.stage_names[1:],
+            help="stages to be run after modelling proceedings as XML.")
+        parser.add_argument(
+            "-c", "--checkpoints",
+            required=False,
+            default=False,
+            action="store_true",
+            help="write the output of every stage, not only the final one,\
+                for debugging.")
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.indir = args.input
+        self.outdir = args.output
+        self.language = args.language
+        self.pattern = args.pattern
+        self.meps = args.meps
+        self.n_parties = args.n_parties
+        self.p_groups = args.p_groups
+        self.snapshot = args.snapshot
+        self.selected = set(args.stages + ['xml'])
+        if ('metadata' in self.selected and self.meps is None and
+                self.snapshot is None):
+            parser.error(
+                "the metadata stage requires -m/--meps or --snapshot.")
+        self.checkpoints = args.checkpoints
+        self.compress = args.compress
+        self.force = args.force
+        pass
+
+
+if __name__ == '__main__':
+    pipeline = Pipeline()
+    print(pipeline)
+    if len(pipeline.errors) > 0:
+        sys.exit(1)
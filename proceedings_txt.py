@@ -3,18 +3,31 @@
 import os
 import argparse
 import datetime
-from lxml import etree
-import fnmatch
 import re
+import xml_io
+import manifest
+import telemetry
 
 
 class TransformHtmlProceedingsToTxt(object):
     """Get proceedings of the European Parliament."""
 
-    def __init__(self):
-        self.cli()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, it is only set up and main is not called
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'proceedings_txt',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
-        self.main()
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(self, self.options),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
         message = "{} EuroParl's proceedings transformed!".format(
@@ -22,17 +35,13 @@ class TransformHtmlProceedingsToTxt(object):
         return message
     
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory, or a store, matching a pattern.
         
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return xml_io.get_files(directory, fileclue)
 
     def valid_date(self, s):
         try:
@@ -49,12 +58,19 @@ class TransformHtmlProceedingsToTxt(object):
                  for x in strdates.split('\n')]
         return dates
     
+    @telemetry.timed
     def read_xml(self, infile):
-        """Parse a XML file."""
-        parser = etree.XMLParser(remove_blank_text=True)
-        with open(infile, encoding='utf-8',mode='r') as input:
-            return etree.parse(input, parser)
+        """Parse a XML file, or a page in a store."""
+        return xml_io.read_xml(infile, encoding='utf-8')
         
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.txt',
+            self.compress)
+
+    @telemetry.timed
     def serialize(self, a_string, infile):
         """Serialize output.
         
@@ -62,37 +78,54 @@ class TransformHtmlProceedingsToTxt(object):
         tree_as_string -- tree as string
         infile -- path to the input file as string
         """
-        outpath = os.path.join(  # output path
-            self.outdir,
-            os.path.splitext(os.path.basename(infile))[0]+'.'+'txt')  # depending on the output formats able to choose output extension
-        with open(outpath, mode='w', encoding='utf8') as outfile:
-            outfile.write(a_string)
+        outpath = self.get_ofile_path(infile)
+        xml_io.write(outpath, a_string.encode('utf-8'))
         pass
     
 
+    def process_file(self, infile):
+        """Extract the text of a file and serialize it."""
+        tree = self.read_xml(infile)
+        all_text = tree.xpath('//text()')
+        all_text = [x.strip() for x in all_text]
+        all_text = '\n'.join(all_text)
+        all_text = re.sub(r' +\n', r'\n', all_text)
+        all_text = re.sub(r'\n{3,}', r'\n\n\n', all_text)
+        all_text = re.sub(r'\n(\(..\)\n)', r' \1', all_text)
+        all_text = re.sub(r'\n\)', r')', all_text)
+        all_text = re.sub(r'\(\n', r'(', all_text)
+        all_text = re.sub(r',\n\n', r', ', all_text)
+        all_text = re.sub(r'(\n\d+\.\d*\.?)\n', r'\1 ', all_text)
+        all_text = re.sub(r'\n,', r',', all_text)
+        all_text = re.sub(r'\[\n', r'[', all_text)
+        all_text = re.sub(r'\n\]', r']', all_text)
+        self.serialize(all_text, infile)
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
+        pass
+
     def main(self):
         self.n_proceedings = 0
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_xml(infile)
-            all_text = tree.xpath('//text()')
-            all_text = [x.strip() for x in all_text]
-            all_text = '\n'.join(all_text)
-            all_text = re.sub(r' +\n', r'\n', all_text)
-            all_text = re.sub(r'\n{3,}', r'\n\n\n', all_text)
-            all_text = re.sub(r'\n(\(..\)\n)', r' \1', all_text)
-            all_text = re.sub(r'\n\)', r')', all_text)
-            all_text = re.sub(r'\(\n', r'(', all_text)
-            all_text = re.sub(r',\n\n', r', ', all_text)
-            all_text = re.sub(r'(\n\d+\.\d*\.?)\n', r'\1 ', all_text)
-            all_text = re.sub(r'\n,', r',', all_text)
-            all_text = re.sub(r'\[\n', r'[', all_text)
-            all_text = re.sub(r'\n\]', r']', all_text)
-            self.serialize(all_text, infile)
-            self.n_proceedings += 1
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                with self.telemetry.measure(
+                        infile,
+                        [self.get_ofile_path(infile)]):
+                    self.process_file(infile)
+                self.n_proceedings += 1
+        finally:
+            # the files done so far are not processed again by the next
+            # run, even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("{} files up to date, skipped.".format(n_skipped))
         pass
 
-    def cli(self):
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -108,13 +141,30 @@ class TransformHtmlProceedingsToTxt(object):
             required=False,
             default="*.html",
             help="glob pattern to filter files.")
-        args = parser.parse_args()
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.force = args.force
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         self.pattern = args.pattern
+        self.compress = args.compress
         pass
 
 
-print(TransformHtmlProceedingsToTxt())
+if __name__ == '__main__':
+    print(TransformHtmlProceedingsToTxt())
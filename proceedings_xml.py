@@ -1,68 +1,164 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import argparse
 from lxml import etree, html
 from lxml.html.clean import Cleaner
-import fnmatch  # To match files by pattern
+from io import BytesIO
 import regex as re  # Maybe not necessary
-import time
-import dateparser
-import json
+import copy
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import html_store
+import xml_io
+import manifest
+import telemetry
+from language_profile import LanguageProfile
+from lrucache import LRUCache
+
+
+class ParagraphNormalizer(object):
+    """Clean up the text of paragraphs with a precompiled table of rules.
+
+    Each rule is a (trigger, pattern, replacement) tuple. The pattern can
+    only match if the trigger substring is found in the text, so the rule is
+    skipped otherwise. A trigger of None means that the rule is always
+    applied. Rules are applied in order.
+    """
+
+    characters = str.maketrans({'\t': ' ', '\xad': '-', '\xa0': ' '})
+
+    rules_before_roles = [
+        ('  ', re.compile(r' +'), r' '),
+        ('. . .', re.compile(r'\. \. \.'), r'...'),
+        ('...', re.compile(r'\.{3,}'), r'…'),
+        ('…..', re.compile(r'…\.\.'), r'…'),
+        (None, re.compile(r'^([\s\.—–\-−,\)]+)'), r''),
+        ('…', re.compile(r'([^\.])(…)'), r'\1 \2'),
+        ('.…', re.compile(r'\.…'), r' …'),
+        ('…', re.compile(r'\( ?… ?\)'), r'(…)'),
+        ('…', re.compile(r'(…)(\.)(\w)'), r'\1\2 \3'),
+        ('…', re.compile(r'([\w”])(…)'), r'\1 \2'),
+        ('…', re.compile(r'(…)(\w)'), r'\1 \2'),
+        ('( ', re.compile(r'\( +\)'), r''),
+        ('( ', re.compile(r'\( +?'), r'('),
+        (' )', re.compile(r' +\)'), r')'),
+        ('BRK', re.compile(r'(\[lt\]|<) ?BRK ?(\[gt\]|>)?'), r''),
+        ('>', re.compile(r'>(.+?)='), r'"\1"'),
+        ('s= ', re.compile(r's= '), r"s' "),
+        ('<Titre>', re.compile(r'<Titre>'), r'Titre'),
+        ('<0', re.compile(r'<0'), r''),
+        (None, re.compile(r'[<>]'), r''),
+        ('Neil', re.compile(r'^,? *Neil,? +\. +– +'), r''),
+        ('(PPE-DE)', re.compile(r'^\(PPE-DE\), +\. +– +'), r''),
+        ('(Verts/ALE)', re.compile(r'^\(Verts/ALE\), +\. +– +'), r''),
+        ('(', re.compile(r'\A\([\p{Lu}\&/\-–]+\)'), r''),
+        ('  ', re.compile(r' +'), r' '),
+        (None, re.compile(r'\A([\s\.—–\-−,\)]+)'), r''),
+        ('President', re.compile(r'^\(((?:Madam|Mr) President)'), r'\1'),
+        ]
+
+    rules_after_roles = [
+        ('***', re.compile(r'\*{3,}'), r''),
+        ]
+
+    def __init__(self, more_roles):
+        """Keyword arguments:
+        more_roles -- a list of patterns whose group 1 is a role found at the
+            beginning of the text
+        """
+        self.more_roles = [re.compile(x) for x in more_roles]
+
+    def apply(self, rules, content):
+        for trigger, pattern, replacement in rules:
+            if trigger is None or trigger in content:
+                content = pattern.sub(replacement, content)
+        return content
 
+    def regextract(self, content, a_pattern, target_dic, dic_attrib):
+        """Extract information with a regular expression.
+
+        Keyword arguments:
+        content -- a string
+        a_pattern -- a compiled regular expression
+        target_dic -- a dictionary where the extraction has to be stored
+        dic_attrib -- dictionary key where to store extraction
+        """
+        # match the a_regex in a_string
+        is_match = a_pattern.match(content)
+        # if match
+        if is_match is not None:
+            if dic_attrib not in target_dic.keys():
+                target_dic[dic_attrib] = is_match.group(1)
+                content = a_pattern.sub(r'', content)
+        return content, target_dic
 
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
+    def normalize(self, content, s_intervention):
+        """Clean up the text of a paragraph.
 
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
+        A role found at the beginning of the text is stored in
+        s_intervention, unless it already has one.
 
-    return timed
+        Keyword arguments:
+        content -- the text of the paragraph
+        s_intervention -- a dictionary with the intervention
+        """
+        content = content.strip()
+        content = content.translate(self.characters)
+        content = self.apply(self.rules_before_roles, content)
+        for pattern in self.more_roles:
+            content, s_intervention = self.regextract(
+                content,
+                pattern,
+                s_intervention,
+                'role')
+        content = self.apply(self.rules_after_roles, content)
+        return content, s_intervention
 
 
 class TransformHtmlProceedingsToXml(object):
     """Get proceedings of the European Parliament."""
 
-    @timeit
-    def __init__(self):
-        self.cli()
+    chunk_size = 65536
+
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the stage is only set up, e.g. to process trees in
+            memory with a pipeline
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'proceedings_xml',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
         self.n_proceedings = 0
-        self.ns = {'re': 'http://exslt.org/regular-expressions'}
-        self.loc = self.get_localized_vars()
+        self.errors = []
+        self.profile = LanguageProfile.load(
+            self.language,
+            cache_dir=self.profile_cache)
+        self.loc = self.profile.loc
+        self.normalizer = ParagraphNormalizer(self.loc['more_roles'])
         self.explanations_of_vote = re.compile(r' *EXPLANATIONS? OF VOTES?')
-        self.langs = [
-            "BG",
-            "ES",
-            "CS",
-            "DA",
-            "DE",
-            "ET",
-            "EL",
-            "EN",
-            "FR",
-            "GA",
-            "HR",
-            "IT",
-            "LV",
-            "LT",
-            "HU",
-            "MT",
-            "NL",
-            "PL",
-            "PT",
-            "RO",
-            "SK",
-            "SL",
-            "FI",
-            "SV",
-            ]
-        self.main()
+        self.newlines = re.compile(r'\n+')
+        self.cleaner = Cleaner(remove_tags=['a'], kill_tags=['sup', 'img'])
+        self.speaker_names = LRUCache(self.cache_size)
+        self.roles = LRUCache(self.cache_size)
+        # names and roles saved by another version of the code or of the
+        # localization are normalized again
+        self.version = manifest.get_version(self, [self.profile.path])
+        if self.name_cache is not None:
+            self.load_caches()
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(
+                self,
+                self.options,
+                files=[self.profile.path]),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
         message = "{} EuroParl's {} proceedings transformed!".format(
@@ -71,53 +167,63 @@ class TransformHtmlProceedingsToXml(object):
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory, or a store, matching a pattern.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
-
-    def get_localized_vars(self):
-        fname = self.language+".json"
-        fpath = os.path.join('localization', fname)
-        with open(fpath, mode="r", encoding="utf-8") as jfile:
-            content = jfile.read()
-        vars = json.loads(content)
-        return vars
+        return xml_io.get_files(directory, fileclue)
 
+    @telemetry.timed
     def read_html(self, infile):
-        """Parse a HTML file."""
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return html.parse(input)
+        """Parse a HTML file, or a page in a store."""
+        parser = html.HTMLParser(encoding='utf-8')
+        return html.parse(BytesIO(xml_io.read(infile)), parser)
+
+    def load_caches(self):
+        """Warm up the caches of speaker names and roles from disk."""
+        self.speaker_names.load(
+            os.path.join(self.name_cache, 'names.pickle'),
+            self.version)
+        self.roles.load(
+            os.path.join(self.name_cache, 'roles.pickle'),
+            self.version)
+        pass
 
-    def regextract(self, content, a_pattern, target_dic, dic_attrib):
-        """Extract information with a regular expression.
+    def dump_caches(self):
+        """Save the caches of speaker names and roles to disk."""
+        if not os.path.exists(self.name_cache):
+            os.makedirs(self.name_cache)
+        self.speaker_names.dump(
+            os.path.join(self.name_cache, 'names.pickle'),
+            self.version)
+        self.roles.dump(
+            os.path.join(self.name_cache, 'roles.pickle'),
+            self.version)
+        pass
 
-        Keyword arguments:
-        a_string -- string
-        a_regex -- a string
-        target_dic -- a dictionary where the extraction has to be stored
-        dic_attrib -- dictionary key where to store extraction
-        """
-        # match the a_regex in a_string
-        is_match = re.match(r'{}'.format(a_pattern), content)
-        # if match
-        if is_match is not None:
-            if dic_attrib not in target_dic.keys():
-                target_dic[dic_attrib] = is_match.group(1)
-                content = re.sub(r'{}'.format(a_pattern), r'', content)
-        return content, target_dic
+    def pop_cache_updates(self):
+        """Get the updates of the caches since the last call."""
+        return self.speaker_names.pop_updates(), self.roles.pop_updates()
+
+    def merge_cache_updates(self, updates):
+        """Merge the updates of the caches of a process of the pool."""
+        names_updates, roles_updates = updates
+        self.speaker_names.merge(names_updates)
+        self.roles.merge(roles_updates)
+        pass
 
+    @telemetry.timed
     def get_speaker_name(self, intervention):
-        speaker_name = intervention.xpath(
-            './/span[@class="doc_subtitle_level1_bis"]//text()')
+        speaker_name = self.profile.speaker_name(intervention)
         speaker_name = ''.join(speaker_name)
+        return self.speaker_names.memoize(
+            self.normalize_speaker_name,
+            speaker_name)
+
+    def normalize_speaker_name(self, speaker_name):
+        """Clean up a speaker name as extracted from the HTML."""
         speaker_name = re.sub(r'\n', r'', speaker_name)
         speaker_name = re.sub(r'\&amp;', r'&', speaker_name)
         speaker_name = re.sub(r'\([\p{Lu}\&/\-–\s]+\)', r'', speaker_name)
@@ -153,7 +259,7 @@ class TransformHtmlProceedingsToXml(object):
         return speaker_name
 
     def get_speaker_id(self, intervention):
-        speaker_id = intervention.xpath('.//img[@alt="MPphoto"]')
+        speaker_id = self.profile.photo(intervention)
         speaker_id = speaker_id[0].attrib['src']
         speaker_id = os.path.split(speaker_id)[1]
         speaker_id = os.path.splitext(speaker_id)[0]
@@ -167,10 +273,9 @@ class TransformHtmlProceedingsToXml(object):
         return output
 
     def get_mode(self, intervention):
-        in_writing = intervention.xpath(
-            './/span[@class="italic"][text()[re:test(.,"{}")]]'.format(
-                self.loc['in_writing']),
-            namespaces=self.ns)
+        in_writing = self.profile.find_italics(
+            intervention,
+            self.profile.in_writing)
         if len(in_writing) > 0:
             output = 'written'
             for writing in in_writing:
@@ -179,8 +284,9 @@ class TransformHtmlProceedingsToXml(object):
             output = 'spoken'
         return output
 
+    @telemetry.timed
     def get_role(self, intervention):
-        roles = intervention.xpath('.//span[@class="italic"][text()[re:test(.,"^[\s\xad\-–−—\.]*(?:{})[\s\xad\-–−\.]*(?:\([A-Z][A-Z]\))?[\s\xad\-–−—\.]*$", "m")]]'.format('|'.join(self.loc['roles'])), namespaces=self.ns)
+        roles = self.profile.find_italics(intervention, self.profile.role)
         if len(roles) > 0:
             output = []
             for role in roles:
@@ -189,9 +295,7 @@ class TransformHtmlProceedingsToXml(object):
                 elif type(role) is html.HtmlElement:
                     output.append(role.text)
             for role in roles:
-                lang = re.match(
-                    r'.*({}).*'.format('|'.join(self.langs)),
-                    role.text)
+                lang = self.profile.lang_anywhere.match(role.text)
                 if lang is not None:
                     i_lang = lang.group(1)
                 else:
@@ -201,17 +305,21 @@ class TransformHtmlProceedingsToXml(object):
             output = None
             i_lang = None
         if output is not None:
-            output = " ".join(output)
-            output = re.sub(r'\n', r' ', output)
-            output = re.sub(r' +', r' ', output)
-            output = re.sub(r'\([\p{Lu}\&/\-–]+\)', r'', output)
-            output = re.sub(r'(\p{Ll})[\s\.\xad–\-−—,\)]+\Z', r'\1', output)
-            output = re.sub(r'\A[\xad\s\.—–\-−,\)\(]+', r'', output)
-            output = re.sub(r'[\xad\s\.—–\-−,\)]+\Z', r'', output)
+            output = self.roles.memoize(self.normalize_role, " ".join(output))
         return output, i_lang
 
+    def normalize_role(self, output):
+        """Clean up a role as extracted from the HTML."""
+        output = re.sub(r'\n', r' ', output)
+        output = re.sub(r' +', r' ', output)
+        output = re.sub(r'\([\p{Lu}\&/\-–]+\)', r'', output)
+        output = re.sub(r'(\p{Ll})[\s\.\xad–\-−—,\)]+\Z', r'\1', output)
+        output = re.sub(r'\A[\xad\s\.—–\-−,\)\(]+', r'', output)
+        output = re.sub(r'[\xad\s\.—–\-−,\)]+\Z', r'', output)
+        return output
+
     def get_heading(self, section):
-        heading = section.xpath('.//td[@class="doc_title"]//text()')
+        heading = self.profile.heading(section)
         heading = ''.join(heading)
         heading = heading.strip()
         heading = re.sub(r'\(\n', r'(', heading)
@@ -219,27 +327,31 @@ class TransformHtmlProceedingsToXml(object):
         return heading
 
     def get_language(self, s_intervention, p, i_lang, new_paragraphs):
-        language = p.xpath('.//span[@class="italic"][text()[re:test(.,"^[\xad\s\.—–\-−,\(]*({})[\xad\s\.—–\-−,\)]*")]]'.format('|'.join(self.langs)), namespaces=self.ns)
+        language = self.profile.find_italics(p, self.profile.language_marker)
         if len(language) > 0 and not self.explanations_of_vote.match(language[0].text):
-            lang = re.match(
-                r'.*({}).*'.format('|'.join(self.langs)),
-                language[0].text)
+            lang = self.profile.lang_anywhere.match(language[0].text)
             output = lang.group(1)
             for l in language:
                 l.drop_tree()
         else:
-            p = html.tostring(p, with_tail=True, encoding='utf-8').decode('utf-8')
-            lang_in_text = re.search(
-                r'\(({})\)'.format('|'.join(self.langs)),
-                p)
+            texts = self.profile.texts(p)
+            lang_in_text = None
+            for text in texts:
+                lang_in_text = self.profile.lang_in_text.search(text)
+                if lang_in_text is not None:
+                    break
             if lang_in_text is not None:
                 output = lang_in_text.group(1)
-                p = re.sub(r'\(({})\) *'.format('|'.join(self.langs)), r'', p)
+                for text in texts:
+                    if '(' in text:
+                        self.set_text(
+                            text,
+                            self.profile.lang_in_text_and_spaces.sub(
+                                r'', text))
             else:
                 if len(new_paragraphs) == 0:
                     if 'role' in s_intervention.keys():
-                        president_pattern = '|'.join(self.loc['president'])
-                        if re.match(r'{}\Z'.format(president_pattern), s_intervention['role']):
+                        if self.profile.president.match(s_intervention['role']):
                                 output = 'unknown'
                         else:
                             if i_lang is None:
@@ -253,77 +365,74 @@ class TransformHtmlProceedingsToXml(object):
                             output = i_lang
                 else:
                     output = new_paragraphs[-1]['language']
-            p = html.fromstring(p)
         return output, p
 
+    def set_text(self, text, value):
+        """Replace a text node of the tree.
+
+        Keyword arguments:
+        text -- a text node as returned by XPath's text()
+        value -- a string for the new text
+        """
+        if text.is_tail:
+            text.getparent().tail = value
+        else:
+            text.getparent().text = value
+        pass
+
+    def copy_paragraph(self, p):
+        """Copy a paragraph replacing newlines and <br> by spaces.
+
+        The copy is edited in place, the original tree is left untouched.
+        Text after the paragraph, up to the next element, is part of it: the
+        copy is wrapped in a <div> with its tail, as lxml does when the
+        paragraph is serialized with its tail and parsed again.
+        """
+        p = copy.deepcopy(p)
+        if p.tail is not None and p.tail.strip() != '':
+            div = html.Element('div')
+            div.append(p)
+            p = div
+        else:
+            p.tail = None
+        for e in p.iter():
+            if e.text is not None and '\n' in e.text:
+                e.text = self.newlines.sub(r' ', e.text)
+            if e.tail is not None and '\n' in e.tail:
+                e.tail = self.newlines.sub(r' ', e.tail)
+            for k, v in e.attrib.items():
+                if '\n' in v:
+                    e.attrib[k] = self.newlines.sub(r' ', v)
+        for br in list(p.iter('br')):
+            if len(br.attrib) == 0:
+                br.tail = ' ' + (br.tail or '')
+                br.drop_tree()
+        return p
+
     def clean_paragraph(self, p):
-        cleaner = Cleaner(remove_tags=['a'], kill_tags=['sup', 'img'])
-        p = cleaner.clean_html(p)
-        doc_subtitle = p.xpath('.//span[@class="doc_subtitle_level1_bis"]')
+        """Clean a paragraph in place."""
+        self.cleaner(p)
+        doc_subtitle = self.profile.doc_subtitles(p)
         for d in doc_subtitle:
             d.drop_tree()
         return p
 
+    @telemetry.timed
     def get_paragraphs(self, intervention, s_intervention, i_lang):
-        paragraphs = intervention.xpath(
-            './/p[@class="contents" or @class="doc_subtitle_level1"]')
+        paragraphs = self.profile.paragraphs(intervention)
         new_paragraphs = []
         for p in paragraphs:
             new_p = {}
-            p = html.tostring(
-                p,
-                with_tail=True,
-                encoding='utf-8').decode('utf-8')
-            p = re.sub(r'\n+', r' ', p)
-            p = re.sub(r'<br ?/?>', r' ', p)
-            p = html.fromstring(p)
+            p = self.copy_paragraph(p)
             p = self.clean_paragraph(p)
             new_p['language'], p = self.get_language(
                 s_intervention,
                 p,
                 i_lang,
                 new_paragraphs)
-            content = p.text_content()
-            content = content.strip()
-            content = re.sub(r'\t', r' ', content)
-            content = re.sub(r'\xad', r'-', content)  # revise
-            content = re.sub(r'\xa0', r' ', content)
-            content = re.sub(r' +', r' ', content)
-            content = re.sub(r'\. \. \.', r'...', content)
-            content = re.sub(r'\.{3,}', r'…', content)
-            content = re.sub(r'…\.\.', r'…', content)
-            content = re.sub(r'^([\s\.—–\-−,\)]+)', r'', content)
-            content = re.sub(r'([^\.])(…)', r'\1 \2', content)
-            content = re.sub(r'\.…', r' …', content)
-            content = re.sub(r'\( ?… ?\)', r'(…)', content)
-            content = re.sub(r'(…)(\.)(\w)', r'\1\2 \3', content)
-            content = re.sub(r'([\w”])(…)', r'\1 \2', content)
-            content = re.sub(r'(…)(\w)', r'\1 \2', content)
-            content = re.sub(r'\( +\)', r'', content)
-            content = re.sub(r'\( +?', r'(', content)
-            content = re.sub(r' +\)', r')', content)
-            content = re.sub(r'(\[lt\]|<) ?BRK ?(\[gt\]|>)?', r'', content)
-            content = re.sub(r'>(.+?)=', r'"\1"', content)
-            content = re.sub(r's= ', r"s' ", content)
-            content = re.sub(r'<Titre>', r'Titre', content)
-            content = re.sub(r'<0', r'', content)
-            content = re.sub(r'>', r'', content)
-            content = re.sub(r'<', r'', content)
-            content = re.sub(r'^,? *Neil,? +\. +– +', r'', content)
-            content = re.sub(r'^\(PPE-DE\), +\. +– +', r'', content)
-            content = re.sub(r'^\(Verts/ALE\), +\. +– +', r'', content)
-            content = re.sub(r'\A\([\p{Lu}\&/\-–]+\)', r'', content)
-            content = re.sub(r' +', r' ', content)
-            content = re.sub(r'\A([\s\.—–\-−,\)]+)', r'', content)
-            content = re.sub(r'^\((Madam President)', r'\1', content)
-            content = re.sub(r'^\((Mr President)', r'\1', content)
-            for pattern in self.loc['more_roles']:
-                content, s_intervention = self.regextract(
-                    content,
-                    pattern,
-                    s_intervention,
-                    'role')
-            content = re.sub(r'\*{3,}', r'', content)
+            content, s_intervention = self.normalizer.normalize(
+                p.text_content(),
+                s_intervention)
             new_p['content'] = content
             new_paragraphs.append(new_p)
         s_intervention['contents'] = new_paragraphs
@@ -334,14 +443,26 @@ class TransformHtmlProceedingsToXml(object):
         root.attrib['lang'] = self.language.lower()
         date_string = re.match(
             r'^(.+?,? \d.+?) - (.+)$',
-            tree.xpath('//td[@class="doc_title" and @align="left" and @valign="top"]')[0].text)
-        date = dateparser.parse(date_string.group(1)).date()
+            self.profile.date(tree)[0].text)
+        date = self.parse_date(date_string.group(1))
         place = date_string.group(2)
         root.attrib['date'] = str(date)
         root.attrib['place'] = place
-        root.attrib['edition'] = tree.xpath('//td[@class="doc_title" and @align="right" and @valign="top"]')[0].text
+        root.attrib['edition'] = self.profile.edition(tree)[0].text
         pass
 
+    def parse_date(self, string):
+        """Parse the date of a sitting.
+
+        The localized format of the language is tried first, dateparser is
+        only imported and used if it fails.
+        """
+        date = self.profile.parse_date(string)
+        if date is None:
+            import dateparser
+            date = dateparser.parse(string).date()
+        return date
+
     def intervention_to_xml(self, x_section, s_intervention):
         x_intervention = etree.SubElement(x_section, 'intervention')
         if 'id' in s_intervention.keys():
@@ -371,66 +492,202 @@ class TransformHtmlProceedingsToXml(object):
                         text=paragraph['content'])
         pass
 
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.xml',
+            self.compress)
+
+    @telemetry.timed
     def serialize(self, infile, root):
-        ofile_name = os.path.splitext(os.path.basename(infile))[0]
-        ofile_path = os.path.join(self.outdir, ofile_name+'.xml')
-        xml = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True).decode('utf-8')
-        with open(ofile_path, mode='w', encoding='utf-8') as ofile:
-            ofile.write(xml)
+        xml_io.serialize(root, self.get_ofile_path(infile))
         pass
 
     def get_element_id(self, element):
         output = element.getprevious().attrib['name']
         return output
 
-    def main(self):
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_html(infile)
-            root = etree.Element('text')
-            self.add_root_attributes(root, tree, infile)
-            sections = tree.xpath(
-                '//table[@class="doc_box_header" and @cellpadding="0"]')
-            for section in sections:
-                heading = self.get_heading(section)
-                section_id = self.get_element_id(section)
-                x_section = etree.SubElement(root, 'section')
-                x_section.attrib['id'] = section_id
-                x_section.attrib['title'] = heading
-                interventions = section.xpath(
-                    './/table[@cellpadding="5"][.//img[@alt="MPphoto"]]')
-                for idx, intervention in enumerate(interventions):
-                    s_intervention = {}
-                    intervention_id = self.get_element_id(intervention)
-                    s_intervention['id'] = intervention_id
-                    i_lang = None
-                    s_intervention['speaker_id'] = self.get_speaker_id(intervention)
-                    s_intervention['is_mep'] = self.get_is_mep(
-                        s_intervention['speaker_id'])
-                    s_intervention['mode'] = self.get_mode(intervention)
-                    speaker_name = self.get_speaker_name(intervention)
-                    president_pattern = '|'.join(self.loc['president'])
-                    if re.match(r'{}\Z'.format(president_pattern), speaker_name):
-                        s_intervention['role'] = speaker_name
-                    else:
-                        s_intervention['name'] = speaker_name
-                    role, i_lang = self.get_role(intervention)
-                    if role is not None:
-                        s_intervention['role'] = role
-                    s_intervention = self.get_paragraphs(
-                        intervention,
-                        s_intervention,
-                        i_lang)
-                    self.intervention_to_xml(x_section, s_intervention)
+    @telemetry.timed
+    def transform_section(self, section):
+        """Model a section of the proceedings as an XML Element."""
+        heading = self.get_heading(section)
+        section_id = self.get_element_id(section)
+        x_section = etree.Element('section')
+        x_section.attrib['id'] = section_id
+        x_section.attrib['title'] = heading
+        interventions = self.profile.interventions(section)
+        for idx, intervention in enumerate(interventions):
+            s_intervention = {}
+            intervention_id = self.get_element_id(intervention)
+            s_intervention['id'] = intervention_id
+            i_lang = None
+            s_intervention['speaker_id'] = self.get_speaker_id(intervention)
+            s_intervention['is_mep'] = self.get_is_mep(
+                s_intervention['speaker_id'])
+            s_intervention['mode'] = self.get_mode(intervention)
+            speaker_name = self.get_speaker_name(intervention)
+            if self.profile.president.match(speaker_name):
+                s_intervention['role'] = speaker_name
+            else:
+                s_intervention['name'] = speaker_name
+            role, i_lang = self.get_role(intervention)
+            if role is not None:
+                s_intervention['role'] = role
+            s_intervention = self.get_paragraphs(
+                intervention,
+                s_intervention,
+                i_lang)
+            self.intervention_to_xml(x_section, s_intervention)
+        return x_section
+
+    def transform(self, infile):
+        """Model a HTML file of proceedings as an XML Element."""
+        tree = self.read_html(infile)
+        root = etree.Element('text')
+        self.add_root_attributes(root, tree, infile)
+        sections = self.profile.sections(tree)
+        for section in sections:
+            root.append(self.transform_section(section))
+        return root
+
+    def read_sections(self, parser):
+        """Yield the sections parsed so far, freeing each one afterwards.
+
+        Once a section is transformed, it is cleared and removed from the
+        tree with everything before it, so that the parsed tree does not grow
+        with the size of the file.
+        """
+        for event, element in parser.read_events():
+            if self.profile.is_section(element):
+                yield element
+                parent = element.getparent()
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del parent[0]
+        pass
+
+    def iter_sections(self, infile):
+        """Parse a HTML file incrementally and yield its sections."""
+        parser = etree.HTMLPullParser(
+            events=('end',),
+            tag='table',
+            encoding='utf-8')
+        parser.set_element_class_lookup(html.HtmlElementClassLookup())
+        with xml_io.open_input(infile) as ifile:
+            for chunk in iter(lambda: ifile.read(self.chunk_size), b''):
+                parser.feed(chunk)
+                yield from self.read_sections(parser)
+        parser.close()
+        yield from self.read_sections(parser)
+        pass
+
+    def stream_file(self, infile):
+        """Transform a HTML file and serialize it as XML section by section.
+
+        Each section is written with an incremental XML writer as soon as it
+        is transformed, so only one section of the HTML and of the XML is in
+        memory at a time. The output is the same as serialize's. It is only
+        moved to its path once complete, a section which fails leaves no
+        truncated file behind.
+        """
+        sections = self.iter_sections(infile)
+        section = next(sections, None)
+        if section is None:
+            # without sections there is nothing to stream
+            self.serialize(infile, self.transform(infile))
+            return
+        root = etree.Element('text')
+        self.add_root_attributes(root, section.getroottree(), infile)
+        with xml_io.open_output_atomic(self.get_ofile_path(infile)) as ofile:
+            with etree.xmlfile(ofile, encoding='utf-8') as xf:
+                xf.write_declaration()
+                with xf.element('text', root.attrib):
+                    while section is not None:
+                        x_section = self.transform_section(section)
+                        self.telemetry.count(x_section)
+                        etree.indent(x_section, space='  ', level=1)
+                        xf.write('\n  ', x_section)
+                        section = next(sections, None)
+                    xf.write('\n')
+            ofile.write(b'\n')
+        pass
+
+    def process_file(self, infile):
+        """Transform a HTML file and serialize it as XML."""
+        if self.stream:
+            self.stream_file(infile)
+        else:
+            root = self.transform(infile)
+            self.telemetry.count(root)
             self.serialize(infile, root)
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
+        pass
+
+    def try_process_file(self, infile):
+        """Process a file, measured by the telemetry, unless it fails.
+
+        It returns None, or the traceback as a string if the transformation
+        failed, so that one bad file does not stop the whole batch.
+        """
+        try:
+            with self.telemetry.measure(
+                    infile,
+                    [self.get_ofile_path(infile)]):
+                self.process_file(infile)
+        except Exception:
+            return traceback.format_exc()
+        return None
+
+    def add_result(self, infile, error):
+        if error is None:
             self.n_proceedings += 1
+        else:
+            self.errors.append(infile)
+            print(error)
         pass
 
-    def cli(self):
+    def main(self):
+        infiles = [x for x in self.infiles if not self.manifest.is_current(x)]
+        print("{} files up to date, skipped.".format(
+            len(self.infiles) - len(infiles)))
+        self.infiles = infiles
+        if self.jobs > 1:
+            # largest files first, so that no worker is left with a big file
+            # at the end of the batch
+            self.infiles.sort(key=html_store.getsize, reverse=True)
+            with ProcessPoolExecutor(
+                    max_workers=self.jobs,
+                    initializer=init_worker,
+                    initargs=(self,)) as executor:
+                futures = {executor.submit(process_file, infile): infile
+                           for infile in self.infiles}
+                for future in as_completed(futures):
+                    infile = futures[future]
+                    print(infile)
+                    error, updates, entries, records = future.result()
+                    self.merge_cache_updates(updates)
+                    self.manifest.merge(entries)
+                    self.telemetry.merge(records)
+                    self.add_result(infile, error)
+        else:
+            for infile in self.infiles:
+                print(infile)
+                self.add_result(infile, self.try_process_file(infile))
+        print("speaker names cache: {}".format(self.speaker_names.stats()))
+        print("roles cache: {}".format(self.roles.stats()))
+        if self.name_cache is not None:
+            self.dump_caches()
+        self.manifest.dump()
+        self.telemetry.report()
+        if len(self.errors) > 0:
+            print("{} files could not be transformed:".format(
+                len(self.errors)))
+            for infile in sorted(self.errors):
+                print(infile)
+        pass
+
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -451,14 +708,97 @@ class TransformHtmlProceedingsToXml(object):
             required=False,
             default="*.html",
             help="glob pattern to filter files.")
-        args = parser.parse_args()
+        parser.add_argument(
+            '-j', "--jobs",
+            required=False,
+            type=int,
+            default=1,
+            help="number of files to be transformed in parallel.")
+        parser.add_argument(
+            "--profile-cache",
+            required=False,
+            default=None,
+            help="path to a directory to cache the compiled language\
+                profile.")
+        parser.add_argument(
+            "--name-cache",
+            required=False,
+            default=None,
+            help="path to a directory to keep the normalized speaker names\
+                and roles between runs.")
+        parser.add_argument(
+            "--cache-size",
+            required=False,
+            type=int,
+            default=100000,
+            help="maximum number of speaker names and roles to be cached.")
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--stream",
+            required=False,
+            action='store_true',
+            help="parse and write each file section by section, so that\
+                memory does not grow with the size of the sittings.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.force = args.force
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         self.language = args.language
         self.pattern = args.pattern
+        self.jobs = args.jobs
+        self.profile_cache = args.profile_cache
+        self.name_cache = args.name_cache
+        self.cache_size = args.cache_size
+        self.stream = args.stream
+        self.compress = args.compress
         pass
 
 
-print(TransformHtmlProceedingsToXml())
+converter = None
+
+
+def init_worker(a_converter):
+    """Keep a converter in each process of the pool."""
+    global converter
+    converter = a_converter
+    converter.speaker_names.record_updates = True
+    converter.roles.record_updates = True
+    pass
+
+
+def process_file(infile):
+    """Transform a file in a process of the pool.
+
+    It returns a tuple (error, updates, entries, records). The error is
+    None, or the traceback as a string if the transformation failed, so that
+    one bad file does not stop the whole batch. The updates of the caches of
+    speaker names and roles, the entries of the manifest and the records of
+    the telemetry are merged by the parent.
+    """
+    error = converter.try_process_file(infile)
+    return (error,
+            converter.pop_cache_updates(),
+            converter.manifest.pop_updates(),
+            converter.telemetry.pop_records())
+
+
+if __name__ == '__main__':
+    transformer = TransformHtmlProceedingsToXml()
+    print(transformer)
+    if len(transformer.errors) > 0:
+        sys.exit(1)
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+
+import os
+import argparse
+import importlib
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import xml_io
+import manifest
+import telemetry
+from pipeline import Pipeline
+
+
+# stage is the name of a stage, language and infile are None for tasks which
+# do not depend on them, e.g. downloading MEPs' metadata; variant is the
+# subfolder of an output of translationese_filter.py
+Task = namedtuple('Task', ['stage', 'language', 'infile', 'variant'])
+
+
+stages = {}
+
+
+def get_stage(module_name, class_name, args):
+    """Set up a stage once per process of a pool."""
+    key = (module_name, class_name, tuple(args))
+    if key not in stages:
+        module = importlib.import_module(module_name)
+        stages[key] = getattr(module, class_name)(args, run=False)
+    return stages[key]
+
+
+def run_task(module_name, class_name, args, infile):
+    """Run a task in a process of a pool.
+
+    If infile is None the whole script is run, otherwise only infile is
+    processed by a stage, unless its output is up to date. It returns a
+    tuple (error, entries, records). The error is None, or the traceback as
+    a string if the task failed. The entries of the manifest of the stage
+    and the records of its telemetry are merged by the parent.
+    """
+    try:
+        if infile is None:
+            module = importlib.import_module(module_name)
+            getattr(module, class_name)(args)
+            return None, {}, []
+        stage = get_stage(module_name, class_name, args)
+        if not stage.manifest.is_current(infile):
+            with stage.telemetry.measure(
+                    infile,
+                    [stage.get_ofile_path(infile)]):
+                stage.process_file(infile)
+        return (None,
+                stage.manifest.pop_updates(),
+                stage.telemetry.pop_records())
+    except Exception:
+        return traceback.format_exc(), {}, []
+
+
+class Scheduler(object):
+    """Run the stages of compile.sh as a graph of concurrent tasks.
+
+    Downloads are run per language, and every other stage per language and
+    file, as soon as the tasks they depend on are completed. Each stage has
+    its own pool of processes, so that e.g. proceedings in one language are
+    downloaded while those in another language are tagged, and a slow stage
+    such as TreeTagger does not block the rest.
+    """
+
+    # stages in the order of compile.sh, which one each stage depends on for
+    # the same language and file, and whether it is run once per file
+    stage_names = [
+        'meps',
+        'meps_ie',
+        'download',
+        'txt',
+        'xml',
+        'langid',
+        'metadata',
+        'sentences',
+        'treetagger',
+        'translationese',
+        ]
+
+    chain = [
+        'xml',
+        'langid',
+        'metadata',
+        'sentences',
+        'treetagger',
+        'translationese',
+        ]
+
+    # name: (module, class, extension of the output files)
+    stage_classes = {
+        'meps': ('get_meps', 'GetMeps', None),
+        'meps_ie': ('meps_ie', 'TransformHtmlProceedingsToXml', None),
+        'download': ('get_proceedings', 'GetProceedings', None),
+        'txt': ('proceedings_txt', 'TransformHtmlProceedingsToTxt', '.txt'),
+        'xml': ('proceedings_xml', 'TransformHtmlProceedingsToXml', '.xml'),
+        'langid': ('langid_filter', 'FilterOutUnexpectedLanguage', '.xml'),
+        'metadata': ('add_metadata', 'AddMetadata', '.xml'),
+        'sentences': ('add_sentences', 'AddSentences', '.xml'),
+        'treetagger': ('treetagger', 'TagWithTreeTagger', '.vrt'),
+        'translationese': (
+            'translationese_filter',
+            'FilterOutTranslationese',
+            '.xml'),
+        }
+
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the scheduler is only set up
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'scheduler',
+            self.options)
+        self.pending = {}
+        self.dependents = {}
+        self.done = set()
+        self.failed = {}
+        self.skipped = set()
+        self.manifests = {}
+        if run:
+            self.main()
+
+    def __str__(self):
+        message = "{} tasks completed, {} failed and {} skipped!".format(
+            str(len(self.done)),
+            str(len(self.failed)),
+            str(len(self.skipped)))
+        return message
+
+    def get_folder(self, stage, language=None, variant=None):
+        """Get the path of the folder where a stage writes its output."""
+        if stage == 'meps':
+            return os.path.join(self.outdir, 'html', 'meps')
+        elif stage == 'meps_ie':
+            return os.path.join(self.outdir, 'metadata')
+        elif stage == 'download':
+            return os.path.join(self.outdir, 'html', language)
+        elif stage == 'txt':
+            return os.path.join(self.outdir, 'txt', language)
+        folder = os.path.join(
+            self.outdir,
+            Pipeline.stage_classes[stage][2],
+            language)
+        if variant is not None:
+            folder = os.path.join(folder, variant)
+        return folder
+
+    def get_previous(self, stage):
+        """Get the selected stage whose output is the input of a stage."""
+        if stage in ['txt', 'xml']:
+            return 'download'
+        previous = 'xml'
+        for name in self.chain[1:self.chain.index(stage)]:
+            if name in self.selected:
+                previous = name
+        return previous
+
+    def get_path(self, task):
+        """Get the path of the file written by a task."""
+        if task.stage == 'download':
+            return task.infile
+        extension = self.stage_classes[task.stage][2]
+        return xml_io.get_output_path(
+            self.get_folder(task.stage, task.language, task.variant),
+            task.infile,
+            extension,
+            self.compress)
+
+    def get_input(self, task):
+        """Get the path of the file read by a task."""
+        previous = Task(
+            self.get_previous(task.stage),
+            task.language,
+            task.infile,
+            None)
+        return self.get_path(previous)
+
+    def get_args(self, task):
+        """Get the command-line arguments of the script run by a task."""
+        stage = task.stage
+        language = task.language
+        cache = os.path.join(self.outdir, 'cache')
+        if stage == 'meps':
+            return ['-o', self.get_folder(stage), '--cache', cache]
+        elif stage == 'meps_ie':
+            return ['-i', self.get_folder('meps'),
+                    '-o', self.get_folder(stage)] + self.get_telemetry_args()
+        elif stage == 'download':
+            return ['-o', self.get_folder(stage, language), '-l', language,
+                    '-d', self.dates, '--cache', cache]
+        indir = self.get_folder(self.get_previous(stage), language)
+        outdir = self.get_folder(stage, language, task.variant)
+        if stage == 'txt':
+            args = ['-i', indir, '-o', outdir]
+        elif stage == 'xml':
+            args = ['-i', indir, '-o', outdir, '-l', language]
+        elif stage == 'metadata':
+            metadata = self.get_folder('meps_ie')
+            snapshot = os.path.join(metadata, 'meps.sqlite')
+            # the snapshot is missing if meps_ie.py was run before it was
+            # written, the tables are read from the CSV files then
+            if 'meps_ie' in self.selected or os.path.exists(snapshot):
+                args = ['-s', snapshot]
+            else:
+                args = [
+                    '-m', os.path.join(metadata, 'meps.csv'),
+                    '-n', os.path.join(metadata, 'national_parties.csv'),
+                    '-g', os.path.join(metadata, 'political_groups.csv')]
+            args.extend(['-x', indir, '-o', outdir])
+        elif stage in ['sentences', 'treetagger']:
+            args = ['-i', indir, '-o', outdir, '-l', language]
+        elif stage == 'translationese':
+            outputs = dict(
+                Pipeline.translationese_outputs +
+                Pipeline.extra_translationese_outputs.get(language, []))
+            args = ['-i', indir, '-o', outdir]
+            args.extend([language if x == 'LANG' else x
+                         for x in outputs[task.variant]])
+        else:
+            args = ['-i', indir, '-o', outdir]
+        if self.compress is not None:
+            args.extend(['-z', self.compress])
+        if self.force:
+            args.append('--force')
+        return args + self.get_telemetry_args()
+
+    def get_telemetry_args(self):
+        """Get the command-line arguments of the telemetry of a stage."""
+        args = []
+        if self.telemetry.path is not None:
+            args.extend(['--telemetry', self.telemetry.path])
+        if self.telemetry.profile:
+            args.append('--profile')
+        return args
+
+    def add_task(self, task, dependencies):
+        """Add a task to the graph, after the tasks it depends on.
+
+        A task added once a task it depends on has failed, or has been
+        skipped, e.g. the tasks of the files of a download completed after
+        meps_ie.py failed, is skipped at once.
+        """
+        dependencies = {x for x in dependencies
+                        if x is not None and x not in self.done}
+        if any(x in self.failed or x in self.skipped for x in dependencies):
+            self.skipped.add(task)
+            return
+        self.pending[task] = dependencies
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, []).append(task)
+        pass
+
+    def add_file_tasks(self, language, infile):
+        """Add the tasks of the stages run on a file of proceedings."""
+        if 'txt' in self.selected:
+            self.add_task(Task('txt', language, infile, None), [])
+        previous = None
+        for stage in self.chain:
+            if stage not in self.selected:
+                continue
+            dependencies = [previous]
+            if stage == 'metadata' and 'meps_ie' in self.selected:
+                dependencies.append(Task('meps_ie', None, None, None))
+            if stage == 'translationese':
+                outputs = (
+                    Pipeline.translationese_outputs +
+                    Pipeline.extra_translationese_outputs.get(language, []))
+                for variant, extra_args in outputs:
+                    self.add_task(
+                        Task(stage, language, infile, variant),
+                        dependencies)
+            else:
+                task = Task(stage, language, infile, None)
+                self.add_task(task, dependencies)
+                previous = task
+        pass
+
+    def add_downloaded_files(self, language):
+        """Add the tasks of the files of proceedings in a language."""
+        infiles = xml_io.get_files(
+            self.get_folder('download', language),
+            self.pattern)
+        for infile in sorted(infiles):
+            self.add_file_tasks(language, infile)
+        pass
+
+    def init_tasks(self):
+        """Add the tasks known before any download is completed."""
+        if 'meps' in self.selected:
+            self.add_task(Task('meps', None, None, None), [])
+        if 'meps_ie' in self.selected:
+            dependencies = []
+            if 'meps' in self.selected:
+                dependencies.append(Task('meps', None, None, None))
+            self.add_task(Task('meps_ie', None, None, None), dependencies)
+        for language in self.languages:
+            if 'download' in self.selected:
+                self.add_task(Task('download', language, None, None), [])
+            else:
+                self.add_downloaded_files(language)
+        pass
+
+    def init_executors(self):
+        """Create a pool of processes per stage."""
+        executors = {}
+        for stage in self.selected:
+            executors[stage] = ProcessPoolExecutor(
+                max_workers=self.workers.get(stage, self.jobs))
+        return executors
+
+    def submit(self, executors, task):
+        module_name, class_name = self.stage_classes[task.stage][:2]
+        if task.infile is None:
+            infile = None
+        else:
+            infile = self.get_input(task)
+        return executors[task.stage].submit(
+            run_task,
+            module_name,
+            class_name,
+            self.get_args(task),
+            infile)
+
+    def skip_dependents(self, task):
+        """Skip all the tasks depending, directly or not, on a failed task."""
+        for dependent in self.dependents.pop(task, []):
+            if dependent in self.pending:
+                del self.pending[dependent]
+                self.skipped.add(dependent)
+                self.skip_dependents(dependent)
+        pass
+
+    def merge_manifest(self, task, entries):
+        """Merge the entries recorded by a worker in the stage manifest."""
+        if len(entries) == 0:
+            return
+        folder = self.get_folder(task.stage, task.language, task.variant)
+        if folder not in self.manifests:
+            self.manifests[folder] = manifest.Manifest(folder)
+        self.manifests[folder].merge(entries)
+        pass
+
+    def complete(self, task):
+        """Release the tasks depending on a completed task."""
+        self.done.add(task)
+        for dependent in self.dependents.pop(task, []):
+            if dependent in self.pending:
+                self.pending[dependent].discard(task)
+        if task.stage == 'download':
+            self.add_downloaded_files(task.language)
+        pass
+
+    def main(self):
+        executors = self.init_executors()
+        self.init_tasks()
+        running = {}
+        try:
+            while len(self.pending) > 0 or len(running) > 0:
+                ready = [task for task, dependencies in self.pending.items()
+                         if len(dependencies) == 0]
+                for task in ready:
+                    del self.pending[task]
+                    running[self.submit(executors, task)] = task
+                if len(running) == 0:
+                    break
+                completed, not_completed = wait(
+                    running,
+                    return_when=FIRST_COMPLETED)
+                for future in completed:
+                    task = running.pop(future)
+                    error, entries, records = future.result()
+                    self.merge_manifest(task, entries)
+                    self.telemetry.merge(records)
+                    if error is None:
+                        print('done: {}'.format(self.describe(task)))
+                        self.complete(task)
+                    else:
+                        print('failed: {}'.format(self.describe(task)))
+                        print(error)
+                        self.failed[task] = error
+                        self.skip_dependents(task)
+        finally:
+            for executor in executors.values():
+                executor.shutdown()
+            for a_manifest in self.manifests.values():
+                a_manifest.dump()
+        self.telemetry.report()
+        if len(self.failed) > 0:
+            print("{} tasks failed:".format(len(self.failed)))
+            for task in sorted(self.failed, key=self.describe):
+                print(self.describe(task))
+        pass
+
+    def describe(self, task):
+        """Get a string identifying a task."""
+        fields = [task.stage, task.language, task.variant, task.infile]
+        return ' '.join(x for x in fields if x is not None)
+
+    def parse_workers(self, workers):
+        """Parse the number of workers of each stage, given as STAGE=N."""
+        output = {}
+        for item in workers:
+            stage, n = item.split('=')
+            if stage not in self.stage_names:
+                raise argparse.ArgumentTypeError(
+                    "Not a valid stage: '{0}'.".format(stage))
+            output[stage] = int(n)
+        return output
+
+    def cli(self, args=None):
+        """CLI parses command-line arguments"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument(
+            "-o", "--output",
+            required=False,
+            default='../data',
+            help="path to the directory to save corpus data.")
+        parser.add_argument(
+            "-l", "--language",
+            required=False,
+            nargs='+',
+            default=['en', 'es', 'de'],
+            choices=['en', 'es', 'de'],
+            help="languages to be processed.")
+        parser.add_argument(
+            '-d', "--dates",
+            required=False,
+            default='dates.txt',
+            help="path to file containing one date per line in format\
+                YYYY-MM-DD.")
+        parser.add_argument(
+            '-p', "--pattern",
+            required=False,
+            default="*.html",
+            help="glob pattern to filter HTML files of proceedings.")
+        parser.add_argument(
+            "-s", "--stages",
+            required=False,
+            nargs='+',
+            default=self.stage_names,
+            choices=self.stage_names,
+            help="stages to be run, the output of the others must exist.")
+        parser.add_argument(
+            '-j', "--jobs",
+            required=False,
+            type=int,
+            default=1,
+            help="number of workers of the stages not given in --workers.")
+        parser.add_argument(
+            '-w', "--workers",
+            required=False,
+            nargs='+',
+            default=[],
+            help="number of workers of some stages, e.g. langid=8\
+                treetagger=2.")
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the intermediate files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.outdir = args.output
+        self.languages = args.language
+        self.dates = args.dates
+        self.pattern = args.pattern
+        self.selected = set(args.stages)
+        self.jobs = args.jobs
+        try:
+            self.workers = self.parse_workers(args.workers)
+        except (ValueError, argparse.ArgumentTypeError) as e:
+            parser.error(str(e))
+        self.compress = args.compress
+        self.force = args.force
+        pass
+
+
+if __name__ == '__main__':
+    print(Scheduler())
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import resource
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+import html_store
+
+
+# elements counted in the trees of the proceedings
+counted_elements = ['section', 'intervention', 'p', 's']
+
+
+def get_peak_rss():
+    """Get the peak resident set size of the process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak  # bytes in macOS
+    return peak * 1024  # kilobytes in Linux
+
+
+def get_size(path):
+    """Get the size of a file, or a page in a store, or None."""
+    try:
+        return html_store.getsize(path)
+    except (OSError, AttributeError, KeyError):
+        return None
+
+
+def add_arguments(parser):
+    """Add the command-line arguments of the telemetry to a parser."""
+    parser.add_argument(
+        "--telemetry",
+        required=False,
+        default=None,
+        help="path to a JSON lines file where a record is appended for each\
+            file processed.")
+    parser.add_argument(
+        "--profile",
+        required=False,
+        action='store_true',
+        help="time the hot functions of the stage too, with some overhead.")
+    parser.add_argument(
+        "--prometheus",
+        required=False,
+        default=None,
+        help="path to a Prometheus textfile where the metrics of the run are\
+            written.")
+    pass
+
+
+def timed(method):
+    """Time a method of a stage as a sub-timer, if profiling is enabled.
+
+    The time and the number of calls are added to the record of the file
+    being processed. Recursive calls are part of the outermost one, so that
+    their time is not counted twice. The stage must have a telemetry
+    attribute.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kw):
+        telemetry = self.telemetry
+        if (not telemetry.profile or telemetry.current is None or
+                name in telemetry.active):
+            return method(self, *args, **kw)
+        telemetry.active.add(name)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kw)
+        finally:
+            telemetry.active.discard(name)
+            timer = telemetry.current['timers'].setdefault(
+                name,
+                {'calls': 0, 'seconds': 0.0})
+            timer['calls'] += 1
+            timer['seconds'] += time.perf_counter() - start
+
+    return wrapper
+
+
+class Telemetry(object):
+    """Measure the resources used by a stage to process each file.
+
+    For each file it records wall and CPU time, peak RSS, bytes read and
+    written, the number of sections, interventions, paragraphs and
+    sentences, the sub-timers of the methods decorated with timed, and the
+    hits and misses of the caches of the stage. Each
+    record is appended as a line to a JSON lines file, if any, and all of
+    them are summarized at the end of the run. In a pool of processes, the
+    records of each worker are sent back and merged into the telemetry of
+    the parent.
+    """
+
+    def __init__(self, stage, path=None, profile=False, prometheus=None):
+        """Keyword arguments:
+        stage -- a string for the name of the stage in the records
+        path -- a string for the path to the JSON lines file, or None
+        profile -- if True, the methods decorated with timed are timed
+        prometheus -- a string for the path to the Prometheus textfile, or
+            None
+        """
+        self.stage = stage
+        self.path = path
+        self.profile = profile
+        self.prometheus = prometheus
+        self.records = []
+        self.n_popped = 0
+        self.current = None
+        self.active = set()  # sub-timers running
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    @classmethod
+    def from_options(cls, stage, options):
+        """Set up the telemetry of a stage from its parsed arguments.
+
+        Keyword arguments:
+        stage -- a string for the name of the stage in the records
+        options -- a dictionary with the parsed command-line arguments
+        """
+        return cls(
+            stage,
+            options['telemetry'],
+            options['profile'],
+            options['prometheus'])
+
+    @contextmanager
+    def measure(self, infile, outputs=()):
+        """Measure the processing of a file in a with statement.
+
+        Keyword arguments:
+        infile -- a string for the path to the input file
+        outputs -- a list of paths to the output files, their sizes are
+            added up when the processing is completed
+        """
+        record = OrderedDict([
+            ('stage', self.stage),
+            ('file', infile),
+            ('counts', {}),
+            ('timers', {}),
+            ('caches', {}),
+            ])
+        previous = self.current
+        self.current = record
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            self.current = previous
+        record['wall'] = time.perf_counter() - wall
+        record['cpu'] = time.process_time() - cpu
+        record['peak_rss'] = get_peak_rss()
+        record['bytes_in'] = get_size(infile)
+        record['bytes_out'] = sum(os.path.getsize(x) for x in outputs
+                                  if os.path.exists(x))
+        self.add(record)
+        pass
+
+    def count(self, element):
+        """Count the elements of interest in an Element or ElementTree."""
+        if self.current is None:
+            return
+        counts = self.current['counts']
+        for e in element.iter(*counted_elements):
+            counts[e.tag] = counts.get(e.tag, 0) + 1
+        pass
+
+    def count_cache(self, name, hits, misses):
+        """Add the hits and misses of a cache to the current record."""
+        if self.current is None:
+            return
+        cache = self.current['caches'].setdefault(
+            name,
+            {'hits': 0, 'misses': 0})
+        cache['hits'] += hits
+        cache['misses'] += misses
+        pass
+
+    def add(self, record):
+        self.records.append(record)
+        if self.path is not None:
+            line = json.dumps(record) + '\n'
+            # a single write in append mode, so that the lines of several
+            # processes sharing the file are not mixed
+            with open(self.path, mode='a', encoding='utf-8') as otelemetry:
+                otelemetry.write(line)
+        pass
+
+    def pop_records(self):
+        """Get the records added since the last call."""
+        records = self.records[self.n_popped:]
+        self.n_popped = len(self.records)
+        return records
+
+    def merge(self, records):
+        """Merge the records of another telemetry, e.g. of a worker."""
+        self.records.extend(records)
+        pass
+
+    def summarize(self):
+        """Add up the records of each stage."""
+        stages = OrderedDict()
+        for record in self.records:
+            if record['stage'] not in stages:
+                stages[record['stage']] = {
+                    'files': 0,
+                    'wall': 0.0,
+                    'cpu': 0.0,
+                    'bytes_in': 0,
+                    'bytes_out': 0,
+                    'peak_rss': 0,
+                    'counts': {},
+                    'timers': {},
+                    'caches': {},
+                    'slowest': None,
+                    }
+            totals = stages[record['stage']]
+            totals['files'] += 1
+            totals['wall'] += record['wall']
+            totals['cpu'] += record['cpu']
+            totals['bytes_in'] += record['bytes_in'] or 0
+            totals['bytes_out'] += record['bytes_out']
+            totals['peak_rss'] = max(totals['peak_rss'], record['peak_rss'])
+            for tag, n in record['counts'].items():
+                totals['counts'][tag] = totals['counts'].get(tag, 0) + n
+            for name, timer in record['timers'].items():
+                total = totals['timers'].setdefault(
+                    name,
+                    {'calls': 0, 'seconds': 0.0})
+                total['calls'] += timer['calls']
+                total['seconds'] += timer['seconds']
+            for name, cache in record.get('caches', {}).items():
+                total = totals['caches'].setdefault(
+                    name,
+                    {'hits': 0, 'misses': 0})
+                total['hits'] += cache['hits']
+                total['misses'] += cache['misses']
+            if (totals['slowest'] is None or
+                    record['wall'] > totals['slowest']['wall']):
+                totals['slowest'] = record
+        return stages
+
+    def summary(self):
+        """Get a string with the summary of the run."""
+        lines = []
+        for stage, totals in self.summarize().items():
+            lines.append(
+                "{}: {} files, {:.2f} s wall, {:.2f} s CPU, {:.1f} MB in, "
+                "{:.1f} MB out, {:.1f} MB peak RSS".format(
+                    stage,
+                    totals['files'],
+                    totals['wall'],
+                    totals['cpu'],
+                    totals['bytes_in'] / 1e6,
+                    totals['bytes_out'] / 1e6,
+                    totals['peak_rss'] / 1e6))
+            if len(totals['counts']) > 0:
+                lines.append("  elements: {}".format(', '.join(
+                    '{} {}'.format(tag, totals['counts'][tag])
+                    for tag in counted_elements
+                    if tag in totals['counts'])))
+            slowest = totals['slowest']
+            lines.append("  slowest: {} ({:.2f} s)".format(
+                slowest['file'],
+                slowest['wall']))
+            for name, timer in sorted(
+                    totals['timers'].items(),
+                    key=lambda x: x[1]['seconds'],
+                    reverse=True):
+                lines.append("  {}: {:.2f} s in {} calls".format(
+                    name,
+                    timer['seconds'],
+                    timer['calls']))
+            for name, cache in sorted(totals['caches'].items()):
+                total = cache['hits'] + cache['misses']
+                lines.append(
+                    "  {} cache: {} hits, {} misses ({:.1f}% hit rate)".format(
+                        name,
+                        cache['hits'],
+                        cache['misses'],
+                        100.0 * cache['hits'] / max(total, 1)))
+        lines.append(
+            "run: {:.2f} s wall, {:.2f} s CPU, {:.1f} MB peak RSS".format(
+                time.perf_counter() - self.wall,
+                time.process_time() - self.cpu,
+                get_peak_rss() / 1e6))
+        return '\n'.join(lines)
+
+    def write_prometheus(self, path):
+        """Write the metrics of the run in the Prometheus text format.
+
+        The file is written through a temporary file and a rename, as the
+        textfile collector of the node exporter expects.
+        """
+        stages = self.summarize()
+        metrics = [
+            ('europarl_files_total', 'counter',
+             'Files processed.', 'files'),
+            ('europarl_wall_seconds_total', 'counter',
+             'Wall time processing files.', 'wall'),
+            ('europarl_cpu_seconds_total', 'counter',
+             'CPU time processing files.', 'cpu'),
+            ('europarl_input_bytes_total', 'counter',
+             'Bytes of the input files.', 'bytes_in'),
+            ('europarl_output_bytes_total', 'counter',
+             'Bytes of the output files.', 'bytes_out'),
+            ('europarl_peak_rss_bytes', 'gauge',
+             'Peak resident set size of the processes.', 'peak_rss'),
+            ]
+        lines = []
+        for name, kind, description, key in metrics:
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for stage, totals in stages.items():
+                lines.append('{}{{stage="{}"}} {}'.format(
+                    name,
+                    stage,
+                    totals[key]))
+        lines.append('# HELP europarl_elements_total Elements in the outputs.')
+        lines.append('# TYPE europarl_elements_total counter')
+        for stage, totals in stages.items():
+            for tag, n in sorted(totals['counts'].items()):
+                lines.append(
+                    'europarl_elements_total{{stage="{}",element="{}"}} {}'
+                    .format(stage, tag, n))
+        for key, kind in [('seconds', 'counter'), ('calls', 'counter')]:
+            name = 'europarl_timer_{}_total'.format(key)
+            lines.append('# HELP {} Sub-timers of hot functions.'.format(name))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for stage, totals in stages.items():
+                for timer, values in sorted(totals['timers'].items()):
+                    lines.append('{}{{stage="{}",timer="{}"}} {}'.format(
+                        name,
+                        stage,
+                        timer,
+                        values[key]))
+        for key in ['hits', 'misses']:
+            name = 'europarl_cache_{}_total'.format(key)
+            lines.append('# HELP {} Lookups in the caches of stages.'.format(
+                name))
+            lines.append('# TYPE {} counter'.format(name))
+            for stage, totals in stages.items():
+                for cache, values in sorted(totals['caches'].items()):
+                    lines.append('{}{{stage="{}",cache="{}"}} {}'.format(
+                        name,
+                        stage,
+                        cache,
+                        values[key]))
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, mode='w', encoding='utf-8') as oprometheus:
+            oprometheus.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+        pass
+
+    def report(self):
+        """Print the summary of the run, and write the Prometheus textfile."""
+        print(self.summary())
+        if self.prometheus is not None:
+            self.write_prometheus(self.prometheus)
+        pass
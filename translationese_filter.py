@@ -2,31 +2,20 @@
 
 import os
 import argparse
-from lxml import etree
-import fnmatch  # To match files by pattern
-import time
-import re
-
-
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
-
-    return timed
+import xml_io
+import manifest
+import telemetry
 
 
 class FilterOutTranslationese(object):
     """Get proceedings of the European Parliament."""
 
-    @timeit
-    def __init__(self):
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the stage is only set up, e.g. to process trees in
+            memory with a pipeline
+        """
         self.langs = {
             "bg",
             "es",
@@ -79,40 +68,56 @@ class FilterOutTranslationese(object):
             "fi": ['Finland'],
             "sv": ['Sweden', 'Finland'],
             }
-        self.cli()
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'translationese_filter',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
         self.n_proceedings = 0
-        self.main()
+        # the language of the proceedings is read from the files processed
+        self.language = None
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(self, self.options),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
+        if self.language is None:
+            return "{} EuroParl's proceedings filtered!".format(
+                str(self.n_proceedings))
         message = "{} EuroParl's {} proceedings filtered!".format(
             str(self.n_proceedings),
             self.language)
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory matching a pattern, compressed or not.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return xml_io.get_files(directory, fileclue)
 
+    @telemetry.timed
     def read_xml(self, infile):
         """Parse a XML file.
 
         Keyword arguments:
         infile -- a string for the path to the file to be read.
         """
-        parser = etree.XMLParser(remove_blank_text=True)
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return etree.parse(input, parser)
+        return xml_io.read_xml(infile)
+
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.xml',
+            self.compress)
 
+    @telemetry.timed
     def serialize(self, infile, root):
         """Serialize Element as XML file.
 
@@ -120,11 +125,8 @@ class FilterOutTranslationese(object):
         infile -- a string for the path to the input file processed.
         root -- Element to be serialized as XML.
         """
-        ofile_name = os.path.splitext(os.path.basename(infile))[0]
-        ofile_path = os.path.join(self.outdir, ofile_name+'.xml')
-        xml = self.unprettify(root)
-        with open(ofile_path, mode='w', encoding='utf-8') as ofile:
-            ofile.write(xml)
+        ofile_path = self.get_ofile_path(infile)
+        xml_io.write(ofile_path, xml_io.unprettify(root))
         pass
 
     def get_langs_to_be_removed(self):
@@ -145,75 +147,73 @@ class FilterOutTranslationese(object):
             parent.getparent().remove(parent)
         pass
     
-    def unprettify(self, tree):
-        """Remove any indentation introduced by pretty print."""
-        tree = etree.tostring(  # convert XML tree to string
-            tree,
-            encoding="utf-8",
-            method="xml",
-            xml_declaration=True).decode()
-        tree = re.sub(  # remove trailing spaces before tag
-            r"(\n) +(<)",
-            r"\1\2",
-            tree)
-        tree = re.sub(  # put each XML element in a different line
-            r"> *<",
-            r">\n<",
-            tree)
-        tree = re.sub(  # put opening tag and FL output in different lines
-            r"(<.+?>)",
-            r"\1\n",
-            tree)
-        tree = re.sub(  # put FL output and closing tag in different liens
-            r"(</.+?>)",
-            r"\n\1",
-            tree)
-        tree = re.sub(
-            r"(>)([^.])",
-            r"\1\n\2",
-            tree)
-        tree = re.sub(  # remove unnecessary empty lines
-            r"\n\n+",
-            r"\n",
-            tree)
-        return tree
+    @telemetry.timed
+    def process(self, tree):
+        """Filter out the text units of a tree by source language, in place.
 
-    def main(self):
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_xml(infile)
-            root = tree.getroot()
-            self.language = root.attrib['lang']
-            self.langs_to_be_removed = self.get_langs_to_be_removed()
-            elements = tree.xpath('//{}'.format(self.element))
-            for e in elements:
-                if self.native is False:
+        Keyword arguments:
+        tree -- ElementTree of the proceedings
+        """
+        root = tree.getroot()
+        self.language = root.attrib['lang']
+        self.langs_to_be_removed = self.get_langs_to_be_removed()
+        elements = tree.xpath('//{}'.format(self.element))
+        for e in elements:
+            if self.native is False:
+                if e.attrib['sl'].lower() in self.langs_to_be_removed:
+                    self.remove_element(e)
+            else:
+                if self.sl != 'all':
                     if e.attrib['sl'].lower() in self.langs_to_be_removed:
                         self.remove_element(e)
+                    elif 'nationality' not in e.getparent().attrib:
+                        self.remove_element(e)
+                    elif (e.attrib['sl'] == self.sl and
+                          e.getparent().attrib['nationality']
+                          not in self.nationalities[self.sl]):
+                        self.remove_element(e)
                 else:
-                    if self.sl != 'all':
-                        if e.attrib['sl'].lower() in self.langs_to_be_removed:
-                            self.remove_element(e)
-                        elif 'nationality' not in e.getparent().attrib:
-                            self.remove_element(e)
-                        elif (e.attrib['sl'] == self.sl and
-                              e.getparent().attrib['nationality']
-                              not in self.nationalities[self.sl]):
-                            self.remove_element(e)
+                    if e.attrib['sl'].lower() in self.langs_to_be_removed:
+                        self.remove_element(e)
+                    elif 'nationality' not in e.getparent().attrib:
+                        self.remove_element(e)
                     else:
-                        if e.attrib['sl'].lower() in self.langs_to_be_removed:
+                        if (e.getparent().attrib['nationality'] not in
+                                self.nationalities[e.attrib['sl'].lower()]):
                             self.remove_element(e)
-                        elif 'nationality' not in e.getparent().attrib:
-                            self.remove_element(e)
-                        else:
-                            if (e.getparent().attrib['nationality'] not in
-                                    self.nationalities[e.attrib['sl'].lower()]):
-                                self.remove_element(e)
-            self.serialize(infile, root)
-            self.n_proceedings += 1
+        return tree
+
+    def process_file(self, infile):
+        """Process a file and serialize the output."""
+        tree = self.read_xml(infile)
+        tree = self.process(tree)
+        self.telemetry.count(tree)
+        self.serialize(infile, tree.getroot())
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
         pass
 
-    def cli(self):
+    def main(self):
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                with self.telemetry.measure(
+                        infile,
+                        [self.get_ofile_path(infile)]):
+                    self.process_file(infile)
+                self.n_proceedings += 1
+        finally:
+            # the files done so far are not processed again by the next
+            # run, even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("{} files up to date, skipped.".format(n_skipped))
+        pass
+
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -252,16 +252,33 @@ class FilterOutTranslationese(object):
             action="store_true",
             help="unprettify XML output to get one element per line and\
                 no indentation.")
-        args = parser.parse_args()
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.force = args.force
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
         self.sl = args.language
         self.pattern = args.pattern
+        self.compress = args.compress
         self.element = args.element
         self.native = args.native
         pass
 
 
-print(FilterOutTranslationese())
+if __name__ == '__main__':
+    print(FilterOutTranslationese())
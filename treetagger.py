@@ -3,41 +3,43 @@
 import os
 import argparse
 from lxml import etree
-import fnmatch
-import time
 import json
 import nltk
 import treetaggerwrapper
 import html
 import re
-
-
-def timeit(method):
-    """Time methods."""
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-
-        print('%r %2.2f sec' %
-              (method.__name__, te-ts))
-        return result
-
-    return timed
+import xml_io
+import manifest
+import telemetry
 
 
 class TagWithTreeTagger(object):
     """Tag text with TreeTagger."""
 
-    @timeit
-    def __init__(self):
-        self.cli()
+    def __init__(self, args=None, run=True):
+        """Keyword arguments:
+        args -- a list of command-line arguments, sys.argv if None
+        run -- if False, the stage is only set up, e.g. to process trees in
+            memory with a pipeline
+        """
+        self.cli(args)
+        self.telemetry = telemetry.Telemetry.from_options(
+            'treetagger',
+            self.options)
         self.infiles = self.get_files(self.indir, self.pattern)
         self.counter = 0
         self.loc = self.get_localized_vars()
         self.tokenizer = self.init_tokenizer()
         self.tagger = self.init_tagger()
-        self.main()
+        self.manifest = manifest.Manifest(
+            self.outdir,
+            manifest.get_config(
+                self,
+                self.options,
+                files=[self.get_localization_path()]),
+            self.force)
+        if run:
+            self.main()
 
     def __str__(self):
         message = "{} files in '{}' tagged!".format(
@@ -46,70 +48,44 @@ class TagWithTreeTagger(object):
         return message
 
     def get_files(self, directory, fileclue):
-        """Get all files in a directory matching a pattern.
+        """Get all files in a directory matching a pattern, compressed or not.
 
         Keyword arguments:
         directory -- a string for the input folder path
         fileclue -- a string as glob pattern
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(directory):
-            for filename in fnmatch.filter(filenames, fileclue):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return xml_io.get_files(directory, fileclue)
+
+    def get_localization_path(self):
+        """Get the path to the JSON file of localized variables."""
+        fname = self.language+".json"
+        return os.path.join(os.path.split(os.path.realpath(__file__))[0], 'localization', fname)
 
     def get_localized_vars(self):
         """Import localized variables from JSON file."""
-        fname = self.language+".json"
-        fpath = os.path.join(os.path.split(os.path.realpath(__file__))[0], 'localization', fname)
+        fpath = self.get_localization_path()
         with open(fpath, mode="r", encoding="utf-8") as jfile:
             content = jfile.read()
         vars = json.loads(content)
         return vars
 
+    @telemetry.timed
     def read_xml(self, infile):
         """Parse a XML file.
 
         Keyword arguments:
         infile -- a string for the path to the file to be read.
         """
-        parser = etree.XMLParser(remove_blank_text=True)
-        with open(infile, encoding='utf-8', mode='r') as input:
-            return etree.parse(input, parser)
+        return xml_io.read_xml(infile)
         
-    def unprettify(self, tree):
-        """Remove any indentation introduced by pretty print."""
-        tree = etree.tostring(  # convert XML tree to string
-            tree,
-            encoding="utf-8",
-            method="xml",
-            xml_declaration=True).decode()
-        tree = re.sub(  # remove trailing spaces before tag
-            r"(\n) +(<)",
-            r"\1\2",
-            tree)
-        tree = re.sub(  # put each XML element in a different line
-            r"> *<",
-            r">\n<",
-            tree)
-        tree = re.sub(  # put opening tag and FL output in different lines
-            r"(<.+?>)",
-            r"\1\n",
-            tree)
-        tree = re.sub(  # put FL output and closing tag in different liens
-            r"(</.+?>)",
-            r"\n\1",
-            tree)
-        tree = re.sub(
-            r"(>)([^.])",
-            r"\1\n\2",
-            tree)
-        tree = re.sub(  # remove unnecessary empty lines
-            r"\n\n+",
-            r"\n",
-            tree)
-        return tree
+    def get_ofile_path(self, infile):
+        return xml_io.get_output_path(
+            self.outdir,
+            infile,
+            '.vrt',
+            self.compress)
 
+    @telemetry.timed
     def serialize(self, infile, root):
         """Serialize Element as XML file.
 
@@ -117,11 +93,8 @@ class TagWithTreeTagger(object):
         infile -- a string for the path to the input file processed.
         root -- Element to be serialized as XML.
         """
-        ofile_name = os.path.splitext(os.path.basename(infile))[0]
-        ofile_path = os.path.join(self.outdir, ofile_name+'.vrt')
-        xml = self.unprettify(root)
-        with open(ofile_path, mode='w', encoding='utf-8') as ofile:
-            ofile.write(xml)
+        ofile_path = self.get_ofile_path(infile)
+        xml_io.write(ofile_path, xml_io.unprettify(root))
         pass
 
     def init_tokenizer(self):
@@ -149,6 +122,18 @@ class TagWithTreeTagger(object):
         element.text = None
         return sentences
     
+    @telemetry.timed
+    def tag_text(self, text, **kw):
+        """Tag a text with TreeTagger, leaving DNS, IPs, URLs and emails."""
+        return self.tagger.tag_text(
+            text,
+            notagdns=True,
+            notagip=True,
+            notagurl=True,
+            notagemail=True,
+            **kw)
+
+    @telemetry.timed
     def escape(self, tags):
         output = []
         for tag in tags:
@@ -158,7 +143,7 @@ class TagWithTreeTagger(object):
                     output.append(tag)
                 except:
                     tag = re.sub(r'(<)(.+) (>)', r'\1\n\2\n\3', tag)
-                    tag = self.tagger.tag_text(tag, notagdns=True, notagip=True, notagurl=True, notagemail=True, tagonly=True)
+                    tag = self.tag_text(tag, tagonly=True)
                     tag = [html.escape(t) for t in tag]
                     output += tag
             elif not re.match(r'<.+>$', tag):
@@ -174,44 +159,74 @@ class TagWithTreeTagger(object):
                         output.append(tag)
         return output    
 
-    def main(self):
-        for infile in self.infiles:
-            print(infile)
-            tree = self.read_xml(infile)
-            elements = tree.xpath('.//{}'.format(self.element))
-            for e in elements:
-                if self.sentence:
-                    sentences = self.get_sentences(e)
-                    for s in sentences:
-                        if self.tokenize:
-                            tags = self.tagger.tag_text(html.unescape(s), notagdns=True, notagip=True, notagurl=True, notagemail=True)
-                        else:
-                            tags = self.tagger.tag_text(html.unescape(s), notagdns=True, notagip=True, notagurl=True, notagemail=True, tagonly=True)
-                        tags = self.escape(tags)   
-                        xml = etree.SubElement(e, 's')
-                        for tag in tags:
-                            try:
-                                xml.append(etree.fromstring(tag))
-                            except:
-                                dummy_token = etree.Element('dummy')
-                                dummy_token.text = '\n{}\n'.format(tag)
-                                xml.append(dummy_token)
-                        etree.strip_tags(xml, 'dummy')
-                        
-                else:
+    def process(self, tree):
+        """Tag the text of a tree with TreeTagger, in place.
+
+        Keyword arguments:
+        tree -- ElementTree of the proceedings
+        """
+        elements = tree.xpath('.//{}'.format(self.element))
+        for e in elements:
+            if self.sentence:
+                sentences = self.get_sentences(e)
+                for s in sentences:
                     if self.tokenize:
-                        tags = self.tagger.tag_text(html.unescape(etree.tostring(e, encoding='utf-8').decode()), notagdns=True, notagip=True, notagurl=True, notagemail=True)
+                        tags = self.tag_text(html.unescape(s))
                     else:
-                        tags = self.tagger.tag_text(html.unescape(etree.tostring(e, encoding='utf-8').decode()), notagdns=True, notagip=True, notagurl=True, notagemail=True, tagonly=True)
+                        tags = self.tag_text(html.unescape(s), tagonly=True)
                     tags = self.escape(tags)   
-                    tags = '\n'.join(tags)
-                    xml = etree.fromstring(tags)
-                    e.getparent().replace(e, xml)
-            self.serialize(infile, tree)
-            self.counter += 1
+                    xml = etree.SubElement(e, 's')
+                    for tag in tags:
+                        try:
+                            xml.append(etree.fromstring(tag))
+                        except:
+                            dummy_token = etree.Element('dummy')
+                            dummy_token.text = '\n{}\n'.format(tag)
+                            xml.append(dummy_token)
+                    etree.strip_tags(xml, 'dummy')
+
+            else:
+                if self.tokenize:
+                    tags = self.tag_text(html.unescape(etree.tostring(e, encoding='utf-8').decode()))
+                else:
+                    tags = self.tag_text(html.unescape(etree.tostring(e, encoding='utf-8').decode()), tagonly=True)
+                tags = self.escape(tags)   
+                tags = '\n'.join(tags)
+                xml = etree.fromstring(tags)
+                e.getparent().replace(e, xml)
+        return tree
+
+    def process_file(self, infile):
+        """Process a file and serialize the output."""
+        tree = self.read_xml(infile)
+        tree = self.process(tree)
+        self.telemetry.count(tree)
+        self.serialize(infile, tree)
+        self.manifest.record(infile, [self.get_ofile_path(infile)])
         pass
 
-    def cli(self):
+    def main(self):
+        n_skipped = 0
+        try:
+            for infile in self.infiles:
+                if self.manifest.is_current(infile):
+                    n_skipped += 1
+                    continue
+                print(infile)
+                with self.telemetry.measure(
+                        infile,
+                        [self.get_ofile_path(infile)]):
+                    self.process_file(infile)
+                self.counter += 1
+        finally:
+            # the files done so far are not processed again by the next
+            # run, even if this one is interrupted
+            self.manifest.dump()
+            self.telemetry.report()
+        print("{} files up to date, skipped.".format(n_skipped))
+        pass
+
+    def cli(self, args=None):
         """CLI parses command-line arguments"""
         parser = argparse.ArgumentParser()
         parser.add_argument(
@@ -249,7 +264,22 @@ class TagWithTreeTagger(object):
             default=False,
             action="store_true",
             help="if provided, it tokenizes the text, else, it expects one token per line.")
-        args = parser.parse_args()
+        parser.add_argument(
+            "-z", "--compress",
+            required=False,
+            default=None,
+            choices=xml_io.compressions,
+            help="compress the output files with gzip or zstd.")
+        parser.add_argument(
+            "--force",
+            required=False,
+            action='store_true',
+            help="process all the files, even those whose outputs are up to\
+                date.")
+        telemetry.add_arguments(parser)
+        args = parser.parse_args(args)
+        self.options = vars(args)
+        self.force = args.force
         self.indir = args.input
         self.outdir = args.output
         if not os.path.exists(self.outdir):
@@ -257,9 +287,11 @@ class TagWithTreeTagger(object):
         self.language = args.language
         self.element = args.element
         self.pattern = args.pattern
+        self.compress = args.compress
         self.sentence = args.sentence
         self.tokenize = args.tokenize
         pass
 
 
-print(TagWithTreeTagger())
+if __name__ == '__main__':
+    print(TagWithTreeTagger())
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import gzip
+import fnmatch
+import contextlib
+from lxml import etree
+import html_store
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# extensions of the compressed files, in the order they are tried
+compressions = ['gz', 'zst']
+
+
+def get_compression(path):
+    """Get the compression of a file from its extension, or None."""
+    extension = os.path.splitext(path)[1][1:]
+    if extension in compressions:
+        return extension
+    return None
+
+
+def strip_compression(path):
+    """Remove the extension of the compression from a path, if any."""
+    if get_compression(path) is not None:
+        return os.path.splitext(path)[0]
+    return path
+
+
+def check_compression(compression):
+    if compression == 'zst' and zstandard is None:
+        raise ImportError("zstandard is required for .zst files.")
+    pass
+
+
+def get_files(directory, fileclue):
+    """Get all files in a directory, or a store, matching a pattern.
+
+    Compressed files match if their name without the extension of the
+    compression does, e.g. 20090115.EN.xml.gz matches *.xml.
+
+    Keyword arguments:
+    directory -- a string for the input folder path
+    fileclue -- a string as glob pattern
+    """
+    store = html_store.get_store(directory)
+    if store is not None:
+        return store.get_files(fileclue)
+    matches = []
+    for root, dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            if fnmatch.fnmatch(strip_compression(filename), fileclue):
+                matches.append(os.path.join(root, filename))
+    return matches
+
+
+def open_input(path):
+    """Open a file, or a page in a store, as a binary stream.
+
+    Compressed files are decompressed as they are read.
+    """
+    compression = get_compression(path)
+    check_compression(compression)
+    if compression == 'gz':
+        return gzip.open(path, mode='rb')
+    elif compression == 'zst':
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, mode='rb'),
+            closefd=True)
+    return html_store.open_file(path)
+
+
+def read(path):
+    """Read a file, or a page in a store, as bytes."""
+    if get_compression(path) is None:
+        return html_store.read(path)
+    with open_input(path) as ifile:
+        return ifile.read()
+
+
+def open_output(path, compression=None):
+    """Open a file to be written as a binary stream.
+
+    If the path ends with the extension of a compression, the content is
+    compressed as it is written.
+
+    Keyword arguments:
+    path -- a string for the path to the file
+    compression -- 'gz', 'zst' or None to get it from the extension of path
+    """
+    if compression is None:
+        compression = get_compression(path)
+    check_compression(compression)
+    if compression == 'gz':
+        return gzip.open(path, mode='wb', compresslevel=6)
+    elif compression == 'zst':
+        return zstandard.ZstdCompressor().stream_writer(
+            open(path, mode='wb'),
+            closefd=True)
+    return open(path, mode='wb')
+
+
+@contextlib.contextmanager
+def open_output_atomic(path):
+    """Open a file to be written as a binary stream, replaced on success.
+
+    The content is written to a temporary file in the same folder, which is
+    renamed to path once closed. If writing fails, it is removed, so a
+    truncated file is never left at path for the next stages to read.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open_output(tmp_path, get_compression(path)) as ofile:
+            yield ofile
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    pass
+
+
+def write(path, content):
+    """Write bytes to a file, compressed according to its extension."""
+    with open_output_atomic(path) as ofile:
+        ofile.write(content)
+    pass
+
+
+def read_xml(source, remove_blank_text=True, encoding=None):
+    """Parse a XML document.
+
+    Uncompressed files are parsed directly by libxml2 from their path, other
+    sources are parsed from bytes, never decoded to a string first.
+
+    Keyword arguments:
+    source -- a string for the path to a file or a page in a store, or bytes
+    remove_blank_text -- if True, whitespace between elements is removed
+    encoding -- a string to override the encoding of the document
+    """
+    parser = etree.XMLParser(
+        remove_blank_text=remove_blank_text,
+        encoding=encoding)
+    if isinstance(source, bytes):
+        return etree.fromstring(source, parser).getroottree()
+    if get_compression(source) is None and os.path.exists(source):
+        return etree.parse(source, parser)
+    return etree.fromstring(read(source), parser).getroottree()
+
+
+def get_output_path(outdir, infile, extension='.xml', compression=None):
+    """Get the path of the output file for an input file.
+
+    Keyword arguments:
+    outdir -- a string for the output folder path
+    infile -- a string for the path to the input file
+    extension -- a string for the extension of the output file
+    compression -- 'gz' or 'zst' to compress the output file, or None
+    """
+    ofile_name = os.path.splitext(
+        os.path.basename(strip_compression(infile)))[0]
+    ofile_path = os.path.join(outdir, ofile_name + extension)
+    if compression is not None:
+        ofile_path = '{}.{}'.format(ofile_path, compression)
+    return ofile_path
+
+
+def serialize(root, path, pretty_print=True):
+    """Serialize an Element, or an ElementTree, as a UTF-8 XML file.
+
+    Keyword arguments:
+    root -- Element to be serialized as XML
+    path -- a string for the path to the output file
+    pretty_print -- if True, the XML is indented
+    """
+    xml = etree.tostring(
+        root,
+        encoding='utf-8',
+        xml_declaration=True,
+        pretty_print=pretty_print)
+    write(path, xml)
+    pass
+
+
+unprettify_rules = [
+    (re.compile(br"(\n) +(<)"), br"\1\2"),  # remove spaces before tags
+    (re.compile(br"> *<"), br">\n<"),  # each element in a different line
+    (re.compile(br"(<.+?>)"), br"\1\n"),  # opening tag and text apart
+    (re.compile(br"(</.+?>)"), br"\n\1"),  # text and closing tag apart
+    (re.compile(br"(>)([^.])"), br"\1\n\2"),
+    (re.compile(br"\n\n+"), br"\n"),  # remove unnecessary empty lines
+    ]
+
+
+def unprettify(root):
+    """Serialize an Element as XML with one element or token per line.
+
+    It removes any indentation introduced by pretty print. The XML is
+    processed as UTF-8 bytes.
+    """
+    xml = etree.tostring(
+        root,
+        encoding="utf-8",
+        method="xml",
+        xml_declaration=True)
+    for pattern, replacement in unprettify_rules:
+        xml = pattern.sub(replacement, xml)
+    return xml